@@ -1,8 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import json
+import os
+import time
 import uvicorn
-from src.agent import Agent
+from src import metrics
+from src.registry import registry
+from src.session_store import SessionStore, new_state
+from src.utils.executor import run_blocking
 from typing import List, Optional
 
 # Khởi tạo FastAPI app
@@ -17,9 +25,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Khởi tạo agent
-agent = Agent()
-chatbot_app = agent.agent  # Đây là ứng dụng đã được compile từ StateGraph
+# Agent (langgraph, LLM client, vectorstore, model embedding) chỉ được tạo khi cần, server nhận kết nối ngay;
+# WARM_UP=1 tạo agent và tải model/index ở nền ngay khi khởi động, xem /ready
+WARM_UP = os.getenv("WARM_UP", "1") == "1"
+
+def build_agent():
+    # GRAPH_MODE=fast: một lời gọi planner, tóm tắt hội thoại chạy nền
+    from src.agent import Agent
+    return Agent(mode=os.getenv("GRAPH_MODE", "default"))
+
+registry.register("agent", build_agent)
+
+async def get_agent():
+    """Agent dùng chung; lần đầu (hoặc khi warm-up chưa xong) chờ trong executor để không chặn event loop."""
+    if registry.is_built("agent"):
+        return registry.get("agent")
+    return await run_blocking(registry.get, "agent")
+
+readiness = {"ready": not WARM_UP, "error": None, "timings": {}}
+
+def warm_up():
+    try:
+        timings = registry.get("agent").warm_up()
+        readiness["timings"] = {**{name: round(t, 3) for name, t in registry.timings.items()}, **timings}
+        readiness["ready"] = True
+    except Exception as e:
+        readiness["error"] = str(e)
+        print(f"Lỗi khi warm-up: {e}")
+
+@app.on_event("startup")
+async def start_warm_up():
+    if WARM_UP:
+        task = asyncio.create_task(run_blocking(warm_up))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+@app.get("/ready")
+async def ready():
+    """503 cho tới khi warm-up xong (dùng cho readiness probe), sau đó trả về thời gian từng bước."""
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
 
 # Định nghĩa model cho source document
 class SourceDocument(BaseModel):
@@ -31,61 +75,201 @@ class SourceDocument(BaseModel):
 # Định nghĩa model cho request
 class ChatRequest(BaseModel):
     message: str
-    conversation_id: int = None
+    conversation_id: Optional[int] = None
+    debug: bool = False  # trả về trace (thời gian từng node/bước, token LLM) của lượt này
 
 # Định nghĩa model cho response
 class ChatResponse(BaseModel):
     answer: str
     summary: str
     sources: List[SourceDocument] = None
-    conversation_id: int = None
+    conversation_id: Optional[int] = None
+    trace: Optional[dict] = None
 
 @app.get("/")
 async def root():
     return {"message": "RAG4HUST Chatbot API is running!"}
 
-state = {
-            "question": "",
-            "answer": "",
-            "summary": ""
-        }
+# State hội thoại theo conversation_id (LRU + TTL, tuỳ chọn lưu SQLite qua SESSION_DB)
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+    ttl=float(os.getenv("SESSION_TTL", "3600")),
+    db_path=os.getenv("SESSION_DB") or None,
+)
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+# Giữ tham chiếu tới các task nền (tóm tắt hội thoại) để không bị thu hồi giữa chừng
+background_tasks = set()
+# Task tóm tắt đang chạy của từng conversation_id; lượt sau chờ task này trước khi đọc summary
+pending_summaries = {}
+
+def save_turn(conversation_id, state):
+    session_store.save(conversation_id, {
+        "question": state["question"],
+        "answer": state["answer"],
+        "summary": state["summary"],
+        "source": state.get("source"),
+    })
+
+async def update_summary(conversation_id, state):
+    """
+    Tóm tắt hội thoại sau khi câu trả lời đã được gửi cho người dùng.
+    Không lấy lock của phiên: lượt tiếp theo (đang giữ lock) chờ task này xong mới đọc state (wait_summary),
+    nên không có lượt nào chạy với summary cũ hoặc bị ghi đè summary.
+    """
     try:
-        # Tạo state từ message của người dùng
-        state["question"] = request.message
-        
-        # Gọi agent để xử lý câu hỏi
-        result = chatbot_app.invoke(state)
-        state["answer"] = result["answer"]
-        state["summary"] = result["summary"]
-        
-        # Xử lý sources từ kết quả của agent
-        sources = []
-        if "source" in result and result["source"]:
-            # sources từ agent là một danh sách các string
-            for source in result["source"]:
-                if isinstance(source, str):
-                    sources.append(SourceDocument(
-                        title=source
-                    ))
-        
-        # Trả về kết quả
-        return ChatResponse(
-            answer=result["answer"],
-            summary=result["summary"],
-            sources=sources,
-            conversation_id=request.conversation_id
-        )
+        agent = await get_agent()
+        await agent.graph.aget_summary(state)
+        current = session_store.get(conversation_id)
+        current["summary"] = state["summary"]
+        session_store.save(conversation_id, current)
     except Exception as e:
-        # Trả về lỗi nếu có vấn đề
-        return ChatResponse(
-            answer=f"Xin lỗi, có lỗi xảy ra: {str(e)}",
-            summary="",
-            sources=[],
-            conversation_id=request.conversation_id
-        )
+        print(f"Lỗi khi tóm tắt hội thoại {conversation_id}: {e}")
+
+def schedule_summary(conversation_id, state):
+    # Gọi khi lượt hiện tại vẫn giữ lock của phiên, sau save_turn
+    task = asyncio.create_task(update_summary(conversation_id, dict(state)))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    pending_summaries[conversation_id] = task
+
+    def forget(done):
+        if pending_summaries.get(conversation_id) is done:
+            del pending_summaries[conversation_id]
+    task.add_done_callback(forget)
+
+async def wait_summary(conversation_id):
+    """Chờ tóm tắt của lượt trước (nếu còn chạy); gọi trong lock của phiên, trước session_store.get."""
+    task = pending_summaries.get(conversation_id)
+    if task is not None:
+        # shield: request này bị huỷ thì tóm tắt vẫn chạy tiếp
+        await asyncio.shield(task)
+
+async def run_turn(conversation_id, message: str):
+    """Chạy một lượt hội thoại; các request cùng conversation_id được xử lý tuần tự."""
+    agent = await get_agent()
+    if conversation_id is None:
+        # Không có conversation_id: không lưu lịch sử
+        state = new_state()
+        state["question"] = message
+        return await agent.agent.ainvoke(state)
+
+    async with session_store.lock(conversation_id):
+        await wait_summary(conversation_id)
+        state = session_store.get(conversation_id)
+        state["question"] = message
+        result = await agent.agent.ainvoke(state)
+        save_turn(conversation_id, result)
+        if agent.mode == "fast":
+            schedule_summary(conversation_id, result)
+        return result
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def record_request(endpoint: str, status: str, start: float):
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, status=status)
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+async def stream_turn(conversation_id, message: str, debug: bool = False):
+    """
+    Stream một lượt hội thoại dạng Server-Sent Events:
+    các event `token` → `sources` → (`trace` nếu debug) → `done` (hoặc `error`).
+    """
+    start = time.perf_counter()
+    lock = session_store.lock(conversation_id) if conversation_id is not None else asyncio.Lock()
+    with metrics.tracing(debug) as trace:
+        try:
+            agent = await get_agent()
+            async with lock:
+                if conversation_id is not None:
+                    await wait_summary(conversation_id)
+                state = session_store.get(conversation_id) if conversation_id is not None else new_state()
+                state["question"] = message
+                async for event, data in agent.graph.astream_answer(state):
+                    if event == "token":
+                        yield sse_event("token", {"text": data})
+                    else:
+                        yield sse_event("sources", {"sources": [{"title": s} for s in data if isinstance(s, str)]})
+                if conversation_id is not None:
+                    save_turn(conversation_id, state)
+                    schedule_summary(conversation_id, state)
+            if trace is not None:
+                yield sse_event("trace", trace.to_dict())
+            yield sse_event("done", {"conversation_id": conversation_id})
+            record_request("/chat/stream", "ok", start)
+        except Exception as e:
+            record_request("/chat/stream", "error", start)
+            yield sse_event("error", {"message": f"Xin lỗi, có lỗi xảy ra: {str(e)}"})
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    return StreamingResponse(
+        stream_turn(request.conversation_id, request.message, request.debug),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    agent = await get_agent()
+    cache = agent.graph.qa_chain.cache
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@app.get("/router/stats")
+async def router_stats():
+    agent = await get_agent()
+    local_router = agent.graph.local_router
+    return local_router.stats() if local_router is not None else {"enabled": False}
+
+@app.get("/llm/stats")
+async def llm_stats():
+    # Số lời gọi, lỗi, thử lại, token ước lượng và độ trễ theo từng call site của LLM gateway
+    return registry.get("llm_gateway").stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Thời gian từng node/bước truy hồi, token LLM, số tài liệu truy hồi, cache hit (định dạng Prometheus)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    start = time.perf_counter()
+    status = "ok"
+    with metrics.tracing(request.debug) as trace:
+        try:
+            # Gọi agent để xử lý câu hỏi (bất đồng bộ, không chặn event loop)
+            result = await run_turn(request.conversation_id, request.message)
+
+            # Xử lý sources từ kết quả của agent
+            sources = []
+            if "source" in result and result["source"]:
+                # sources từ agent là một danh sách các string
+                for source in result["source"]:
+                    if isinstance(source, str):
+                        sources.append(SourceDocument(
+                            title=source
+                        ))
+
+            # Trả về kết quả
+            response = ChatResponse(
+                answer=result["answer"],
+                summary=result["summary"],
+                sources=sources,
+                conversation_id=request.conversation_id
+            )
+        except Exception as e:
+            # Trả về lỗi nếu có vấn đề
+            status = "error"
+            response = ChatResponse(
+                answer=f"Xin lỗi, có lỗi xảy ra: {str(e)}",
+                summary="",
+                sources=[],
+                conversation_id=request.conversation_id
+            )
+    record_request("/chat", status, start)
+    if trace is not None:
+        response.trace = trace.to_dict()
+    return response
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
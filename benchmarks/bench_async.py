@@ -0,0 +1,77 @@
+"""
+Kiểm tra đường chạy bất đồng bộ của graph dưới tải đồng thời với LLM giả lập.
+
+So sánh:
+  - blocking: gọi invoke() đồng bộ bên trong coroutine (như /chat trước đây)
+  - async:    gọi ainvoke() cho tất cả request cùng lúc
+Đồng thời đo độ trễ event loop (loop lag) bằng một ticker 10ms.
+
+Chạy: python -m benchmarks.bench_async
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Đo pipeline thật, không để semantic cache trả lời thay
+os.environ.setdefault("SEMANTIC_CACHE", "0")
+# Chọn tài liệu bằng LLM giả lập (không tải model cross-encoder khi chạy offline)
+os.environ.setdefault("RERANKER", "llm")
+# Đo khả năng phục vụ đồng thời của event loop, không giới hạn bởi semaphore của LLM gateway
+os.environ.setdefault("LLM_CONCURRENCY", "64")
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import TOPICS, build_corpus
+from src.agent import Agent
+
+
+def new_state(i: int):
+    return {"question": f"Điều kiện {TOPICS[i % len(TOPICS)]} là gì?", "answer": "", "summary": "", "source": None}
+
+
+async def measure(label: str, app, n: int, use_async: bool):
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    async def one(i: int):
+        if use_async:
+            return await app.ainvoke(new_state(i))
+        return app.invoke(new_state(i))
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    ok = sum(1 for r in results if r["answer"])
+    print(f"{label:>8}: {n} requests in {elapsed:.2f}s ({n / elapsed:.1f} req/s), "
+          f"answered={ok}, max loop lag={max(lags) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--docs", type=int, default=200)
+    args = parser.parse_args()
+
+    embeddings = HashEmbeddings(call_latency=0.005)
+    vectorstore, byte_store = build_corpus(embeddings, args.docs)
+    llm = ScriptedLLM(latency=args.llm_latency)
+    app = Agent(llm=llm, vectorstore=vectorstore, byte_store=byte_store).agent
+
+    asyncio.run(measure("blocking", app, args.requests, use_async=False))
+    asyncio.run(measure("async", app, args.requests, use_async=True))
+    print(f"LLM calls: {llm.total_calls}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+So sánh truy hồi theo tóm tắt (LLM chọn một tài liệu, đưa cả trang vào prompt) với truy hồi theo
+chunk (ghép các chunk tốt nhất trong ngân sách token) trên các trang sổ tay dài có bảng.
+
+In số token ước lượng của prompt trả lời, recall (nguồn đúng có trong context) và số lời gọi LLM.
+Chạy: python -m benchmarks.bench_chunks
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import make_handbook_pages, make_handbook_questions
+from src.chains.retrieval_chain import RetrievalChain
+from src.chunker import estimate_tokens
+from src.vectorstore import VectorStore
+
+
+def evaluate(label: str, chain: RetrievalChain, llm: ScriptedLLM, questions):
+    tokens, context_tokens, hits = [], [], 0
+    before = llm.total_calls
+    for question, expected in questions:
+        # Dùng query gốc để so sánh công bằng phần truy hồi (không sinh biến thể)
+        docs, sources = asyncio.run(chain.aprepare(question, queries=[question]))
+        prompt = chain.prompt.format(context=docs, sources=sources, question=question,
+                                     format_instructions=chain.format_instructions)
+        tokens.append(estimate_tokens(prompt))
+        context_tokens.append(estimate_tokens(str(docs)))
+        hits += expected in sources
+    calls = (llm.total_calls - before) / len(questions)
+    print(f"{label:>8}: prompt tokens median={statistics.median(tokens):.0f} max={max(tokens)} "
+          f"(context median={statistics.median(context_tokens):.0f}), "
+          f"recall={hits / len(questions):.2f}, LLM calls/question (trước khi trả lời)={calls:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--context-tokens", type=int, default=1500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag4hust_chunks_")
+    llm = ScriptedLLM()
+    store = VectorStore(
+        llm=llm, embedding=HashEmbeddings(), concurrency=8, rpm=None, tpm=None, index_mode="both",
+        persist_directory=os.path.join(workdir, "chroma_db"),
+        store_path=os.path.join(workdir, "store"),
+        manifest_path=os.path.join(workdir, "manifest.json"),
+        bm25_dir=os.path.join(workdir, "bm25"),
+    )
+    store.save(make_handbook_pages(args.pages, args.sections))
+    questions = make_handbook_questions(args.pages, args.sections)
+    summaries = store._open().vectorstore
+
+    evaluate("summary", RetrievalChain(summaries, llm=llm, llm_answer=llm, docstore=store.docstore), llm, questions)
+    evaluate("chunk", RetrievalChain(summaries, llm=llm, llm_answer=llm, docstore=store.docstore,
+                                     chunk_store=store._open_chunks(), context_tokens=args.context_tokens),
+             llm, questions)
+
+
+if __name__ == "__main__":
+    main()
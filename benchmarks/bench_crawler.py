@@ -0,0 +1,47 @@
+"""
+Đo thời gian crawl của WebCrawler trên các trang HTML cục bộ (JS render nội dung sau một khoảng trễ).
+
+So sánh:
+  - sequential: 1 driver, chờ tường minh thay cho time.sleep(2) + delay cố định
+  - parallel:   pool N driver, giãn cách theo host
+
+Cần Chrome + chromedriver. Chạy: python -m benchmarks.bench_crawler --pages 40 --workers 4
+"""
+import argparse
+import time
+
+from benchmarks.fixtures import make_html_pages, serve_pages
+from src.crawler import WebCrawler
+
+
+def run(label: str, urls, workers: int, delay: float):
+    crawler = WebCrawler(headless=True, delay=delay)
+    start = time.perf_counter()
+    docs = crawler.run(urls, workers=workers)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for d in docs if d.metadata.get("tables_count"))
+    print(f"{label:>10}: {len(urls)} pages in {elapsed:.1f}s ({len(urls) / elapsed:.2f} pages/s), ok={ok}")
+    assert [d.metadata["source"] for d in docs] == list(urls), "Thứ tự kết quả phải giữ như đầu vào"
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--render-delay-ms", type=int, default=300)
+    parser.add_argument("--delay", type=float, default=0.0, help="giãn cách tối thiểu giữa hai request cùng host")
+    args = parser.parse_args()
+
+    pages = make_html_pages(args.pages, render_delay_ms=args.render_delay_ms)
+    with serve_pages(pages) as base_url:
+        urls = [base_url + path for path in pages]
+        print(f"baseline cũ (sleep 2s + delay mỗi trang): ~{args.pages * (2 + args.delay):.0f}s (ước tính)")
+        sequential = run("sequential", urls, 1, args.delay)
+        parallel = run("parallel", urls, args.workers, args.delay)
+        same = [d.page_content for d in sequential] == [d.page_content for d in parallel]
+        print(f"nội dung giống nhau: {same}")
+
+
+if __name__ == "__main__":
+    main()
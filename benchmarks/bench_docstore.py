@@ -0,0 +1,86 @@
+"""
+So sánh docstore tài liệu gốc: LocalFileStore (mỗi tài liệu một file JSON, như trước) với SQLiteDocStore
+(một file, nội dung nén zlib, LRU các Document đã giải mã).
+
+Đo độ trễ lấy tài liệu cho một câu hỏi: cách cũ (_load_docs gọi mget hai lần cho cùng doc_id),
+một lần mget, mget nhiều tài liệu (top-k), và dung lượng trên đĩa.
+Chạy: python -m benchmarks.bench_docstore
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from langchain.storage import LocalFileStore
+from langchain.storage._lc_store import create_kv_docstore
+
+from benchmarks.fixtures import make_handbook_pages
+from src.docstore import SQLiteDocStore
+
+
+def measure(func, keys_list):
+    timings = []
+    for keys in keys_list:
+        start = time.perf_counter()
+        func(keys)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99)]
+
+
+def disk_size(path: str) -> int:
+    if os.path.isfile(path):
+        return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=300)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag4hust_docstore_")
+    docs = make_handbook_pages(args.docs, args.sections)
+    ids = [f"doc-{i}" for i in range(len(docs))]
+    files = create_kv_docstore(LocalFileStore(os.path.join(workdir, "store")))
+    files.mset(list(zip(ids, docs)))
+    sqlite_path = os.path.join(workdir, "docstore.db")
+    SQLiteDocStore(sqlite_path).mset(list(zip(ids, docs)))
+    cold = SQLiteDocStore(sqlite_path, cache_mb=0)
+    warm = SQLiteDocStore(sqlite_path)
+
+    rng = random.Random(0)
+    single = [[rng.choice(ids)] for _ in range(args.repeat)]
+    top_k = [rng.sample(ids, args.top_k) for _ in range(args.repeat)]
+    # Phân phối câu hỏi lệch: phần lớn câu hỏi rơi vào số ít trang phổ biến
+    popular = [[rng.choice(ids[:20]) if rng.random() < 0.8 else rng.choice(ids)] for _ in range(args.repeat)]
+
+    def old_load_docs(keys):
+        [files.mget([key])[0].page_content for key in keys]
+        [files.mget([key])[0].metadata.get("source") for key in keys]
+
+    size = sum(len(doc.page_content.encode("utf-8")) for doc in docs) / 1e6
+    print(f"{len(docs)} tài liệu ({size:.1f} MB văn bản), {args.repeat} lần mỗi phép đo (median / p99, ms)")
+    rows = [
+        ("files, _load_docs cũ (2 mget)", old_load_docs, single),
+        ("files, 1 mget", files.mget, single),
+        ("sqlite không LRU, 1 mget", cold.mget, single),
+        ("sqlite có LRU, 1 mget", warm.mget, popular),
+        (f"files, mget top-{args.top_k}", files.mget, top_k),
+        (f"sqlite không LRU, mget top-{args.top_k}", cold.mget, top_k),
+    ]
+    for label, func, keys_list in rows:
+        p50, p99 = measure(func, keys_list)
+        print(f"{label:>34}: {p50:.3f} / {p99:.3f}")
+    print(f"{'':>34}  LRU: {warm.stats()}")
+    print(f"Dung lượng: files={disk_size(os.path.join(workdir, 'store')) / 1e6:.1f} MB, "
+          f"sqlite={disk_size(sqlite_path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+So sánh hai engine trích xuất nội dung của WebCrawler trên các trang HTML cục bộ:
+  - webdriver: find_elements/execute_script cho từng hàng, ô và link (như cũ)
+  - script:    một lần execute_script cho cả trang
+
+In thời gian, số lệnh WebDriver mỗi trang và kiểm tra kết quả giống hệt nhau.
+Cần Chrome + chromedriver. Chạy: python -m benchmarks.bench_extraction --pages 10 --rows 40
+"""
+import argparse
+import time
+
+from benchmarks.fixtures import make_html_pages, serve_pages
+from src.crawler import WebCrawler
+
+
+def count_commands(driver):
+    """Bọc driver.execute để đếm số round-trip WebDriver."""
+    counter = {"commands": 0}
+    execute = driver.execute
+
+    def counted(*args, **kwargs):
+        counter["commands"] += 1
+        return execute(*args, **kwargs)
+
+    driver.execute = counted
+    return counter
+
+
+def run(label: str, crawler: WebCrawler, urls):
+    counter = count_commands(crawler.driver)
+    results, elapsed, commands = [], 0.0, 0
+    for url in urls:
+        crawler.driver.get(url)
+        crawler._wait_for_content(crawler.driver)
+        counter["commands"] = 0
+        start = time.perf_counter()
+        if crawler.extraction == "script":
+            results.append(crawler._extract_page_script(crawler.driver))
+        else:
+            results.append(crawler._extract_page_webdriver(crawler.driver))
+        elapsed += time.perf_counter() - start
+        commands += counter["commands"]
+    print(f"{label:>10}: {elapsed / len(urls) * 1000:.0f} ms/page, {commands / len(urls):.0f} WebDriver commands/page")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=40)
+    parser.add_argument("--cols", type=int, default=6)
+    args = parser.parse_args()
+
+    pages = make_html_pages(args.pages, rows=args.rows, cols=args.cols, render_delay_ms=0)
+    with serve_pages(pages) as base_url:
+        urls = [base_url + path for path in pages]
+        outputs = {}
+        for extraction in ("webdriver", "script"):
+            crawler = WebCrawler(headless=True, delay=0, extraction=extraction)
+            crawler._setup_driver()
+            try:
+                outputs[extraction] = run(extraction, crawler, urls)
+            finally:
+                crawler._close_driver()
+        print(f"kết quả giống hệt nhau: {outputs['webdriver'] == outputs['script']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+So sánh gọi LLM trực tiếp với gọi qua LLMGateway trên một nhà cung cấp giả lập hay lỗi (FlakyLLM:
+một phần lời gọi lỗi 503 ngay, một phần treo rất lâu), với nhiều câu hỏi đồng thời:
+tỉ lệ thành công, độ trễ p50/p95/max, số lời gọi chạy cùng lúc lớn nhất ở phía nhà cung cấp,
+số lần thử lại/timeout của gateway.
+
+Thêm phép đo chi phí dựng lại PromptTemplate + chain mỗi lần gọi (như StateGraph trước đây)
+so với chain dựng sẵn.
+Chạy: python -m benchmarks.bench_gateway
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from benchmarks.fakes import FlakyLLM, ScriptedLLM
+from src.utils.llm_gateway import LLMGateway
+
+TEMPLATE = """
+    Hãy phân tích câu hỏi sau và trả lời xem câu hỏi này có phải tiếp nối của câu hỏi trước đó không.
+    Câu hỏi: {question}
+    Hội thoại trước đó tóm tắt: {summary}
+    Lưu ý: chỉ trả về **yes** hoặc **no**.
+"""
+
+
+def build_chain(llm):
+    prompt = PromptTemplate(template=TEMPLATE, input_variables=["question", "summary"])
+    return prompt | llm | StrOutputParser()
+
+
+async def run(chain, requests: int):
+    async def one(i):
+        start = time.perf_counter()
+        try:
+            await chain.ainvoke({"question": f"Câu hỏi số {i} về học bổng?", "summary": ""})
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    latencies = sorted(latency for _, latency in results)
+    return sum(ok for ok, _ in results), latencies, wall
+
+
+def report(label, ok, latencies, wall, requests, llm):
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:>9}: thành công {ok}/{requests}, p50={statistics.median(latencies):.2f}s p95={p95:.2f}s "
+          f"max={latencies[-1]:.2f}s, tổng {wall:.2f}s, lời gọi tới provider={llm.total_calls + llm.failures}, "
+          f"đồng thời tối đa={llm.max_in_flight}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.15)
+    parser.add_argument("--hang-rate", type=float, default=0.05)
+    parser.add_argument("--hang-latency", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--build-repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{args.requests} câu hỏi đồng thời, provider: {args.latency}s/lời gọi, lỗi 503 {args.failure_rate:.0%}, "
+          f"treo {args.hang_latency:.0f}s {args.hang_rate:.0%}")
+    flaky = dict(latency=args.latency, failure_rate=args.failure_rate, hang_rate=args.hang_rate,
+                 hang_latency=args.hang_latency)
+
+    llm = FlakyLLM(**flaky)
+    report("trực tiếp", *asyncio.run(run(build_chain(llm), args.requests)), args.requests, llm)
+
+    llm = FlakyLLM(**flaky)
+    gateway = LLMGateway(concurrency=args.concurrency, timeout=args.timeout, max_retries=3, base_delay=0.05)
+    report("gateway", *asyncio.run(run(build_chain(gateway.site("router_question", llm)), args.requests)),
+           args.requests, llm)
+    site = gateway.stats()["sites"]["router_question"]
+    print(f"{'':>11}gateway (concurrency={args.concurrency}, timeout={args.timeout}s): retries={site['retries']}, "
+          f"timeouts={site['timeouts']}, errors={site['errors']}, chờ slot={site['wait_ms'] / 1000:.1f}s, "
+          f"token ước lượng={site['prompt_tokens']}+{site['completion_tokens']}")
+
+    # Chi phí dựng chain mỗi lần gọi so với dùng chain dựng sẵn (LLM không độ trễ)
+    llm = ScriptedLLM()
+    inputs = {"question": "Học bổng là gì?", "summary": ""}
+    start = time.perf_counter()
+    for _ in range(args.build_repeat):
+        build_chain(llm).invoke(inputs)
+    rebuild = (time.perf_counter() - start) / args.build_repeat
+    chain = build_chain(llm)
+    start = time.perf_counter()
+    for _ in range(args.build_repeat):
+        chain.invoke(inputs)
+    prebuilt = (time.perf_counter() - start) / args.build_repeat
+    print(f"dựng chain mỗi lần: {rebuild * 1000:.2f} ms/lời gọi, chain dựng sẵn: {prebuilt * 1000:.2f} ms/lời gọi")
+
+
+if __name__ == "__main__":
+    main()
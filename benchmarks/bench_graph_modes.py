@@ -0,0 +1,63 @@
+"""
+So sánh số lời gọi LLM và độ trễ mỗi lượt hỏi giữa graph "default" và graph "fast"
+(planner một lời gọi, tóm tắt hội thoại chạy nền sau khi trả lời).
+
+Chạy: python -m benchmarks.bench_graph_modes
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Đo pipeline thật, không để semantic cache trả lời thay
+os.environ.setdefault("SEMANTIC_CACHE", "0")
+# Chọn tài liệu bằng LLM giả lập (không tải model cross-encoder khi chạy offline)
+os.environ.setdefault("RERANKER", "llm")
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import TOPICS, build_corpus
+from src.agent import Agent
+from src.session_store import new_state
+
+
+async def run_mode(mode: str, turns: int, llm_latency: float, vectorstore, byte_store):
+    llm = ScriptedLLM(latency=llm_latency)
+    agent = Agent(mode=mode, llm=llm, vectorstore=vectorstore, byte_store=byte_store)
+    state = new_state()
+    latencies, calls, background_calls = [], [], []
+    for i in range(turns):
+        state["question"] = f"Điều kiện {TOPICS[i % len(TOPICS)]} là gì?"
+        before = llm.total_calls
+        start = time.perf_counter()
+        result = await agent.agent.ainvoke(state)
+        latencies.append(time.perf_counter() - start)
+        calls.append(llm.total_calls - before)
+
+        # Chế độ fast: tóm tắt chạy sau khi đã trả lời (không tính vào độ trễ người dùng thấy)
+        before = llm.total_calls
+        if mode == "fast":
+            result = await agent.graph.aget_summary(result)
+        background_calls.append(llm.total_calls - before)
+        state = {k: result[k] for k in ("question", "answer", "summary", "source")}
+
+    print(f"{mode:>7}: p50 latency={statistics.median(latencies) * 1000:.0f}ms "
+          f"LLM calls/turn (critical path)={statistics.mean(calls):.1f} "
+          f"background={statistics.mean(background_calls):.1f}")
+    if agent.graph.local_router is not None:
+        print(f"{'':>9}local router paths: {agent.graph.local_router.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    vectorstore, byte_store = build_corpus(HashEmbeddings(), 100)
+    for mode in ("default", "fast"):
+        asyncio.run(run_mode(mode, args.turns, args.llm_latency, vectorstore, byte_store))
+
+
+if __name__ == "__main__":
+    main()
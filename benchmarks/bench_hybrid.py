@@ -0,0 +1,82 @@
+"""
+So sánh truy hồi chỉ dùng vector với truy hồi lai (vector + BM25, gộp bằng RRF) trên các trang sổ tay
+có mã quy định (QĐ-i-s), với câu hỏi có dấu và không dấu; đo thêm độ trễ một truy vấn BM25 và
+số lời gọi LLM khi bỏ bước sinh biến thể câu hỏi (num_queries=0).
+
+Chạy: python -m benchmarks.bench_hybrid
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import make_handbook_pages, make_handbook_questions
+from src.bm25 import fold
+from src.chains.retrieval_chain import RetrievalChain
+from src.vectorstore import VectorStore
+
+
+def recall(chain: RetrievalChain, questions) -> float:
+    hits = 0
+    for question, expected in questions:
+        _, sources = asyncio.run(chain.aprepare(question, queries=[question]))
+        hits += expected in sources
+    return hits / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag4hust_hybrid_")
+    llm = ScriptedLLM()
+    store = VectorStore(
+        llm=llm, embedding=HashEmbeddings(), concurrency=8, rpm=None, tpm=None, index_mode="both",
+        persist_directory=os.path.join(workdir, "chroma_db"),
+        store_path=os.path.join(workdir, "store"),
+        manifest_path=os.path.join(workdir, "manifest.json"),
+        bm25_dir=os.path.join(workdir, "bm25"),
+    )
+    store.save(make_handbook_pages(args.pages, args.sections))
+    questions = make_handbook_questions(args.pages, args.sections)
+    unaccented = [(fold(question), expected) for question, expected in questions]
+    summaries, chunks = store._open().vectorstore, store._open_chunks()
+
+    print(f"{len(questions)} câu hỏi, {args.pages} trang x {args.sections} mục")
+    for mode, chunk_store, kind in (("summary", None, "documents"), ("chunk", chunks, "chunks")):
+        lexical = store.lexical_index(kind)
+        dense = RetrievalChain(summaries, llm=llm, llm_answer=llm, docstore=store.docstore, chunk_store=chunk_store)
+        hybrid = RetrievalChain(summaries, llm=llm, llm_answer=llm, docstore=store.docstore, chunk_store=chunk_store,
+                                lexical_index=lexical)
+        print(f"{mode:>8}: recall vector={recall(dense, questions):.2f} hybrid={recall(hybrid, questions):.2f} | "
+              f"không dấu: vector={recall(dense, unaccented):.2f} hybrid={recall(hybrid, unaccented):.2f}")
+
+        timings = []
+        for i in range(args.repeat):
+            question = questions[i % len(questions)][0]
+            start = time.perf_counter()
+            lexical.search(question, k=4)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{'':>8}  BM25 ({len(lexical)} mục): median={statistics.median(timings):.3f} ms "
+              f"p95={sorted(timings)[int(len(timings) * 0.95)]:.3f} ms")
+
+    for num_queries in (5, 0):
+        chain = RetrievalChain(summaries, llm=llm, llm_answer=llm, docstore=store.docstore, chunk_store=chunks,
+                               lexical_index=store.lexical_index("chunks"), num_queries=num_queries)
+        before, hits = llm.total_calls, 0
+        for question, expected in questions:
+            _, sources = asyncio.run(chain.aprepare(question))
+            hits += expected in sources
+        calls = (llm.total_calls - before) / len(questions)
+        print(f"num_queries={num_queries}: recall={hits / len(questions):.2f}, "
+              f"LLM calls/question (trước khi trả lời)={calls:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+So sánh index theo từng giai đoạn (crawl hết → tóm tắt hết → ghi một lần) với pipeline
+dạng stream (crawl → clean → summarise → embed → upsert chạy chồng lên nhau), dùng nguồn
+tài liệu, LLM và embedder giả lập có độ trễ.
+
+Chạy: python -m benchmarks.bench_pipeline
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import make_documents
+from src.pipeline import IngestPipeline
+from src.vectorstore import VectorStore
+
+
+def slow_source(docs, latency: float):
+    """Mô phỏng crawler: mỗi trang mất `latency` giây (đã chia cho số driver song song)."""
+    for doc in docs:
+        time.sleep(latency)
+        yield doc
+
+
+def make_store(workdir: str, name: str, args):
+    return VectorStore(
+        llm=ScriptedLLM(latency=args.llm_latency),
+        embedding=HashEmbeddings(call_latency=0.05, text_latency=args.embed_latency),
+        concurrency=args.summary_concurrency, rpm=None, tpm=None,
+        persist_directory=os.path.join(workdir, name, "chroma_db"),
+        store_path=os.path.join(workdir, name, "store"),
+        manifest_path=os.path.join(workdir, name, "manifest.json"),
+        bm25_dir=os.path.join(workdir, name, "bm25"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=80)
+    parser.add_argument("--crawl-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--summary-concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag4hust_pipeline_")
+    docs = make_documents(args.docs)
+    print(f"ước tính từng stage: crawl {args.docs * args.crawl_latency:.1f}s, "
+          f"summarise {args.docs * args.llm_latency / args.summary_concurrency:.1f}s")
+
+    store = make_store(workdir, "staged", args)
+    start = time.perf_counter()
+    materialised = list(slow_source(docs, args.crawl_latency))
+    stats = store.save(materialised)
+    print(f"    staged: {time.perf_counter() - start:.2f}s, {stats}")
+
+    store = make_store(workdir, "pipeline", args)
+    pipeline = IngestPipeline(store, batch_size=args.batch_size)
+    stats = pipeline.run(docs=slow_source(docs, args.crawl_latency))
+    print(f"  pipeline: {stats['elapsed']:.2f}s, {stats}")
+
+    stats = pipeline.run(docs=docs)
+    print(f"    no-op:  {stats['elapsed']:.2f}s, {stats}")
+
+
+if __name__ == "__main__":
+    main()
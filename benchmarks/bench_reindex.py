@@ -0,0 +1,52 @@
+"""
+Đo thời gian index lần đầu, index lại khi không có thay đổi (no-op) và khi chỉ một
+phần tài liệu thay đổi, trên thư mục tạm với LLM/embedder giả lập.
+
+Chạy: python -m benchmarks.bench_reindex
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import make_documents
+from src.vectorstore import VectorStore
+
+
+def timed(label: str, store: VectorStore, docs, llm):
+    before = llm.total_calls
+    start = time.perf_counter()
+    stats = store.save(docs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>10}: {elapsed:.2f}s, LLM calls={llm.total_calls - before}, {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--changed", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag4hust_reindex_")
+    llm = ScriptedLLM(latency=args.llm_latency)
+    store = VectorStore(
+        llm=llm, embedding=HashEmbeddings(), concurrency=8, rpm=None, tpm=None,
+        persist_directory=os.path.join(workdir, "chroma_db"),
+        store_path=os.path.join(workdir, "store"),
+        manifest_path=os.path.join(workdir, "manifest.json"),
+        bm25_dir=os.path.join(workdir, "bm25"),
+    )
+    docs = make_documents(args.docs)
+    timed("full", store, docs, llm)
+    timed("no-op", store, docs, llm)
+
+    edited = [Document(page_content=d.page_content + "\nCập nhật mới.", metadata=d.metadata) for d in docs[:args.changed]]
+    timed("partial", store, edited + docs[args.changed:-args.changed], llm)
+
+
+if __name__ == "__main__":
+    main()
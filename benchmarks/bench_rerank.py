@@ -0,0 +1,104 @@
+"""
+So sánh bước chọn tài liệu sau RRF: LLM chọn doc_id (một lượt gọi LLM) với cross-encoder chấm điểm
+(câu hỏi, tóm tắt) trên CPU. In độ chính xác (tài liệu được chọn đầu tiên có đúng nguồn không)
+và độ trễ của riêng bước chọn trên một tập câu hỏi gán nhãn.
+
+Mặc định chạy offline trên corpus sổ tay giả lập (LLM và cross-encoder giả lập có độ trễ cấu hình được).
+Với --golden (file JSONL {"question", "source"}, xem benchmarks/golden_set.example.jsonl) thì chạy trên
+index thật trong data/processed/ với cross-encoder RERANK_MODEL; thêm --llm để đo cả Gemini.
+
+Chạy: python -m benchmarks.bench_rerank
+      python -m benchmarks.bench_rerank --golden benchmarks/golden_set.example.jsonl --llm
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fakes import HashEmbeddings, OverlapCrossEncoder, ScriptedLLM
+from benchmarks.fixtures import make_handbook_pages, make_handbook_questions
+from src.bm25 import BM25Index, index_path
+from src.chains.retrieval_chain import RetrievalChain
+from src.reranker import CrossEncoderReranker, LLMSelector
+from src.vectorstore import VectorStore
+
+
+def evaluate(label: str, chain: RetrievalChain, reranker, questions):
+    latencies, hits, baseline = [], 0, 0
+    for question, expected in questions:
+        fused = chain.reciprocal_rank_fusion(chain.retrieve([question]))[:chain.rerank_candidates]
+        baseline += bool(fused) and fused[0][0].metadata.get("source") == expected
+        start = time.perf_counter()
+        selected = asyncio.run(reranker.arerank(question, fused))
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += bool(selected) and selected[0][0].metadata.get("source") == expected
+    latencies.sort()
+    print(f"{label:>14}: accuracy={hits / len(questions):.2f} (RRF top-1={baseline / len(questions):.2f}), "
+          f"latency median={statistics.median(latencies):.1f} ms p95={latencies[int(len(latencies) * 0.95)]:.1f} ms")
+
+
+def synthetic(args):
+    workdir = tempfile.mkdtemp(prefix="rag4hust_rerank_")
+    store = VectorStore(
+        llm=ScriptedLLM(), embedding=HashEmbeddings(), concurrency=8, rpm=None, tpm=None, index_mode="summary",
+        persist_directory=os.path.join(workdir, "chroma_db"),
+        store_path=os.path.join(workdir, "store"),
+        manifest_path=os.path.join(workdir, "manifest.json"),
+        bm25_dir=os.path.join(workdir, "bm25"),
+    )
+    store.save(make_handbook_pages(args.pages, args.sections))
+    questions = make_handbook_questions(args.pages, args.sections)
+    llm = ScriptedLLM(latency=args.llm_latency)
+    chain = RetrievalChain(store._open().vectorstore, llm=llm, llm_answer=llm,
+                           docstore=store.docstore,
+                           lexical_index=store.lexical_index("documents"))
+    encoder = OverlapCrossEncoder(call_latency=0.005, pair_latency=args.pair_latency)
+
+    print(f"{len(questions)} câu hỏi, {args.pages} trang, {chain.rerank_candidates} ứng viên/câu hỏi")
+    evaluate("llm", chain, LLMSelector(chain.select_docid_chain), questions)
+    print(f"{'':>14}  LLM calls={llm.total_calls}")
+    evaluate("cross-encoder", chain, CrossEncoderReranker(model=encoder, top_k=1), questions)
+    print(f"{'':>14}  predict calls={encoder.calls}, pairs={encoder.pairs}, LLM calls thêm={llm.total_calls - len(questions)}")
+
+
+def golden(args):
+    from langchain_chroma import Chroma
+    from src.utils.embedding_model import get_embedding
+    from src.utils.llm_model import get_llm
+
+    with open(args.golden, encoding="utf-8") as f:
+        questions = [(item["question"], item["source"]) for item in map(json.loads, f) if item]
+    vectorstore = Chroma(collection_name="summaries", embedding_function=get_embedding(),
+                         persist_directory="data/processed/chroma_db/")
+    llm = get_llm() if args.llm else ScriptedLLM()
+    chain = RetrievalChain(vectorstore, llm=llm, llm_answer=llm,
+                           lexical_index=BM25Index.load(index_path("documents")))
+
+    print(f"{len(questions)} câu hỏi từ {args.golden}")
+    if args.llm:
+        evaluate("llm", chain, LLMSelector(chain.select_docid_chain), questions)
+    reranker = CrossEncoderReranker(top_k=1)
+    reranker.score("khởi động", ["tải model trước khi đo"])
+    evaluate("cross-encoder", chain, reranker, questions)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="độ trễ một lượt gọi LLM giả lập (giây)")
+    parser.add_argument("--pair-latency", type=float, default=0.004, help="độ trễ cross-encoder giả lập mỗi cặp (giây)")
+    parser.add_argument("--golden", help="file JSONL câu hỏi gán nhãn, chạy trên index thật")
+    parser.add_argument("--llm", action="store_true", help="đo cả bước chọn bằng LLM thật (cần API key)")
+    args = parser.parse_args()
+    if args.golden:
+        golden(args)
+    else:
+        synthetic(args)
+
+
+if __name__ == "__main__":
+    main()
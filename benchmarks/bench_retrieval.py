@@ -0,0 +1,52 @@
+"""
+So sánh truy hồi tuần tự (mỗi query một lần nhúng + một lần gọi Chroma)
+với truy hồi theo lô (một lần embed_documents + một truy vấn nhiều embedding).
+
+Chạy: python -m benchmarks.bench_retrieval
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import TOPICS, build_corpus
+from src.chains.retrieval_chain import RetrievalChain
+
+
+def timed(fn, queries, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn(queries)
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--call-latency", type=float, default=0.005, help="chi phí cố định mỗi lần gọi embedder (s)")
+    parser.add_argument("--text-latency", type=float, default=0.001, help="chi phí mỗi văn bản (s)")
+    args = parser.parse_args()
+
+    embeddings = HashEmbeddings(call_latency=args.call_latency, text_latency=args.text_latency)
+    vectorstore, byte_store = build_corpus(embeddings, args.docs)
+    llm = ScriptedLLM()
+    chain = RetrievalChain(vectorstore, llm=llm, llm_answer=llm, byte_store=byte_store)
+    queries = [f"thủ tục {TOPICS[i % len(TOPICS)]} như thế nào" for i in range(args.queries)]
+
+    loop_result, loop_ms = timed(chain._retrieve_loop, queries, args.rounds)
+    batch_result, batch_ms = timed(chain._retrieve_batch, queries, args.rounds)
+
+    same = [[d.metadata["doc_id"] for d in docs] for docs in loop_result] == \
+           [[d.metadata["doc_id"] for d in docs] for docs in batch_result]
+    print(f"docs={args.docs} queries={args.queries} rounds={args.rounds} same_results={same}")
+    for name, samples in (("loop", loop_ms), ("batch", batch_ms)):
+        print(f"{name:>5}: p50={statistics.median(samples):.2f}ms mean={statistics.mean(samples):.2f}ms")
+    print(f"speedup (p50): {statistics.median(loop_ms) / statistics.median(batch_ms):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Đo thời gian khởi động lạnh của server (container free tier bị khởi động lại thường xuyên):
+
+- import: thời gian `import backend_main` (tới lúc uvicorn nhận kết nối) và các module nặng đã bị nạp;
+- ready: từ lúc process bắt đầu tới khi /ready trả 200 (cây cũ không có /ready: ngay sau import);
+- first /chat: độ trễ request đầu tiên sau khi ready, và tổng thời gian từ lúc start tới câu trả lời đầu tiên.
+
+Mỗi phép đo chạy trong một process mới, thư mục làm việc tạm (index rỗng). Phần "serve" thay LLM bằng
+ScriptedLLM và model embedding bằng HashEmbeddings có thời gian tải `--model-load` giây ở lần gọi đầu
+(mô phỏng import torch + tải MiniLM), RERANKER=llm.
+
+Chạy: python -m benchmarks.bench_startup [--before /đường/dẫn/tới/cây/cũ]
+  (ví dụ git worktree add /tmp/before HEAD~1)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+HEAVY_MODULES = ("chromadb", "langchain_google_genai", "langgraph", "sentence_transformers", "torch",
+                 "docling", "selenium", "docx")
+QUESTION = "Điều kiện nhận học bổng khuyến khích học tập là gì?"
+
+
+def child_import():
+    start = time.perf_counter()
+    import backend_main  # noqa: F401
+    elapsed = time.perf_counter() - start
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(json.dumps({"import_s": elapsed, "loaded": loaded}))
+
+
+def child_serve(model_load: float):
+    start = time.perf_counter()
+    import src.utils.embedding_model as embedding_model
+    import src.utils.llm_model as llm_model
+    from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+
+    class ColdModel(HashEmbeddings):
+        """HashEmbeddings tốn `model_load` giây ở lần gọi đầu như model thật lúc tải trọng số."""
+
+        loaded = False
+
+        def _simulate_cost(self, n: int):
+            if not self.loaded:
+                time.sleep(model_load)
+                self.loaded = True
+            super()._simulate_cost(n)
+
+    llm_model.get_llm = llm_model.get_llm_answer = lambda: ScriptedLLM()
+    embedding_model.get_embedding = lambda: embedding_model.CachedEmbeddings(model=ColdModel(), cache_dir=None)
+
+    import uvicorn
+    import backend_main
+
+    # Server thật trên cổng ngẫu nhiên, gọi qua HTTP như readiness probe và người dùng
+    server = uvicorn.Server(uvicorn.Config(backend_main.app, host="127.0.0.1", port=0, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.005)
+    base = "http://127.0.0.1:%d" % server.servers[0].sockets[0].getsockname()[1]
+    while True:
+        try:
+            urllib.request.urlopen(base + "/ready")
+            break
+        except urllib.error.HTTPError as e:
+            if e.code != 503:  # cây cũ không có /ready
+                break
+        time.sleep(0.01)
+    ready = time.perf_counter() - start
+    t = time.perf_counter()
+    request = urllib.request.Request(base + "/chat", data=json.dumps({"message": QUESTION, "conversation_id": 1}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    response = json.loads(urllib.request.urlopen(request).read())
+    first_chat = time.perf_counter() - t
+    server.should_exit = True
+    answer = response["answer"]
+    print(json.dumps({"ready_s": ready, "first_chat_s": first_chat, "total_s": ready + first_chat,
+                      "error": answer if answer.startswith("Xin lỗi") else None}))
+
+
+def run_child(tree: str, mode: str, model_load: float) -> dict:
+    # Chạy file này theo đường dẫn để `src`, `backend_main` và `benchmarks.fakes` được import từ `tree`
+    env = dict(os.environ, PYTHONPATH=tree, GOOGLE_API_KEY=os.getenv("GOOGLE_API_KEY", "dummy"),
+               RERANKER="llm", SEMANTIC_CACHE="0", ANONYMIZED_TELEMETRY="False")
+    workdir = tempfile.mkdtemp(prefix="rag4hust_startup_")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--model-load", str(model_load)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--before", help="cây mã nguồn cũ để so sánh (ví dụ một git worktree)")
+    parser.add_argument("--model-load", type=float, default=3.0, help="giây tải model embedding giả lập")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=("import", "serve"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child == "import":
+        child_import()
+        return
+    if args.child == "serve":
+        child_serve(args.model_load)
+        return
+
+    trees = [("hiện tại", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))]
+    if args.before:
+        trees.insert(0, ("trước", os.path.abspath(args.before)))
+    print(f"model embedding giả lập tải {args.model_load:.1f} s, median của {args.repeat} lần (giây)")
+    for label, tree in trees:
+        imports = sorted((run_child(tree, "import", args.model_load) for _ in range(args.repeat)),
+                         key=lambda r: r["import_s"])
+        serves = sorted((run_child(tree, "serve", args.model_load) for _ in range(args.repeat)),
+                        key=lambda r: r["total_s"])
+        imp, serve = imports[len(imports) // 2], serves[len(serves) // 2]
+        print(f"{label:>9}: import={imp['import_s']:.2f} ready={serve['ready_s']:.2f} "
+              f"first /chat={serve['first_chat_s']:.2f} start→first answer={serve['total_s']:.2f}")
+        print(f"{'':>11}module nặng sau import: {', '.join(imp['loaded']) or '(không có)'}")
+        if serve["error"]:
+            print(f"{'':>11}lỗi: {serve['error']}")
+
+
+if __name__ == "__main__":
+    main()
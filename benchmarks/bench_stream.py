@@ -0,0 +1,68 @@
+"""
+So sánh thời gian tới token đầu tiên (TTFT) của luồng streaming với
+thời gian chờ toàn bộ graph (/chat) khi dùng LLM giả lập.
+
+Chạy: python -m benchmarks.bench_stream
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Đo pipeline thật, không để semantic cache trả lời thay
+os.environ.setdefault("SEMANTIC_CACHE", "0")
+# Chọn tài liệu bằng LLM giả lập (không tải model cross-encoder khi chạy offline)
+os.environ.setdefault("RERANKER", "llm")
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import TOPICS, build_corpus
+from src.agent import Agent
+from src.session_store import new_state
+
+
+async def full_graph(agent, question: str) -> float:
+    state = new_state()
+    state["question"] = question
+    start = time.perf_counter()
+    await agent.agent.ainvoke(state)
+    return time.perf_counter() - start
+
+
+async def streaming(agent, question: str):
+    state = new_state()
+    state["question"] = question
+    start = time.perf_counter()
+    first = None
+    async for event, _ in agent.graph.astream_answer(state):
+        if event == "token" and first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    vectorstore, byte_store = build_corpus(HashEmbeddings(), 100)
+    llm = ScriptedLLM(latency=args.llm_latency, token_latency=args.token_latency)
+    agent = Agent(llm=llm, vectorstore=vectorstore, byte_store=byte_store)
+
+    full, ttft, total = [], [], []
+    for i in range(args.rounds):
+        question = f"Điều kiện {TOPICS[i % len(TOPICS)]} là gì?"
+        full.append(asyncio.run(full_graph(agent, question)))
+        first, done = asyncio.run(streaming(agent, question))
+        ttft.append(first)
+        total.append(done)
+
+    print(f"/chat (full graph)  : p50={statistics.median(full) * 1000:.0f}ms")
+    print(f"/chat/stream TTFT   : p50={statistics.median(ttft) * 1000:.0f}ms")
+    print(f"/chat/stream total  : p50={statistics.median(total) * 1000:.0f}ms (summary chạy nền sau đó)")
+
+
+if __name__ == "__main__":
+    main()
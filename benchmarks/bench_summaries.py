@@ -0,0 +1,48 @@
+"""
+Đo thông lượng tóm tắt hàng loạt của VectorStore với LLM giả lập có giới hạn tần suất.
+
+So sánh:
+  - sequential: tóm tắt tuần tự (như trước, chưa tính time.sleep(5) mỗi tài liệu)
+  - unlimited:  chạy đồng thời nhưng không giới hạn phía client (bị 429, phải backoff)
+  - limited:    chạy đồng thời với token bucket đặt đúng giới hạn của nhà cung cấp
+
+Chạy: python -m benchmarks.bench_summaries
+"""
+import argparse
+import time
+
+from benchmarks.fakes import HashEmbeddings, RateLimitedLLM
+from benchmarks.fixtures import make_documents
+from src.vectorstore import VectorStore
+
+
+def run(label: str, docs, llm, **kwargs):
+    store = VectorStore(llm=llm, embedding=HashEmbeddings(), **kwargs)
+    start = time.perf_counter()
+    summaries = store.summaries_docs(docs, progress=None)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for s in summaries if s)
+    print(f"{label:>10}: {len(docs)} docs in {elapsed:.1f}s ({len(docs) / elapsed:.1f} docs/s), "
+          f"ok={ok}, 429 rejected={llm.rejected}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--provider-rpm", type=float, default=600)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    docs = make_documents(args.docs)
+    print(f"baseline cũ (tuần tự + sleep 5s): ~{args.docs * (args.latency + 5):.0f}s (ước tính)")
+    # Cửa sổ 1 giây để benchmark ngắn; giới hạn vẫn tương đương provider-rpm
+    provider = dict(latency=args.latency, rpm=args.provider_rpm, period=1.0)
+    run("sequential", docs, RateLimitedLLM(**provider), concurrency=1, rpm=None, tpm=None)
+    run("unlimited", docs, RateLimitedLLM(**provider), concurrency=args.concurrency, rpm=None, tpm=None)
+    run("limited", docs, RateLimitedLLM(**provider), concurrency=args.concurrency, rpm=args.provider_rpm, tpm=None)
+
+
+if __name__ == "__main__":
+    main()
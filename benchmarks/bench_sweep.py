@@ -0,0 +1,202 @@
+"""
+Quét các tham số truy hồi trên một tập câu hỏi gán nhãn (question, source đúng) và so sánh chất lượng với
+chi phí của từng cấu hình. Các tham số: k mỗi query (RETRIEVAL_K), số biến thể câu hỏi (NUM_QUERIES),
+hằng số k của RRF (RRF_K), số ứng viên đưa vào bước chọn (RERANK_CANDIDATES), số tài liệu được chọn (RERANK_TOP_K).
+
+Với mỗi cấu hình in:
+- R@top: tỉ lệ câu hỏi có nguồn đúng trong các tài liệu đưa vào prompt trả lời;
+- R@cand: tỉ lệ có nguồn đúng trong các ứng viên (top RRF) đưa vào bước chọn;
+- MRR: trung bình 1/thứ hạng của nguồn đúng trong danh sách ứng viên (0 nếu không có);
+- số lời gọi LLM, token prompt ước lượng mỗi câu hỏi, độ trễ p50/p95 mỗi câu hỏi (kể cả lời gọi trả lời,
+  trừ khi --no-answer).
+Cuối cùng đề xuất cấu hình ít token prompt nhất (rồi nhanh nhất) có R@top không thấp hơn cấu hình tốt nhất
+quá --tolerance.
+
+Mặc định chạy offline trên corpus sổ tay giả lập (LLM giả lập có độ trễ, embedder hash, truy hồi lai với BM25).
+Với --golden (file JSONL {"question", "source"}, xem benchmarks/golden_set.example.jsonl) thì chạy trên index
+thật trong data/processed/; thêm --llm để gọi Gemini (số token và độ trễ thật, tốn quota).
+
+Chạy: python -m benchmarks.bench_sweep
+      python -m benchmarks.bench_sweep --golden benchmarks/golden_set.example.jsonl --llm --output sweep.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+
+# Đo pipeline thật, không để semantic cache trả lời thay
+os.environ.setdefault("SEMANTIC_CACHE", "0")
+
+from benchmarks.fakes import HashEmbeddings, OverlapCrossEncoder, ScriptedLLM
+from benchmarks.fixtures import make_handbook_pages, make_handbook_paraphrases, make_handbook_questions
+from src import metrics
+from src.bm25 import BM25Index, index_path
+from src.chains.retrieval_chain import NUM_QUERIES, RETRIEVAL_K, RRF_K, RetrievalChain
+from src.reranker import RERANK_CANDIDATES, RERANK_TOP_K, CrossEncoderReranker, LLMSelector
+from src.vectorstore import VectorStore
+
+PARAMS = ("k", "num_queries", "rrf_k", "candidates", "top_k")
+CURRENT = dict(zip(PARAMS, (RETRIEVAL_K, NUM_QUERIES, RRF_K, RERANK_CANDIDATES, RERANK_TOP_K)))
+
+
+class RecordingReranker:
+    """Bọc reranker để giữ lại danh sách ứng viên (theo RRF) của lần chọn gần nhất, dùng tính R@cand và MRR."""
+
+    def __init__(self, reranker):
+        self.reranker = reranker
+        self.candidates = []
+
+    async def arerank(self, question: str, candidates):
+        self.candidates = candidates
+        return await self.reranker.arerank(question, candidates)
+
+
+def build_chain(setup: dict, config: dict, args) -> RetrievalChain:
+    llm = setup["llm"]
+    reranker = None
+    if args.reranker == "cross-encoder":
+        reranker = CrossEncoderReranker(model=setup.get("encoder"), top_k=config["top_k"])
+    chain = RetrievalChain(setup["vectorstore"], llm=llm, llm_answer=llm, docstore=setup["docstore"],
+                           lexical_index=setup["lexical_index"], reranker=reranker, k=config["k"],
+                           num_queries=config["num_queries"], rrf_k=config["rrf_k"],
+                           rerank_candidates=config["candidates"])
+    if reranker is None:
+        reranker = LLMSelector(chain.select_docid_chain, top_k=config["top_k"])
+    chain.reranker = RecordingReranker(reranker)
+    return chain
+
+
+async def evaluate(chain: RetrievalChain, questions, answer: bool) -> dict:
+    latencies, hits, candidate_hits, reciprocal_ranks, calls, tokens = [], 0, 0, [], 0, 0
+    for question, expected in questions:
+        chain.reranker.candidates = []
+        start = time.perf_counter()
+        with metrics.tracing() as trace:
+            docs, sources = await chain.aprepare(question)
+            if answer:
+                try:
+                    await chain.genarate_answer_chain.ainvoke({"context": docs, "question": question,
+                                                               "sources": sources,
+                                                               "format_instructions": chain.format_instructions})
+                except Exception as e:  # câu trả lời không đúng schema vẫn đã tốn token
+                    print(f"Lỗi khi trả lời '{question}': {e}")
+        latencies.append(time.perf_counter() - start)
+        hits += expected in sources
+        ranked = [doc.metadata.get("source") for doc, _ in chain.reranker.candidates]
+        candidate_hits += expected in ranked
+        reciprocal_ranks.append(1 / (ranked.index(expected) + 1) if expected in ranked else 0.0)
+        for stats in trace.to_dict()["llm"].values():
+            calls += stats["calls"]
+            tokens += stats["tokens_in"]
+    n = len(questions)
+    latencies.sort()
+    return {
+        "recall": round(hits / n, 3),
+        "candidate_recall": round(candidate_hits / n, 3),
+        "mrr": round(statistics.mean(reciprocal_ranks), 3),
+        "llm_calls": round(calls / n, 2),
+        "prompt_tokens": round(tokens / n),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[min(n - 1, int(n * 0.95))] * 1000, 1),
+    }
+
+
+def synthetic(args) -> tuple[dict, list]:
+    workdir = tempfile.mkdtemp(prefix="rag4hust_sweep_")
+    store = VectorStore(
+        llm=ScriptedLLM(), embedding=HashEmbeddings(), concurrency=8, rpm=None, tpm=None, index_mode="summary",
+        persist_directory=os.path.join(workdir, "chroma_db"),
+        store_path=os.path.join(workdir, "store"),
+        manifest_path=os.path.join(workdir, "manifest.json"),
+        bm25_dir=os.path.join(workdir, "bm25"),
+    )
+    store.save(make_handbook_pages(args.pages, args.sections))
+    setup = {
+        "llm": ScriptedLLM(latency=args.llm_latency),
+        "vectorstore": store._open().vectorstore,
+        "docstore": store.docstore,
+        "lexical_index": None if args.no_hybrid else store.lexical_index("documents"),
+        "encoder": OverlapCrossEncoder(call_latency=0.005, pair_latency=args.pair_latency),
+    }
+    questions = make_handbook_questions(args.pages, args.sections, per_page=1)
+    return setup, questions + make_handbook_paraphrases(args.pages, args.sections)
+
+
+def golden(args) -> tuple[dict, list]:
+    from src.registry import registry
+    from src.utils.llm_model import get_llm
+
+    with open(args.golden, encoding="utf-8") as f:
+        questions = [(item["question"], item["source"]) for item in map(json.loads, filter(str.strip, f))]
+    setup = {
+        "llm": get_llm() if args.llm else ScriptedLLM(latency=args.llm_latency),
+        "vectorstore": registry.get("vectorstore"),
+        "docstore": registry.get("docstore"),
+        "lexical_index": None if args.no_hybrid else BM25Index.load(index_path("documents")),
+    }
+    return setup, questions
+
+
+def ints(value: str):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=ints, default=[3, 5, 8], help="số tài liệu mỗi query, ví dụ 3,5,8")
+    parser.add_argument("--num-queries", type=ints, default=[0, 2, 5], help="số biến thể câu hỏi sinh bằng LLM")
+    parser.add_argument("--rrf-k", type=ints, default=[10, 60], help="hằng số k của reciprocal rank fusion")
+    parser.add_argument("--candidates", type=ints, default=[3, 7], help="số ứng viên đưa vào bước chọn")
+    parser.add_argument("--top-k", type=ints, default=[1, 2], help="số tài liệu được chọn đưa vào prompt trả lời")
+    parser.add_argument("--reranker", choices=("llm", "cross-encoder"), default="llm", help="cách chọn tài liệu")
+    parser.add_argument("--no-answer", action="store_true", help="không gọi bước trả lời (chỉ tính chi phí truy hồi)")
+    parser.add_argument("--no-hybrid", action="store_true", help="chỉ truy hồi vector, không dùng BM25")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="R@top được phép thấp hơn cấu hình tốt nhất")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--llm-latency", type=float, default=0.01, help="độ trễ một lượt gọi LLM giả lập (giây)")
+    parser.add_argument("--pair-latency", type=float, default=0.002, help="độ trễ cross-encoder giả lập mỗi cặp (giây)")
+    parser.add_argument("--golden", help="file JSONL câu hỏi gán nhãn, chạy trên index thật")
+    parser.add_argument("--llm", action="store_true", help="dùng LLM thật (cần API key), chỉ với --golden")
+    parser.add_argument("--output", help="ghi kết quả của mọi cấu hình ra file JSON")
+    args = parser.parse_args()
+
+    setup, questions = golden(args) if args.golden else synthetic(args)
+    grid = [dict(zip(PARAMS, values))
+            for values in itertools.product(args.k, args.num_queries, args.rrf_k, args.candidates, args.top_k)]
+    print(f"{len(questions)} câu hỏi, {len(grid)} cấu hình, chọn tài liệu bằng {args.reranker}")
+    print(f"{'k':>3} {'nq':>3} {'rrf':>4} {'cand':>4} {'top':>3} | {'R@top':>5} {'R@cand':>6} {'MRR':>5} | "
+          f"{'LLM':>4} {'token':>6} | {'p50 ms':>7} {'p95 ms':>7}")
+    results = []
+    for config in grid:
+        stats = asyncio.run(evaluate(build_chain(setup, config, args), questions, not args.no_answer))
+        results.append({**config, **stats})
+        marker = "  (hiện tại)" if config == CURRENT else ""
+        print(f"{config['k']:>3} {config['num_queries']:>3} {config['rrf_k']:>4} {config['candidates']:>4} "
+              f"{config['top_k']:>3} | {stats['recall']:>5.2f} {stats['candidate_recall']:>6.2f} {stats['mrr']:>5.2f} | "
+              f"{stats['llm_calls']:>4.1f} {stats['prompt_tokens']:>6} | {stats['p50_ms']:>7.0f} {stats['p95_ms']:>7.0f}"
+              f"{marker}")
+
+    best = max(result["recall"] for result in results)
+    eligible = [result for result in results if result["recall"] >= best - args.tolerance]
+    cheapest = min(eligible, key=lambda result: (result["prompt_tokens"], result["p50_ms"]))
+    print(f"\nR@top tốt nhất {best:.2f}; cấu hình rẻ nhất trong {args.tolerance:.2f}: "
+          + " ".join(f"{name}={cheapest[name]}" for name in PARAMS)
+          + f" (R@top={cheapest['recall']:.2f}, {cheapest['llm_calls']:.1f} lời gọi LLM, "
+            f"{cheapest['prompt_tokens']} token, p50 {cheapest['p50_ms']:.0f} ms)")
+    print("Biến môi trường tương ứng: " + " ".join(
+        f"{env}={cheapest[name]}" for env, name in zip(
+            ("RETRIEVAL_K", "NUM_QUERIES", "RRF_K", "RERANK_CANDIDATES", "RERANK_TOP_K"), PARAMS)))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"questions": len(questions), "reranker": args.reranker, "answer": not args.no_answer,
+                       "results": results, "recommended": cheapest}, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
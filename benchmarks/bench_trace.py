@@ -0,0 +1,99 @@
+"""
+Một lượt /chat tốn thời gian ở đâu: chạy vài lượt hỏi qua graph (LLM giả lập có độ trễ) với trace bật,
+in thời gian trung bình của từng node / bước truy hồi, token LLM theo call site và số tài liệu;
+đo thêm chi phí của instrumentation (một span, và một lượt hỏi có/không có trace).
+
+Chạy: python -m benchmarks.bench_trace
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from collections import defaultdict
+
+# Đo pipeline thật, không để semantic cache trả lời thay
+os.environ.setdefault("SEMANTIC_CACHE", "0")
+# Chọn tài liệu bằng LLM giả lập (không tải model cross-encoder khi chạy offline)
+os.environ.setdefault("RERANKER", "llm")
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import TOPICS, build_corpus
+from src import metrics
+from src.agent import Agent
+from src.session_store import new_state
+
+
+async def run_turns(agent, turns: int, debug: bool):
+    traces, latencies = [], []
+    for i in range(turns):
+        state = new_state()
+        state["question"] = f"Điều kiện {TOPICS[i % len(TOPICS)]} là gì?"
+        start = time.perf_counter()
+        with metrics.tracing(debug) as trace:
+            await agent.agent.ainvoke(state)
+        latencies.append(time.perf_counter() - start)
+        if trace is not None:
+            traces.append(trace.to_dict())
+    return traces, latencies
+
+
+def summarize(traces):
+    spans = defaultdict(list)
+    documents = defaultdict(list)
+    llm = defaultdict(lambda: [0, 0, 0])
+    for trace in traces:
+        for span in trace["spans"]:
+            spans[(span["kind"], span["name"])].append(span["ms"])
+            if "documents" in span:
+                documents[span["name"]].append(span["documents"])
+        for site, stats in trace["llm"].items():
+            llm[site][0] += stats["calls"]
+            llm[site][1] += stats["tokens_in"]
+            llm[site][2] += stats["tokens_out"]
+    total = statistics.median(trace["total_ms"] for trace in traces)
+    print(f"  lượt hỏi: median {total:.0f} ms")
+    for (kind, name), values in sorted(spans.items(), key=lambda item: (item[0][0] != "node", -statistics.median(item[1]))):
+        if kind == "cache":
+            continue
+        print(f"  {kind:>5} {name:<18} median {statistics.median(values):7.1f} ms  ({len(values)} lần)")
+    for name, values in documents.items():
+        print(f"  tài liệu sau {name:<10} median {statistics.median(values):.0f}")
+    for site, (calls, tokens_in, tokens_out) in sorted(llm.items()):
+        print(f"  LLM {site:<18} {calls / len(traces):.1f} lời gọi/lượt, token {tokens_in // len(traces)} vào "
+              f"/ {tokens_out // len(traces)} ra mỗi lượt")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--span-repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    vectorstore, byte_store = build_corpus(HashEmbeddings(), 100)
+    for mode in ("default", "fast"):
+        agent = Agent(mode=mode, llm=ScriptedLLM(latency=args.llm_latency), vectorstore=vectorstore,
+                      byte_store=byte_store)
+        traces, _ = asyncio.run(run_turns(agent, args.turns, debug=True))
+        print(f"{mode}:")
+        summarize(traces)
+
+    # Chi phí instrumentation: một span (không trace / có trace) và một lượt hỏi với LLM không độ trễ
+    for label, enabled in (("không trace", False), ("có trace", True)):
+        with metrics.tracing(enabled):
+            start = time.perf_counter()
+            for _ in range(args.span_repeat):
+                with metrics.span("stage", "bench"):
+                    pass
+            per_span = (time.perf_counter() - start) / args.span_repeat
+        print(f"span ({label}): {per_span * 1e6:.1f} µs")
+    agent = Agent(mode="fast", llm=ScriptedLLM(), vectorstore=vectorstore, byte_store=byte_store)
+    for label, debug in (("không trace", False), ("có trace", True)):
+        _, latencies = asyncio.run(run_turns(agent, args.turns * 4, debug))
+        print(f"lượt hỏi, LLM 0 ms ({label}): median {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"/metrics: {len(metrics.render().splitlines())} dòng")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+So sánh backend vector Chroma với NumpyVectorStore (ma trận float16 memmap) trên cùng dữ liệu:
+thời gian khởi động (import + mở collection + truy vấn đầu tiên), độ trễ p50/p99 của một truy vấn
+nhiều query (như RetrievalChain._retrieve_batch) và RSS của process. "numpy-f16" là NumpyVectorStore
+không giữ bản float32 trong RAM (float32_cache=False).
+
+Mỗi backend đo trong một process riêng để RSS và thời gian import không ảnh hưởng lẫn nhau.
+Chạy: python -m benchmarks.bench_vector_backend
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+COLLECTION = "summaries"
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build(directory: str, n_docs: int, dim: int):
+    from benchmarks.fakes import HashEmbeddings
+    from src.vectorstore import open_collection
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n_docs, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"doc-{i}" for i in range(n_docs)]
+    documents = [f"Tóm tắt {i}: quy định về học bổng, học phí và nghỉ học cho sinh viên khoá {i % 7}" for i in range(n_docs)]
+    metadatas = [{"doc_id": doc_id, "source": f"https://sv-ctt.hust.edu.vn/#/so-tay-sv/{i}"} for i, doc_id in enumerate(ids)]
+    for backend in ("chroma", "numpy"):
+        collection = open_collection(COLLECTION, HashEmbeddings(dim=dim), directory, backend)._collection
+        for start in range(0, n_docs, 1000):
+            end = start + 1000
+            collection.upsert(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                              documents=documents[start:end], metadatas=metadatas[start:end])
+
+
+def child(backend: str, directory: str, dim: int, queries: int, repeat: int):
+    start = time.perf_counter()
+    from benchmarks.fakes import HashEmbeddings
+
+    # Chỉ import backend đang đo
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+        collection = Chroma(collection_name=COLLECTION, embedding_function=HashEmbeddings(dim=dim),
+                            persist_directory=directory)._collection
+    else:
+        from src.numpy_store import NumpyVectorStore
+        collection = NumpyVectorStore(COLLECTION, HashEmbeddings(dim=dim), directory,
+                                      float32_cache=backend == "numpy")
+    rng = np.random.default_rng(1)
+    batches = [rng.standard_normal((queries, dim)).astype(np.float32).tolist() for _ in range(repeat)]
+    collection.query(query_embeddings=batches[0], n_results=5, include=["documents", "metadatas"])
+    startup = time.perf_counter() - start
+
+    timings = []
+    for batch in batches:
+        t = time.perf_counter()
+        collection.query(query_embeddings=batch, n_results=5, include=["documents", "metadatas"])
+        timings.append((time.perf_counter() - t) * 1000)
+    timings.sort()
+    print(json.dumps({
+        "startup_ms": startup * 1000,
+        "p50_ms": statistics.median(timings),
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "rss_mb": rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=5, help="số query mỗi lần truy vấn")
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--child", nargs=2, metavar=("BACKEND", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.dim, args.queries, args.repeat)
+        return
+
+    directory = tempfile.mkdtemp(prefix="rag4hust_vectors_")
+    build(directory, args.docs, args.dim)
+    print(f"{args.docs} vector x {args.dim} chiều, {args.queries} query/lần, {args.repeat} lần")
+    for backend in ("chroma", "numpy", "numpy-f16"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_vector_backend", "--child", backend, directory,
+             "--dim", str(args.dim), "--queries", str(args.queries), "--repeat", str(args.repeat)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        stats = json.loads(output.strip().splitlines()[-1])
+        print(f"{backend:>9}: startup={stats['startup_ms']:.0f} ms, p50={stats['p50_ms']:.2f} ms, "
+              f"p99={stats['p99_ms']:.2f} ms, RSS={stats['rss_mb']:.0f} MB")
+    sizes = {}
+    for name in os.listdir(directory):
+        kind = "numpy" if name.startswith(COLLECTION + ".") else "chroma"
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            sizes[kind] = sizes.get(kind, 0) + sum(os.path.getsize(os.path.join(root, f))
+                                                   for root, _, files in os.walk(path) for f in files)
+        else:
+            sizes[kind] = sizes.get(kind, 0) + os.path.getsize(path)
+    print("Dung lượng trên đĩa: " + ", ".join(f"{kind}={size / 1e6:.1f} MB" for kind, size in sorted(sizes.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Các thành phần giả lập dùng cho benchmark, chạy hoàn toàn offline.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Embedder xác định (deterministic) dựa trên hash của từng từ.
+    Mỗi lần gọi tốn `call_latency` + `text_latency` * số văn bản để mô phỏng
+    chi phí forward pass của mô hình thật.
+    """
+
+    def __init__(self, dim: int = 384, call_latency: float = 0.0, text_latency: float = 0.0):
+        self.dim = dim
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _simulate_cost(self, n: int):
+        self.calls += 1
+        self.texts += n
+        delay = self.call_latency + self.text_latency * n
+        if delay:
+            time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._simulate_cost(len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._simulate_cost(1)
+        return self._embed(text)
+
+
+class OverlapCrossEncoder:
+    """
+    Cross-encoder giả lập (cùng giao diện `predict` với sentence_transformers.CrossEncoder):
+    điểm là tỉ lệ token của câu hỏi có trong văn bản, token hiếm trong cặp được tính nặng hơn.
+    Mỗi lần predict tốn `call_latency` + `pair_latency` * số cặp (mô phỏng suy luận trên CPU).
+    """
+
+    def __init__(self, call_latency: float = 0.0, pair_latency: float = 0.0):
+        self.call_latency = call_latency
+        self.pair_latency = pair_latency
+        self.calls = 0
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size: int = 32, show_progress_bar: bool = False):
+        from src.bm25 import tokenize
+
+        self.calls += 1
+        self.pairs += len(pairs)
+        delay = self.call_latency + self.pair_latency * len(pairs)
+        if delay:
+            time.sleep(delay)
+        scores = []
+        for question, text in pairs:
+            terms = set(tokenize(question))
+            found = set(tokenize(text))
+            # Token nhiều ký tự (mã, từ ghép) mang nhiều thông tin hơn âm tiết đơn
+            weight = sum(len(term) for term in terms) or 1
+            scores.append(sum(len(term) for term in terms & found) / weight)
+        return scores
+
+
+Response = Union[str, Callable[[str], str]]
+
+
+def _select_first_doc_id(prompt: str) -> str:
+    match = re.search(r"'doc_id': '([^']+)'", prompt)
+    return match.group(1) if match else ""
+
+
+def _answer_json(prompt: str) -> str:
+    match = re.search(r"Nguồn tương ứng: (\[.*?\])", prompt)
+    sources = re.findall(r"'([^']+)'", match.group(1)) if match else []
+    return json.dumps({"answer": "Câu trả lời giả lập.", "sources": sources}, ensure_ascii=False)
+
+
+def _extractive_summary(prompt: str) -> str:
+    """Tóm tắt giả lập: lấy phần đầu của tài liệu đầu vào (đủ để truy hồi theo từ khoá)."""
+    match = re.search(r"ĐẦU VÀO:(.*?)\n\s*ĐẦU RA:", prompt, re.S)
+    text = " ".join((match.group(1) if match else "").split())
+    return text[:600] or "Tóm tắt giả lập của tài liệu."
+
+
+def _five_queries(prompt: str) -> str:
+    match = re.search(r"Câu hỏi gốc: (.*)", prompt)
+    question = match.group(1).strip() if match else "câu hỏi"
+    return "\n".join(f"{question} (biến thể {i})" for i in range(1, 6))
+
+
+def _rewritten_question(prompt: str) -> str:
+    match = re.search(r"Câu hỏi: (.*)", prompt)
+    return match.group(1).strip() if match else ""
+
+
+def _plan_json(prompt: str) -> str:
+    match = re.search(r"Câu hỏi hiện tại: (.*)", prompt)
+    question = match.group(1).strip() if match else "câu hỏi"
+    queries = [f"{question} (biến thể {i})" for i in range(1, 6)]
+    return json.dumps({"follow_up": False, "question": question, "queries": queries}, ensure_ascii=False)
+
+
+# (chuỗi nhận diện prompt, phản hồi) cho toàn bộ các prompt của graph và VectorStore
+GRAPH_RULES: List[Tuple[str, Response]] = [
+    ("bộ lập kế hoạch truy hồi", _plan_json),
+    ("tiếp nối của câu hỏi trước đó", "no"),
+    ("chuyên gia viết lại câu hỏi", _rewritten_question),
+    ("năm phiên bản khác nhau", _five_queries),
+    ("chọn ra các tài liệu phù hợp nhất", _select_first_doc_id),
+    ("Bạn là trợ lý RAG trả lời trực tiếp", "Theo sổ tay sinh viên, sinh viên cần nộp hồ sơ đúng hạn "
+                                            "và theo dõi thông báo trên trang ctt của trường."),
+    ("Bạn là trợ lý RAG", _answer_json),
+    ("tìm kiếm câu trả lời trên internet", "no"),
+    ("tóm tắt cuộc hội thoại", "Người dùng hỏi về quy định trong sổ tay sinh viên."),
+    ("chuyên gia về giao tiếp", "Xin chào, mình có thể giúp gì cho bạn?"),
+    ("bộ tóm tắt tối ưu", _extractive_summary),
+]
+
+
+class ScriptedLLM(LLM):
+    """
+    LLM giả lập trả lời theo nội dung prompt (tra theo `rules`), có độ trễ cấu hình được.
+    `_acall` dùng asyncio.sleep nên nhiều lời gọi đồng thời không chặn event loop.
+    Khi stream, `latency` là thời gian tới token đầu, mỗi token tiếp theo tốn `token_latency`.
+    Đếm số lời gọi theo từng rule trong `calls`.
+    """
+
+    rules: List[Tuple[str, Any]] = GRAPH_RULES
+    latency: float = 0.0
+    token_latency: float = 0.0
+    default: str = ""
+    calls: Dict[str, int] = {}
+    lock: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _respond(self, prompt: str) -> str:
+        for marker, response in self.rules:
+            if marker in prompt:
+                with self.lock:
+                    self.calls[marker] = self.calls.get(marker, 0) + 1
+                return response(prompt) if callable(response) else response
+        with self.lock:
+            self.calls["<default>"] = self.calls.get("<default>", 0) + 1
+        return self.default
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        for i, token in enumerate(re.split(r"(?<= )", self._respond(prompt))):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield GenerationChunk(text=token)
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i, token in enumerate(re.split(r"(?<= )", self._respond(prompt))):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield GenerationChunk(text=token)
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class RateLimitedLLM(ScriptedLLM):
+    """
+    ScriptedLLM có giới hạn tần suất giống nhà cung cấp thật: quá `rpm` lời gọi/phút
+    (đo trên cửa sổ trượt `period` giây) thì ném lỗi 429 (không tốn độ trễ).
+    """
+
+    rpm: float = 60.0
+    period: float = 60.0
+    rejected: int = 0
+    window: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self.window = []
+        self.rejected = 0
+
+    def _admit(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] > self.period:
+                self.window.pop(0)
+            if len(self.window) >= self.rpm * self.period / 60.0:
+                self.rejected += 1
+                raise RateLimitError("429 Resource has been exhausted (e.g. check quota).")
+            self.window.append(now)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        self._admit()
+        return super()._call(prompt, stop, run_manager, **kwargs)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        self._admit()
+        return await super()._acall(prompt, stop, run_manager, **kwargs)
+
+
+class UnavailableError(Exception):
+    pass
+
+
+class FlakyLLM(ScriptedLLM):
+    """
+    ScriptedLLM giống API thật lúc quá tải: mỗi lời gọi có xác suất `failure_rate` lỗi 503 ngay lập tức
+    và xác suất `hang_rate` treo `hang_latency` giây. Ghi lại số lời gọi đang chạy cùng lúc lớn nhất.
+    """
+
+    failure_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_latency: float = 30.0
+    seed: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    rng: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self.rng = random.Random(self.seed)
+
+    def _enter(self) -> float:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            roll = self.rng.random()
+        if roll < self.failure_rate:
+            with self.lock:
+                self.in_flight -= 1
+                self.failures += 1
+            raise UnavailableError("503 UNAVAILABLE: The model is overloaded. Please try again later.")
+        return self.hang_latency if roll < self.failure_rate + self.hang_rate else 0.0
+
+    def _exit(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        delay = self._enter()
+        try:
+            time.sleep(delay)
+            return super()._call(prompt, stop, run_manager, **kwargs)
+        finally:
+            self._exit()
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        delay = self._enter()
+        try:
+            await asyncio.sleep(delay)
+            return await super()._acall(prompt, stop, run_manager, **kwargs)
+        finally:
+            self._exit()
@@ -0,0 +1,180 @@
+"""
+Dữ liệu mẫu (corpus giả lập) cho benchmark.
+"""
+import contextlib
+import http.server
+import json
+import threading
+import uuid
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.stores import InMemoryByteStore
+from langchain.retrievers.multi_vector import MultiVectorRetriever
+
+TOPICS = ["học bổng", "miễn giảm học phí", "vay vốn ngân hàng", "đăng ký học phần", "ký túc xá",
+          "bảo hiểm y tế", "thực tập", "tốt nghiệp", "chuyển ngành", "nghỉ học tạm thời"]
+
+
+def make_documents(n_docs: int):
+    """Sinh n tài liệu gốc giống trang sổ tay sinh viên."""
+    return [
+        Document(
+            page_content=(
+                f"Quy định về {TOPICS[i % len(TOPICS)]} cho sinh viên khoá {i % 7}.\n"
+                + "\n".join(f"Điều {j}: nội dung chi tiết số {j} về {TOPICS[i % len(TOPICS)]}." for j in range(1, 20))
+            ),
+            metadata={"source": f"https://sv-ctt.hust.edu.vn/#/so-tay-sv/{i}/trang-{i}"},
+        )
+        for i in range(n_docs)
+    ]
+
+
+def make_handbook_pages(n_pages: int, sections: int = 6):
+    """
+    Sinh các trang sổ tay dài (nhiều mục Markdown, mỗi trang có một bảng), mỗi mục có mã quy định
+    riêng "QĐ-{trang}-{mục}" để tạo câu hỏi có đáp án xác định (xem make_handbook_questions).
+    """
+    docs = []
+    for i in range(n_pages):
+        topic = TOPICS[i % len(TOPICS)]
+        parts = [f"# {topic.capitalize()} (trang {i})"]
+        for s in range(sections):
+            parts.append(f"## Mục {s}: {topic} — nội dung {s}")
+            parts.append(" ".join(
+                f"Theo mã quy định QĐ-{i}-{s}, sinh viên khoá {i % 7} thực hiện bước {j} về {topic} "
+                f"trước ngày {j + 1}/{s + 1} và nộp minh chứng cho phòng công tác sinh viên."
+                for j in range(6)
+            ))
+            if s == sections // 2:
+                parts.append("| Đối tượng | Mức hỗ trợ | Thời hạn |\n|---|---|---|\n" + "\n".join(
+                    f"| Nhóm {r} ({topic}) | {(r + 1) * 10}% | {r + 1} tháng |" for r in range(8)
+                ))
+        docs.append(Document(
+            page_content="\n\n".join(parts),
+            metadata={"source": f"https://sv-ctt.hust.edu.vn/#/so-tay-sv/{i}/trang-{i}", "header": topic},
+        ))
+    return docs
+
+
+def make_handbook_questions(n_pages: int, sections: int = 6, per_page: int = 2):
+    """Câu hỏi gán nhãn cho make_handbook_pages: list (câu hỏi, source đúng)."""
+    questions = []
+    for i in range(n_pages):
+        topic = TOPICS[i % len(TOPICS)]
+        for q in range(per_page):
+            s = (i + q * 3) % sections
+            questions.append((
+                f"Mã quy định QĐ-{i}-{s} yêu cầu sinh viên khoá {i % 7} làm gì về {topic}?",
+                f"https://sv-ctt.hust.edu.vn/#/so-tay-sv/{i}/trang-{i}",
+            ))
+    return questions
+
+
+def make_handbook_paraphrases(n_pages: int, sections: int = 6):
+    """
+    Câu hỏi kiểu người dùng cho make_handbook_pages: không nêu mã quy định, chỉ chủ đề, khoá và mục,
+    nên các trang cùng chủ đề cạnh tranh nhau. Returns: list (câu hỏi, source đúng).
+    """
+    return [
+        (f"Sinh viên khoá {i % 7} cần nộp minh chứng gì về {TOPICS[i % len(TOPICS)]} ở mục {i % sections}?",
+         f"https://sv-ctt.hust.edu.vn/#/so-tay-sv/{i}/trang-{i}")
+        for i in range(n_pages)
+    ]
+
+
+def build_corpus(embeddings, n_docs: int):
+    """
+    Tạo collection summaries trong bộ nhớ và docstore tương ứng.
+
+    Returns:
+        (vectorstore, byte_store)
+    """
+    vectorstore = Chroma(collection_name=f"bench_{uuid.uuid4().hex[:8]}", embedding_function=embeddings)
+    byte_store = InMemoryByteStore()
+    docs = make_documents(n_docs)
+    doc_ids = [str(i) for i in range(n_docs)]
+    summaries = [
+        Document(
+            page_content=f"Tóm tắt {i}: quy định về {TOPICS[i % len(TOPICS)]} cho sinh viên khoá {i % 7}",
+            metadata={"doc_id": doc_ids[i], "source": docs[i].metadata["source"]},
+        )
+        for i in range(n_docs)
+    ]
+    retriever = MultiVectorRetriever(vectorstore=vectorstore, byte_store=byte_store, id_key="doc_id")
+    retriever.vectorstore.add_documents(summaries)
+    retriever.docstore.mset(list(zip(doc_ids, docs)))
+    return vectorstore, byte_store
+
+
+def make_html_pages(n_pages: int, rows: int = 40, cols: int = 6, render_delay_ms: int = 300):
+    """
+    Sinh các trang HTML giống trang sổ tay sinh viên: header h2, `.tip-detail` được JS render
+    sau `render_delay_ms` (mô phỏng SPA), gồm đoạn văn, link "TẠI ĐÂY" và một bảng rows×cols.
+
+    Returns:
+        dict đường dẫn -> nội dung HTML
+    """
+    pages = {}
+    for i in range(n_pages):
+        topic = TOPICS[i % len(TOPICS)]
+        header_cells = "".join(f"<th>Cột {c}</th>" for c in range(cols))
+        body_rows = "".join(
+            "<tr>" + "".join(
+                f'<td><a href="https://example.edu.vn/{i}/{r}/{c}">TẠI ĐÂY</a></td>' if c == cols - 1
+                else f"<td>{topic} {r}.{c}</td>"
+                for c in range(cols)
+            ) + "</tr>"
+            for r in range(rows)
+        )
+        content = (
+            f"<p>Quy định về {topic} cho sinh viên khoá {i % 7}.</p>"
+            f'<p>Xem hướng dẫn <a href="https://example.edu.vn/{i}">TẠI ĐÂY</a>.</p>'
+            f"<table><thead><tr>{header_cells}</tr></thead><tbody>{body_rows}</tbody></table>"
+            f"<p>Mọi thắc mắc về {topic} liên hệ phòng công tác sinh viên.</p>"
+        )
+        pages[f"/so-tay-sv/{i}.html"] = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"></head>
+<body>
+<div class="header"><h2>Trang {i}: {topic}</h2></div>
+<div id="root"></div>
+<script>
+setTimeout(function () {{
+  var div = document.createElement("div");
+  div.className = "tip-detail";
+  div.innerHTML = {json.dumps(content, ensure_ascii=False)};
+  document.getElementById("root").appendChild(div);
+}}, {render_delay_ms});
+</script>
+</body></html>"""
+    return pages
+
+
+@contextlib.contextmanager
+def serve_pages(pages):
+    """Phục vụ `pages` qua http.server trên một cổng ngẫu nhiên; trả về base URL."""
+    encoded = {path: html.encode("utf-8") for path, html in pages.items()}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = encoded.get(self.path.split("?")[0])
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,281 @@
+"""
+Bộ benchmark hiệu năng chạy offline (LLM giả lập có độ trễ, embedder hash xác định), ghi kết quả ra JSON
+để so sánh giữa các commit:
+
+- graph:     p50/p95 độ trễ một lượt hỏi qua Agent (chế độ default và fast), số lời gọi LLM mỗi lượt;
+- retrieval: p50/p95 của RetrievalChain.run và thời gian từng bước (expand_queries, retrieve, select_docid, ...);
+- ingestion: thông lượng VectorStore.save (tài liệu/giây) khi index lần đầu và khi index lại không đổi;
+- chat:      thông lượng và độ trễ /chat dưới tải đồng thời (server uvicorn thật, nhiều client HTTP).
+
+Chạy: python -m benchmarks.run_all [--only graph,chat] [--output kết_quả.json]
+      python -m benchmarks.run_all --compare benchmarks/results/<commit cũ>.json
+  (mặc định ghi vào benchmarks/results/<commit>.json; --compare in thay đổi của từng chỉ số so với file cũ
+   và thoát với mã 1 nếu có chỉ số chậm đi quá --max-regression)
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Đo pipeline thật, không để semantic cache trả lời thay
+os.environ.setdefault("SEMANTIC_CACHE", "0")
+# Chọn tài liệu bằng LLM giả lập (không tải model cross-encoder khi chạy offline)
+os.environ.setdefault("RERANKER", "llm")
+# Server trong phần "chat" dùng agent giả lập, không tạo agent thật khi khởi động
+os.environ.setdefault("WARM_UP", "0")
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import TOPICS, build_corpus, make_documents
+from src import metrics
+from src.agent import Agent
+from src.registry import registry
+from src.session_store import new_state
+from src.utils.llm_gateway import LLM_CONCURRENCY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTIONS = ("graph", "retrieval", "ingestion", "chat")
+
+
+def question(i: int) -> str:
+    return f"Điều kiện {TOPICS[i % len(TOPICS)]} là gì?"
+
+
+def percentiles(seconds) -> dict:
+    values = sorted(seconds)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]
+    return {"p50_ms": round(pick(0.5) * 1000, 2), "p95_ms": round(pick(0.95) * 1000, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2)}
+
+
+# ------------------------------------ graph ------------------------------------ #
+def bench_graph(args, vectorstore, byte_store) -> dict:
+    async def turns(agent, llm):
+        latencies, calls = [], []
+        for i in range(args.turns):
+            state = new_state()
+            state["question"] = question(i)
+            before = llm.total_calls
+            start = time.perf_counter()
+            await agent.agent.ainvoke(state)
+            latencies.append(time.perf_counter() - start)
+            calls.append(llm.total_calls - before)
+        return latencies, calls
+
+    results = {}
+    for mode in ("default", "fast"):
+        llm = ScriptedLLM(latency=args.llm_latency)
+        agent = Agent(mode=mode, llm=llm, vectorstore=vectorstore, byte_store=byte_store)
+        latencies, calls = asyncio.run(turns(agent, llm))
+        results[mode] = {**percentiles(latencies), "llm_calls_per_turn": round(sum(calls) / len(calls), 2)}
+        print(f"graph {mode:>7}: p50={results[mode]['p50_ms']:.0f}ms p95={results[mode]['p95_ms']:.0f}ms "
+              f"LLM calls/turn={results[mode]['llm_calls_per_turn']}")
+    return results
+
+
+# ---------------------------------- retrieval ---------------------------------- #
+def bench_retrieval(args, vectorstore, byte_store) -> dict:
+    from src.chains.retrieval_chain import RetrievalChain
+
+    llm = ScriptedLLM(latency=args.llm_latency)
+    chain = RetrievalChain(vectorstore, llm=llm, llm_answer=llm, byte_store=byte_store)
+    latencies, stages = [], {}
+    for i in range(args.turns):
+        start = time.perf_counter()
+        with metrics.tracing() as trace:
+            chain.run(question(i))
+        latencies.append(time.perf_counter() - start)
+        for span in trace.to_dict()["spans"]:
+            if span["kind"] == "stage":
+                stages.setdefault(span["name"], []).append(span["ms"] / 1000)
+    results = {"run": percentiles(latencies), "stages": {name: percentiles(values) for name, values in stages.items()}}
+    print(f"retrieval run: p50={results['run']['p50_ms']:.0f}ms p95={results['run']['p95_ms']:.0f}ms")
+    for name, values in results["stages"].items():
+        print(f"{'':>14}{name:<16} p50={values['p50_ms']:.1f}ms")
+    return results
+
+
+# ---------------------------------- ingestion ---------------------------------- #
+def bench_ingestion(args) -> dict:
+    from src.vectorstore import VectorStore
+
+    workdir = tempfile.mkdtemp(prefix="rag4hust_bench_")
+    llm = ScriptedLLM(latency=args.llm_latency)
+    store = VectorStore(
+        llm=llm, embedding=HashEmbeddings(), concurrency=8, rpm=None, tpm=None,
+        persist_directory=os.path.join(workdir, "chroma_db"), store_path=os.path.join(workdir, "store"),
+        manifest_path=os.path.join(workdir, "manifest.json"), bm25_dir=os.path.join(workdir, "bm25"),
+    )
+    docs = make_documents(args.docs)
+    results = {"index_mode": store.index_mode}
+    for label in ("full", "no_op"):
+        before = llm.total_calls
+        start = time.perf_counter()
+        store.save(docs)
+        elapsed = time.perf_counter() - start
+        results[label] = {"seconds": round(elapsed, 3), "docs_per_s": round(len(docs) / elapsed, 1),
+                          "llm_calls": llm.total_calls - before}
+        print(f"ingestion {label:>5}: {len(docs)} tài liệu trong {elapsed:.2f}s "
+              f"({results[label]['docs_per_s']:.0f} tài liệu/s), LLM calls={results[label]['llm_calls']}")
+    return results
+
+
+# ------------------------------------- chat ------------------------------------- #
+def bench_chat(args, vectorstore, byte_store) -> dict:
+    import uvicorn
+    import backend_main
+
+    llm = ScriptedLLM(latency=args.llm_latency)
+    registry.set("agent", Agent(mode=args.chat_mode, llm=llm, vectorstore=vectorstore, byte_store=byte_store))
+    server = uvicorn.Server(uvicorn.Config(backend_main.app, host="127.0.0.1", port=0, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.005)
+    url = "http://127.0.0.1:%d/chat" % server.servers[0].sockets[0].getsockname()[1]
+
+    def one(i: int):
+        # Mỗi client một conversation_id: các lượt của cùng một client chạy tuần tự như người dùng thật
+        body = json.dumps({"message": question(i), "conversation_id": i % args.concurrency + 1}).encode("utf-8")
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            answer = json.loads(urllib.request.urlopen(request, timeout=60).read())["answer"]
+            ok = not answer.startswith("Xin lỗi")
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            responses = list(pool.map(one, range(args.requests)))
+        wall = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        thread.join()
+    errors = sum(1 for ok, _ in responses if not ok)
+    # LLM_CONCURRENCY (semaphore của LLM gateway) giới hạn số lời gọi LLM đồng thời của cả server
+    results = {"mode": args.chat_mode, "concurrency": args.concurrency, "requests": args.requests,
+               "llm_concurrency": LLM_CONCURRENCY,
+               "errors": errors, "requests_per_s": round(args.requests / wall, 2),
+               **percentiles([latency for _, latency in responses])}
+    print(f"chat: {args.requests} request, {args.concurrency} client đồng thời: {results['requests_per_s']} req/s, "
+          f"p50={results['p50_ms']:.0f}ms p95={results['p95_ms']:.0f}ms, lỗi={errors}")
+    return results
+
+
+# ------------------------------------ so sánh ------------------------------------ #
+def flatten(data: dict, prefix: str = "") -> dict:
+    values = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> int:
+    """In thay đổi của các chỉ số thời gian/thông lượng; trả về số chỉ số chậm đi quá max_regression."""
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"\nSo với {baseline['commit']} ({baseline['timestamp']}):")
+    changed = {key for key in current["params"].keys() | baseline["params"].keys()
+               if key not in ("only", "max_regression")
+               and current["params"].get(key) != baseline["params"].get(key)}
+    if changed:
+        print("  Cảnh báo: tham số khác nhau, số liệu không so sánh trực tiếp được: " + ", ".join(
+            f"{key}={baseline['params'].get(key)}→{current['params'].get(key)}" for key in sorted(changed)))
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        # _ms, seconds: càng nhỏ càng tốt; _per_s: càng lớn càng tốt; còn lại (số lời gọi, cấu hình) chỉ in khi đổi
+        lower_is_better = key.endswith("_ms") or key.endswith("seconds")
+        higher_is_better = key.endswith("_per_s")
+        if not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        if not (lower_is_better or higher_is_better):
+            if new[key] != old[key]:
+                print(f"  {key:<42} {old[key]} → {new[key]}")
+            continue
+        worse = change if lower_is_better else -change
+        flag = ""
+        if worse > max_regression:
+            flag = "  <-- chậm hơn"
+            regressions += 1
+        print(f"  {key:<42} {old[key]:>10} → {new[key]:>10} ({change:+.1%}){flag}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", default=",".join(SECTIONS), help=f"các phần cần chạy, trong {', '.join(SECTIONS)}")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--docs", type=int, default=100, help="số tài liệu của corpus truy hồi và của phần ingestion")
+    parser.add_argument("--turns", type=int, default=20, help="số lượt hỏi cho graph và retrieval")
+    parser.add_argument("--requests", type=int, default=100, help="số request /chat")
+    parser.add_argument("--concurrency", type=int, default=16, help="số client /chat đồng thời")
+    parser.add_argument("--chat-mode", choices=("default", "fast"), default="fast")
+    parser.add_argument("--output", help="file JSON kết quả (mặc định benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="file JSON của một lần chạy trước để so sánh")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args()
+    sections = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"phần không hợp lệ: {', '.join(sorted(unknown))}")
+
+    registry.set("embedding", HashEmbeddings())
+    vectorstore, byte_store = build_corpus(HashEmbeddings(), args.docs)
+    results = {}
+    runners = {
+        "graph": lambda: bench_graph(args, vectorstore, byte_store),
+        "retrieval": lambda: bench_retrieval(args, vectorstore, byte_store),
+        "ingestion": lambda: bench_ingestion(args),
+        "chat": lambda: bench_chat(args, vectorstore, byte_store),
+    }
+    for name in sections:
+        results[name] = runners[name]()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"Đã ghi kết quả vào {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,29 @@
+import os
+
 from src.loader import Loader
 from src.vectorstore import VectorStore
 from src.crawler import WebCrawler
+from src.crawl_state import CrawlState, CRAWL_STATE_DB
+from src.pipeline import IngestPipeline
 
 if __name__ == "__main__":
     # directory = "data/raw_data/doc/"
     # loader = Loader()
-    # docs = loader.run(directory)
     # vectorstore = VectorStore()
-    # vectorstore.save(docs)
+    # IngestPipeline(vectorstore).run(docs=loader.lazy_load(directory))
     # print("Save Completed!!!!!")
     crawler = WebCrawler(headless=True, delay=3)
     urls = crawler._collect_urls("https://sv-ctt.hust.edu.vn/#/so-tay-sv")  
     urls.remove("https://sv-ctt.hust.edu.vn/#/so-tay-sv/69/ban-dao-tao-huong-dan-thu-tuc-bieu-mau-thac-mac-ve-hoc-tap-hoc-phi")
-    docs = crawler.run(urls)
-    # print(docs)
+    # CRAWL_MAX_AGE (giây): trang đã fetch gần đây được dùng lại; run bị gián đoạn tự tiếp tục
+    max_age = os.getenv("CRAWL_MAX_AGE")
+    state = CrawlState(os.getenv("CRAWL_STATE_DB", CRAWL_STATE_DB))
     vectorstore = VectorStore()
-    vectorstore.save(docs)
+    # crawl → clean → summarise → embed → upsert chạy chồng lên nhau, commit theo batch
+    pipeline = IngestPipeline(vectorstore, crawler, state=state, max_age=float(max_age) if max_age else None)
+    stats = pipeline.run(urls=urls)
+    state.close()
+    print("Pipeline:", stats)
+    print("Embedding cache:", vectorstore.embedding.stats())
     print("Save Completed!!!!!")
 
@@ -1,9 +1,17 @@
 from src.graph import State, StateGraph
 
 class Agent():
-    def __init__(self):
-        self.graph = StateGraph(State)
-        self.agent = self.graph.create_graph().compile()
+    def __init__(self, mode: str = "default", **kwargs):
+        """
+        Args:
+            mode: "default" hoặc "fast" (xem StateGraph.create_graph)
+        """
+        self.mode = mode
+        self.graph = StateGraph(State, **kwargs)
+        self.agent = self.graph.create_graph(mode).compile()
+    def warm_up(self) -> dict:
+        """Tải trước model/index trước request đầu tiên (xem StateGraph.warm_up)."""
+        return self.graph.warm_up()
     def run_chatbot(self):
         app = self.agent
         state = {
@@ -19,6 +27,8 @@ class Agent():
             state["question"] = user_input
             
             result = app.invoke(state)
+            if self.mode == "fast":
+                result = self.graph.get_summary(result)
             state["answer"] = result["answer"]
             state["summary"] = result["summary"]
             state["source"] = result["source"]
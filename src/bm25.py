@@ -0,0 +1,201 @@
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+BM25_DIR = "data/processed/bm25/"
+
+
+def index_path(kind: str, directory: str = BM25_DIR) -> str:
+    """Đường dẫn file index: kind là "documents" (theo doc_id) hoặc "chunks" (theo chunk_id)."""
+    return os.path.join(directory, f"{kind}.json")
+
+# Mã/ký hiệu giữ nguyên cả cụm: QĐ-12-4, 12/2023, ...
+_CODE = re.compile(r"\w+(?:[-/.]\w+)+")
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt (đ -> d): "Học bổng" -> "hoc bong"."""
+    text = unicodedata.normalize("NFD", (text or "").lower())
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", text.replace("đ", "d"))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Token cho BM25: âm tiết đã bỏ dấu, cặp âm tiết liền nhau (từ ghép tiếng Việt như "hoc_bong")
+    và các mã viết liền ("qd-12-4").
+    """
+    folded = fold(text)
+    syllables = _WORD.findall(folded)
+    tokens = list(syllables)
+    tokens += [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+    tokens += _CODE.findall(folded)
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted index BM25 trong bộ nhớ, lưu ra file JSON.
+
+    Mỗi mục có một id (doc_id hoặc chunk_id), văn bản dùng để đánh chỉ mục, và Document trả về khi
+    tìm thấy (page_content + metadata) để đưa thẳng vào reciprocal_rank_fusion.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        # id -> các term của mục (để xoá nhanh), dựng lại từ postings khi load
+        self._terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+        # Dạng đã biên dịch cho truy vấn (xem _compile), dựng lại lười sau mỗi lần thay đổi
+        self._compiled: Tuple[List[str], Dict[str, Tuple[np.ndarray, np.ndarray]]] | None = None
+        self._lock = threading.Lock()
+        self.path: str | None = None
+        self._mtime: float | None = None
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self.lengths
+
+    # ----------------------------- Cập nhật ----------------------------- #
+    def add(self, entry_id: str, text: str, page_content: str, metadata: Dict[str, Any]):
+        """Thêm (hoặc thay thế) một mục."""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            self._remove(entry_id)
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[entry_id] = tf
+            self._terms[entry_id] = list(counts)
+            length = sum(counts.values())
+            self.lengths[entry_id] = length
+            self._total_length += length
+            self.docs[entry_id] = {"page_content": page_content, "metadata": metadata}
+            self._compiled = None
+
+    def _remove(self, entry_id: str):
+        if entry_id not in self.lengths:
+            return
+        for term in self._terms.pop(entry_id, ()):
+            posting = self.postings[term]
+            posting.pop(entry_id, None)
+            if not posting:
+                del self.postings[term]
+        self._total_length -= self.lengths.pop(entry_id)
+        self.docs.pop(entry_id, None)
+        self._compiled = None
+
+    def remove(self, entry_ids: Iterable[str]):
+        with self._lock:
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+
+    def remove_where(self, key: str, values: Iterable[str]):
+        """Xoá các mục có metadata[key] thuộc values (ví dụ mọi chunk của một doc_id)."""
+        values = set(values)
+        with self._lock:
+            for entry_id in [i for i, d in self.docs.items() if d["metadata"].get(key) in values]:
+                self._remove(entry_id)
+
+    # ----------------------------- Truy vấn ----------------------------- #
+    def _compile(self):
+        """
+        Tính sẵn cho mỗi term: vị trí các mục chứa term và trọng số idf * tf * (k1 + 1) / (tf + norm),
+        để một truy vấn chỉ còn vài phép cộng mảng numpy thay vì lặp từng posting.
+        """
+        n = len(self.lengths)
+        avgdl = self._total_length / n
+        ids = list(self.lengths)
+        position = {entry_id: i for i, entry_id in enumerate(ids)}
+        norms = np.array([self.k1 * (1 - self.b + self.b * self.lengths[i] / avgdl) for i in ids])
+        impacts = {}
+        for term, posting in self.postings.items():
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            rows = np.fromiter((position[i] for i in posting), dtype=np.int64, count=len(posting))
+            tf = np.fromiter(posting.values(), dtype=np.float64, count=len(posting))
+            impacts[term] = (rows, idf * tf * (self.k1 + 1) / (tf + norms[rows]))
+        self._compiled = (ids, impacts)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.lengths)
+            if not n:
+                return []
+            if self._compiled is None:
+                self._compile()
+            ids, impacts = self._compiled
+            scores = np.zeros(n)
+            for term in terms:
+                if term in impacts:
+                    rows, weights = impacts[term]
+                    scores[rows] += weights
+            top = np.flatnonzero(scores)
+            if len(top) > k:
+                top = top[np.argpartition(-scores[top], k - 1)[:k]]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [
+                (Document(page_content=self.docs[ids[i]]["page_content"], metadata=dict(self.docs[ids[i]]["metadata"]),
+                          id=ids[i]), float(scores[i]))
+                for i in top
+            ]
+
+    def retrieve(self, queries: List[str], k: int = 5) -> List[List[Document]]:
+        """Mỗi query một danh sách Document theo thứ hạng BM25 (cùng dạng với kết quả Chroma)."""
+        return [[doc for doc, _ in self.search(q, k)] for q in queries if q.strip()]
+
+    # ----------------------------- Lưu trữ ----------------------------- #
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with self._lock:
+            data = {"k1": self.k1, "b": self.b, "postings": self.postings, "lengths": self.lengths, "docs": self.docs}
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Đọc index từ file; file chưa có thì trả về index rỗng."""
+        index = cls()
+        index.path = path
+        index.refresh()
+        return index
+
+    def refresh(self) -> bool:
+        """Đọc lại file nếu đã bị VectorStore ghi lại kể từ lần đọc trước (một lần stat, rất rẻ)."""
+        try:
+            mtime = os.stat(self.path).st_mtime if self.path else None
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None or mtime == self._mtime:
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        terms: Dict[str, List[str]] = {}
+        for term, posting in data["postings"].items():
+            for entry_id in posting:
+                terms.setdefault(entry_id, []).append(term)
+        with self._lock:
+            self.k1, self.b = data["k1"], data["b"]
+            self.postings = data["postings"]
+            self.lengths = data["lengths"]
+            self.docs = data["docs"]
+            self._terms = terms
+            self._total_length = sum(self.lengths.values())
+            self._compiled = None
+            self._mtime = mtime
+        return True
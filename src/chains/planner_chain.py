@@ -0,0 +1,35 @@
+from typing import List
+from langchain.prompts import PromptTemplate
+from langchain.output_parsers import PydanticOutputParser
+from pydantic import BaseModel, Field
+
+class PlanSchema(BaseModel):
+    follow_up: bool = Field(..., description="true nếu câu hỏi là tiếp nối của hội thoại trước đó.")
+    question: str = Field(..., description="Câu hỏi đã được viết lại với đầy đủ ngữ cảnh (hoặc giữ nguyên).")
+    queries: List[str] = Field(..., description="Các phiên bản khác nhau của câu hỏi dùng để truy xuất tài liệu.")
+
+def planner_chain(llm):
+    """
+    Một lời gọi LLM thay cho router_question + rewrite_question + genarate_queries:
+    quyết định câu hỏi có phải tiếp nối không, viết lại câu hỏi và sinh các query truy hồi.
+    """
+    template = """
+    Bạn là bộ lập kế hoạch truy hồi cho chatbot sổ tay sinh viên.
+    Tóm tắt hội thoại trước đó: {summary}
+    Câu hỏi hiện tại: {question}
+    Nhiệm vụ:
+    1. follow_up: true nếu câu hỏi hiện tại là tiếp nối của hội thoại trước đó, ngược lại false.
+    2. question: nếu là tiếp nối thì viết lại câu hỏi với đầy đủ ngữ cảnh, tiết kiệm token nhất có thể; nếu không thì giữ nguyên câu hỏi.
+    3. queries: 5 biến thể khác nhau của câu hỏi ở bước 2, nhằm truy xuất các tài liệu liên quan từ cơ sở dữ liệu vector.
+    Lưu ý: chỉ trả về JSON hợp lệ theo đúng schema bên dưới, không nói gì thêm.
+    {format_instructions}
+    """
+
+    parser = PydanticOutputParser(pydantic_object=PlanSchema)
+    prompt = PromptTemplate(
+        template=template,
+        input_variables=["question", "summary"],
+        partial_variables={"format_instructions": parser.get_format_instructions()}
+    )
+
+    return prompt | llm | parser
@@ -1,13 +1,27 @@
 from typing import List, Any
-from src.utils.llm_model import get_llm, get_llm_answer
+from src.registry import registry
+from src import metrics
 from src.chains.genarate_queries_chain import genarate_queries
-from langchain.storage import LocalFileStore
+from src.utils.executor import run_blocking
+from src.chunker import estimate_tokens
+from src.reranker import LLMSelector, RERANK_CANDIDATES
+from langchain.storage._lc_store import create_kv_docstore
 from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import PromptTemplate, ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
 from langchain_core.exceptions import OutputParserException
+from langchain_core.documents import Document
 from pydantic import BaseModel, Field
+import os
+
+# Ngân sách token (ước lượng) cho phần tài liệu trong prompt trả lời ở chế độ chunk
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1500"))
+# Số biến thể câu hỏi do LLM sinh ra để truy hồi (0 = không mở rộng, chỉ dùng câu hỏi gốc)
+NUM_QUERIES = int(os.getenv("NUM_QUERIES", "5"))
+# Số tài liệu lấy về cho mỗi query (mỗi danh sách vector/BM25) và hằng số k của reciprocal rank fusion
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+RRF_K = int(os.getenv("RRF_K", "60"))
 
 class OutputSchema(BaseModel):
     answer: str = Field(..., description="Câu trả lời cho câu hỏi.")
@@ -15,10 +29,43 @@ class OutputSchema(BaseModel):
     "Trả về nếu nó thực sự liên quan đến câu trả lời, còn không thì để trống")
 
 class RetrievalChain:
-    def __init__(self, vectorstore):
+    def __init__(self, vectorstore, llm=None, llm_answer=None, batch_retrieval: bool = True, k: int = RETRIEVAL_K,
+                 byte_store=None, cache=None, chunk_store=None, context_tokens: int = CONTEXT_TOKENS,
+                 lexical_index=None, num_queries: int = NUM_QUERIES, reranker=None,
+                 rerank_candidates: int = RERANK_CANDIDATES, docstore=None, gateway=None, rrf_k: int = RRF_K):
+        """
+        Args:
+            vectorstore: collection chứa các bản tóm tắt (summaries), Chroma hoặc NumpyVectorStore
+            chunk_store: collection "chunks"; nếu có thì truy hồi theo chunk và ghép context
+                từ các chunk tốt nhất trong giới hạn `context_tokens` (không cần LLM chọn doc_id)
+            lexical_index: BM25Index cùng đơn vị với collection truy hồi (documents/chunks); kết quả BM25
+                được gộp với kết quả vector qua reciprocal_rank_fusion
+            num_queries: số biến thể câu hỏi sinh bằng LLM (0 = chỉ dùng câu hỏi gốc, bỏ một lời gọi LLM)
+            reranker: bước chọn tài liệu sau RRF (CrossEncoderReranker, ...); mặc định LLMSelector
+                (LLM chọn một doc_id); rerank_candidates là số ứng viên đưa vào bước này
+            llm, llm_answer: cho phép truyền LLM khác (mặc định dùng Gemini)
+            gateway: LLMGateway cho mọi lời gọi LLM (mặc định registry.get("llm_gateway"), dùng chung trong process)
+            docstore: docstore chứa tài liệu gốc (mặc định registry.get("docstore"): SQLite có LRU, dùng chung trong process)
+            byte_store: ByteStore chứa tài liệu gốc dạng cũ (ví dụ LocalFileStore), dùng khi không có docstore
+            cache: SemanticCache đặt trước toàn bộ pipeline (None để tắt)
+            batch_retrieval (bool): nhúng + truy vấn tất cả query trong một lần thay vì lặp từng query
+            k (int): số tài liệu lấy về cho mỗi query
+            rrf_k (int): hằng số k của reciprocal_rank_fusion (lớn hơn thì thứ hạng trong từng danh sách ít quan trọng hơn)
+        """
         self.vectorstore = vectorstore
-        self.llm = get_llm()
-        self.llm_answer = get_llm_answer()
+        # Mọi lời gọi LLM đi qua gateway (semaphore, hạn chót, thử lại, thống kê theo call site)
+        self.gateway = gateway or registry.get("llm_gateway")
+        self.llm = self.gateway.site("generate_queries", llm)
+        self.llm_answer = llm_answer
+        self.batch_retrieval = batch_retrieval
+        self.k = k
+        self.cache = cache
+        self.chunk_store = chunk_store
+        self.context_tokens = context_tokens
+        self.lexical_index = lexical_index
+        self.num_queries = num_queries
+        self.rerank_candidates = rerank_candidates
+        self.rrf_k = rrf_k
 
         self.template = (
             "Bạn là trợ lý RAG. Dựa vào tài liệu sau hãy trả lời câu hỏi và liệt kê nguồn."
@@ -34,6 +81,17 @@ class RetrievalChain:
             "{format_instructions}"
         )
 
+        # Prompt cho chế độ streaming: trả về Markdown trực tiếp (không JSON), nguồn được gửi riêng
+        self.template_stream = (
+            "Bạn là trợ lý RAG trả lời trực tiếp. Dựa vào tài liệu sau hãy trả lời câu hỏi."
+            "Tài liệu: {context}"
+            "Câu hỏi: {question}"
+            "YÊU CẦU QUAN TRỌNG:"
+            " - Trả lời ngắn gọn, súc tích, không dài dòng. Văn chương trang trọng, dễ hiểu."
+            " - Câu trả lời trả về dạng Markdown với các phần rõ ràng, không liệt kê nguồn."
+            " - Nếu tài liệu trống thì trả lời là không có thông tin và yêu cầu người dùng hỏi rõ ràng hơn."
+        )
+
         self.template_select_docid = """
             Bạn là một trợ lý AI chuyên nghiệp. Nhiệm vụ của bạn là chọn ra các tài liệu phù hợp nhất từ danh sách tài liệu đã cho để trả lời câu hỏi.
             Dưới đây là danh sách các tài liệu:
@@ -45,27 +103,38 @@ class RetrievalChain:
         """
 
         self.genarate_queries_chain = genarate_queries(self.llm)
-        self.store = LocalFileStore("data/processed/store/")
+        if docstore is None:
+            docstore = create_kv_docstore(byte_store) if byte_store is not None else registry.get("docstore")
+        self.docstore = docstore
 
         self.retriever = MultiVectorRetriever(
             vectorstore=vectorstore,
-            byte_store=self.store,
+            docstore=self.docstore,
             id_key="doc_id"
         )
         self.parser = PydanticOutputParser(pydantic_object=OutputSchema)
         self.format_instructions = self.parser.get_format_instructions()
         self.prompt = ChatPromptTemplate.from_template(self.template)
         self.prompt_select_docid = ChatPromptTemplate.from_template(self.template_select_docid)
-        self.genarate_answer_chain = self.prompt | self.llm_answer | self.parser
-        self.select_docid_chain = self.prompt_select_docid | self.llm_answer | StrOutputParser()
+        self.genarate_answer_chain = self.prompt | self._answer_site("answer") | self.parser
+        self.select_docid_chain = self.prompt_select_docid | self._answer_site("select_docid") | StrOutputParser()
+        self.stream_answer_chain = (ChatPromptTemplate.from_template(self.template_stream)
+                                    | self._answer_site("stream_answer") | StrOutputParser())
+        self.reranker = reranker if reranker is not None else LLMSelector(self.select_docid_chain)
+        # Tên bước chọn tài liệu trong metric/trace
+        self.rerank_stage = "select_docid" if isinstance(self.reranker, LLMSelector) else "rerank"
 
-    def reciprocal_rank_fusion(self, results: List[List[Any]], k: int = 60):
+    def _answer_site(self, name: str):
+        return self.gateway.site(name, self.llm_answer, resource="llm_answer")
+
+    def reciprocal_rank_fusion(self, results: List[List[Any]], k: int | None = None, id_key: str = "doc_id"):
+        k = self.rrf_k if k is None else k
         fused_scores = {}
         doc_lookup = {}
 
         for docs in results:
             for rank, doc in enumerate(docs):
-                doc_id = doc.metadata["doc_id"]
+                doc_id = doc.metadata[id_key]
                 fused_scores[doc_id] = fused_scores.get(doc_id, 0) + 1 / (rank + k)
                 doc_lookup[doc_id] = doc  # Lưu để lấy lại sau
 
@@ -76,31 +145,197 @@ class RetrievalChain:
 
         return reranked_results
 
-    def run(self, question: str):
-        retriever = self.vectorstore.as_retriever(
+    def _retrieve_loop(self, queries: List[str], vectorstore=None) -> List[List[Document]]:
+        """Truy vấn tuần tự: mỗi query một lần nhúng và một lần gọi Chroma."""
+        vectorstore = vectorstore or self.vectorstore
+        retriever = vectorstore.as_retriever(
             search_type="similarity",
-            search_kwargs={"k": 5}
+            search_kwargs={"k": self.k}
+        )
+        return [retriever.invoke(q) for q in queries]
+
+    def _retrieve_batch(self, queries: List[str], vectorstore=None) -> List[List[Document]]:
+        """
+        Nhúng tất cả query trong một lần gọi embed_documents và gửi một truy vấn
+        nhiều embedding tới collection. Kết quả giữ đúng thứ tự của queries.
+        """
+        vectorstore = vectorstore or self.vectorstore
+        queries = [q for q in queries if q.strip()]
+        if not queries:
+            return []
+        embeddings = vectorstore.embeddings.embed_documents(queries)
+        result = vectorstore._collection.query(
+            query_embeddings=embeddings,
+            n_results=self.k,
+            include=["documents", "metadatas"],
         )
+        return [
+            [
+                Document(page_content=text or "", metadata=metadata or {}, id=doc_id)
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+
+    def retrieve(self, queries: List[str]) -> List[List[Document]]:
+        """
+        Truy hồi trên collection chunks nếu có, ngược lại trên summaries.
+        Có lexical_index thì thêm một danh sách BM25 cho mỗi query (truy hồi lai).
+        """
+        vectorstore = self.chunk_store or self.vectorstore
+        if self.batch_retrieval:
+            results = self._retrieve_batch(queries, vectorstore)
+        else:
+            results = self._retrieve_loop(queries, vectorstore)
+        if self.lexical_index is not None:
+            self.lexical_index.refresh()
+            results += self.lexical_index.retrieve(queries, self.k)
+        return results
+
+    def _limit_queries(self, question: str, queries: List[str]) -> List[str]:
+        queries = [q for q in queries if q.strip()][:self.num_queries]
+        return queries or [question]
+
+    def expand_queries(self, question: str) -> List[str]:
+        if self.num_queries <= 0:
+            return [question]
+        return self._limit_queries(question, self.genarate_queries_chain.invoke({"question": question}))
+
+    async def aexpand_queries(self, question: str) -> List[str]:
+        if self.num_queries <= 0:
+            return [question]
+        return self._limit_queries(question, await self.genarate_queries_chain.ainvoke({"question": question}))
 
-        queries = self.genarate_queries_chain.invoke({"question": question})
-        results = [retriever.invoke(q) for q in queries]
+    def assemble_context(self, reranked_chunks, budget: int | None = None):
+        """
+        Ghép context từ các chunk xếp hạng cao nhất cho tới hết ngân sách token (chunk đầu tiên luôn được lấy).
+        Chunk cùng tài liệu cha được gom lại theo thứ tự trong tài liệu.
+
+        Returns:
+            (docs, sources) — mỗi tài liệu cha một phần tử, cùng dạng với _load_docs
+        """
+        budget = budget or self.context_tokens
+        groups: dict[str, list] = {}  # giữ thứ tự theo chunk tốt nhất của từng tài liệu cha
+        used = 0
+        for chunk, _ in reranked_chunks:
+            cost = estimate_tokens(chunk.page_content)
+            if groups and used + cost > budget:
+                continue
+            groups.setdefault(chunk.metadata["doc_id"], []).append(chunk)
+            used += cost
+        docs, sources = [], []
+        for chunks in groups.values():
+            chunks.sort(key=lambda chunk: chunk.metadata.get("chunk_index", 0))
+            docs.append("\n...\n".join(chunk.page_content for chunk in chunks))
+            sources.append(chunks[0].metadata.get("source", "unknown"))
+        return docs, sources
+
+    def _load_docs(self, selected):
+        """Lấy nội dung và nguồn của các tài liệu gốc được chọn (list (Document, điểm) từ reranker)."""
+        doc_ids = [doc.metadata["doc_id"] for doc, _ in selected]
+        if not doc_ids:
+            return [], []
+        stored = [doc for doc in self.retriever.docstore.mget(doc_ids) if doc is not None]
+        docs = [doc.page_content for doc in stored]
+        sources = [doc.metadata.get("source", "unknown") for doc in stored]
+        return docs, sources
+
+    def cache_lookup(self, question: str):
+        """Tra semantic cache. Trả về (OutputSchema hoặc None, embedding câu hỏi)."""
+        if self.cache is None:
+            return None, None
+        with metrics.span("stage", "cache_lookup"):
+            cached, vector = self.cache.lookup(question)
+        metrics.record_cache("semantic", cached is not None)
+        return cached, vector
+
+    def _retrieve_traced(self, queries: List[str]) -> List[List[Document]]:
+        with metrics.span("stage", "retrieve", queries=len(queries)) as attrs:
+            results = self.retrieve(queries)
+            metrics.record_documents("retrieve", sum(len(docs) for docs in results), attrs)
+        return results
 
+    def _select(self, question: str, results):
+        """RRF rồi ghép context từ chunk (chunk_store) hoặc chọn tài liệu bằng reranker và lấy tài liệu gốc."""
+        if self.chunk_store is not None:
+            with metrics.span("stage", "assemble_context") as attrs:
+                docs, sources = self.assemble_context(self.reciprocal_rank_fusion(results, id_key="chunk_id"))
+                metrics.record_documents("context", len(docs), attrs)
+            return docs, sources
         reranked_docs = self.reciprocal_rank_fusion(results)
+        metrics.record_documents("fused", len(reranked_docs))
+        with metrics.span("stage", self.rerank_stage):
+            selected = self.reranker.rerank(question, reranked_docs[:self.rerank_candidates])
+        return self._load_docs_traced(selected)
 
-        doc_id = self.select_docid_chain.invoke({"context": reranked_docs[:7], "question": question})
-        # doc_ids = [doc.metadata["doc_id"] for doc, _ in reranked_docs[:5]] # thông thường là 3 
-        # doc_ids = [doc.metadata["doc_id"] for doc, _ in reranked_docs[:1]]
-        if doc_id :
-            doc_id = [doc_id] 
+    def _load_docs_traced(self, selected):
+        with metrics.span("stage", "load_docs") as attrs:
+            docs, sources = self._load_docs(selected)
+            metrics.record_documents("context", len(docs), attrs)
+        return docs, sources
 
-            docs = [self.retriever.docstore.mget([doc_id])[0].page_content for doc_id in doc_id]
-            sources = [self.retriever.docstore.mget([doc_id])[0].metadata.get("source", "unknown") for doc_id in doc_id]
-        else:
-            docs = []
-            sources = []
-        # print(sources)
-        
-        answer = self.genarate_answer_chain.invoke({"context": docs, "question": question, 
-                                                    "sources": sources, "format_instructions": self.format_instructions})
-        
-        return answer
\ No newline at end of file
+    def cache_store(self, question: str, answer: OutputSchema, vector=None):
+        # Chỉ lưu câu trả lời có nguồn, tránh cache câu "không có thông tin"
+        if self.cache is not None and answer.sources:
+            self.cache.store(question, answer, vector)
+
+    def run(self, question: str, queries: List[str] | None = None):
+        """
+        Args:
+            question: câu hỏi (đã viết lại nếu cần)
+            queries: các query truy hồi có sẵn (ví dụ từ planner); None thì sinh bằng genarate_queries_chain
+        """
+        cached, vector = self.cache_lookup(question)
+        if cached is not None:
+            return cached
+
+        if not queries:
+            with metrics.span("stage", "expand_queries"):
+                queries = self.expand_queries(question)
+        results = self._retrieve_traced(queries)
+        docs, sources = self._select(question, results)
+
+        with metrics.span("stage", "answer"):
+            answer = self.genarate_answer_chain.invoke({"context": docs, "question": question,
+                                                        "sources": sources, "format_instructions": self.format_instructions})
+        self.cache_store(question, answer, vector)
+
+        return answer
+
+    async def aprepare(self, question: str, queries: List[str] | None = None):
+        """Truy hồi + chọn tài liệu (bất đồng bộ). Trả về (docs, sources) để đưa vào prompt trả lời."""
+        if not queries:
+            with metrics.span("stage", "expand_queries"):
+                queries = await self.aexpand_queries(question)
+        results = await run_blocking(self._retrieve_traced, queries)
+
+        if self.chunk_store is not None:
+            return self._select(question, results)
+        reranked_docs = self.reciprocal_rank_fusion(results)
+        metrics.record_documents("fused", len(reranked_docs))
+
+        with metrics.span("stage", self.rerank_stage):
+            selected = await self.reranker.arerank(question, reranked_docs[:self.rerank_candidates])
+        return await run_blocking(self._load_docs_traced, selected)
+
+    async def arun(self, question: str, queries: List[str] | None = None):
+        """Phiên bản bất đồng bộ của run: LLM gọi qua ainvoke, phần chặn (embedding, Chroma, docstore) chạy trong executor."""
+        cached, vector = await run_blocking(self.cache_lookup, question)
+        if cached is not None:
+            return cached
+
+        docs, sources = await self.aprepare(question, queries)
+
+        with metrics.span("stage", "answer"):
+            answer = await self.genarate_answer_chain.ainvoke({"context": docs, "question": question,
+                                                               "sources": sources,
+                                                               "format_instructions": self.format_instructions})
+        self.cache_store(question, answer, vector)
+
+        return answer
+
+    async def astream_answer(self, question: str, docs: List[str]):
+        """Stream câu trả lời (Markdown) theo từng đoạn token từ các tài liệu đã chọn."""
+        with metrics.span("stage", "stream_answer"):
+            async for chunk in self.stream_answer_chain.astream({"context": docs, "question": question}):
+                yield chunk
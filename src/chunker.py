@@ -0,0 +1,117 @@
+import os
+import re
+from typing import List
+
+from langchain_core.documents import Document
+
+# Kích thước tối đa (token ước lượng) của một chunk; bảng lớn hơn vẫn được giữ nguyên
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "300"))
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+\S")
+# Dòng thuộc bảng: Markdown (| a | b |), ASCII (+---+ / | a |) hoặc nhãn [BẢNG n] của crawler
+_TABLE_LINE = re.compile(r"^\s*(\||\+[-+=\s]*\+\s*$)")
+_TABLE_LABEL = re.compile(r"^\s*\[BẢNG \d+\]\s*$")
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng số token (khoảng 3 ký tự/token với tiếng Việt), cùng cách tính với giới hạn tpm."""
+    return len(text) // 3 + 1
+
+
+def _blocks(text: str) -> List[tuple[str, str]]:
+    """
+    Tách văn bản thành các khối (loại, nội dung): "heading", "table" hoặc "text".
+    Bảng (kể cả nhãn [BẢNG n] đứng trước) luôn là một khối nguyên vẹn; đoạn văn tách theo dòng trống.
+    """
+    blocks: List[tuple[str, str]] = []
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if _TABLE_LABEL.match(line) or _TABLE_LINE.match(line):
+            start = i
+            i += 1
+            while i < len(lines) and _TABLE_LINE.match(lines[i]):
+                i += 1
+            blocks.append(("table", "\n".join(lines[start:i]).strip()))
+        elif _HEADING.match(line):
+            blocks.append(("heading", line.strip()))
+            i += 1
+        elif not line.strip():
+            i += 1
+        else:
+            start = i
+            while (i < len(lines) and lines[i].strip() and not _HEADING.match(lines[i])
+                   and not _TABLE_LINE.match(lines[i]) and not _TABLE_LABEL.match(lines[i])):
+                i += 1
+            blocks.append(("text", "\n".join(lines[start:i]).strip()))
+    return blocks
+
+
+def _split_text(text: str, max_tokens: int) -> List[str]:
+    """Đoạn văn dài hơn giới hạn: tách theo câu."""
+    parts, current = [], ""
+    for sentence in re.split(r"(?<=[.!?;:])\s+", text):
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            parts.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_document(doc: Document, doc_id: str, max_tokens: int = CHUNK_TOKENS) -> List[Document]:
+    """
+    Chia tài liệu thành các chunk theo cấu trúc: gom heading/đoạn văn/bảng liên tiếp tới `max_tokens`,
+    không bao giờ cắt ngang bảng. Mỗi chunk mang doc_id của tài liệu cha (trong docstore),
+    chunk_id, chunk_index, source và section (heading gần nhất, được chèn vào đầu chunk nếu thiếu).
+    """
+    chunks: List[str] = []
+    sections: List[str] = []
+    section = doc.metadata.get("header", "") or ""
+    current: List[str] = []
+    current_section = section
+
+    def flush():
+        nonlocal current
+        if current:
+            chunks.append("\n\n".join(current))
+            sections.append(current_section)
+            current = []
+
+    for kind, block in _blocks(doc.page_content):
+        if kind == "heading":
+            flush()
+            section = block.lstrip("#").strip()
+            current_section = section
+            current.append(block)
+            continue
+        pieces = [block] if kind == "table" else _split_text(block, max_tokens)
+        for piece in pieces:
+            size = estimate_tokens("\n\n".join(current + [piece]))
+            # Chunk chỉ có heading thì giữ heading đi cùng khối kế tiếp
+            if current and size > max_tokens and not (len(current) == 1 and _HEADING.match(current[0])):
+                flush()
+                current_section = section
+            current.append(piece)
+    flush()
+
+    source = doc.metadata.get("source", "unknown")
+    result = []
+    for index, (text, chunk_section) in enumerate(zip(chunks, sections)):
+        if chunk_section and chunk_section not in text:
+            text = f"{chunk_section}\n{text}"
+        result.append(Document(
+            page_content=text,
+            metadata={
+                "doc_id": doc_id,
+                "chunk_id": f"{doc_id}:{index}",
+                "chunk_index": index,
+                "source": source,
+                "section": chunk_section,
+            },
+        ))
+    return result
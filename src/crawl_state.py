@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+CRAWL_STATE_DB = "data/processed/crawl_state.db"
+
+
+def payload_hash(payload: Dict[str, Any]) -> str:
+    """Hash nội dung đã render của một trang (header, text, bảng)."""
+    data = {key: payload.get(key) for key in ("header", "text", "tables")}
+    return hashlib.sha256(json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    """
+    Trạng thái crawl lưu trong SQLite, ghi ngay sau mỗi URL (checkpoint).
+
+    - pages: url -> hash nội dung, thời điểm fetch, thời điểm nội dung đổi lần cuối, payload đã trích xuất.
+    - runs: mỗi lần crawl là một run; run chưa `finish_run` được tiếp tục ở lần chạy sau,
+      các URL đã xong trong run đó không phải fetch lại.
+    - failures: URL crawl lỗi (lỗi gần nhất, số lần lỗi liên tiếp). Trang lỗi không được ghi vào pages
+      nên lần chạy sau vẫn fetch lại; failures bị xoá khi URL crawl thành công.
+    """
+
+    def __init__(self, db_path: str = CRAWL_STATE_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, hash TEXT NOT NULL, fetched_at REAL NOT NULL, "
+            "changed_at REAL NOT NULL, payload TEXT NOT NULL, run_id TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs (id TEXT PRIMARY KEY, started_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS failures (url TEXT PRIMARY KEY, error TEXT NOT NULL, failed_at REAL NOT NULL, "
+            "attempts INTEGER NOT NULL, run_id TEXT)"
+        )
+        self._db.commit()
+
+    # ----------------------------- Runs ----------------------------- #
+    def begin_run(self, resume: bool = True) -> str:
+        """Trả về run chưa hoàn thành gần nhất (nếu `resume`), ngược lại tạo run mới."""
+        with self._lock:
+            if resume:
+                row = self._db.execute(
+                    "SELECT id FROM runs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+            run_id = uuid.uuid4().hex
+            self._db.execute("INSERT INTO runs (id, started_at) VALUES (?, ?)", (run_id, time.time()))
+            self._db.commit()
+            return run_id
+
+    def finish_run(self, run_id: str):
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+            self._db.commit()
+
+    # ----------------------------- Pages ----------------------------- #
+    def get(self, url: str) -> Dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT hash, fetched_at, changed_at, payload, run_id FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "url": url,
+            "hash": row[0],
+            "fetched_at": row[1],
+            "changed_at": row[2],
+            "payload": json.loads(row[3]),
+            "run_id": row[4],
+        }
+
+    def is_fresh(self, entry: Dict[str, Any] | None, run_id: str | None = None, max_age: float | None = None) -> bool:
+        """Trang không cần fetch lại: đã xong trong run hiện tại, hoặc mới fetch trong vòng `max_age` giây."""
+        if entry is None:
+            return False
+        if run_id is not None and entry["run_id"] == run_id:
+            return True
+        return max_age is not None and time.time() - entry["fetched_at"] <= max_age
+
+    def record(self, url: str, payload: Dict[str, Any], run_id: str | None = None) -> bool:
+        """
+        Lưu kết quả crawl của một URL.
+
+        Returns:
+            True nếu nội dung khác lần crawl trước (hoặc trang mới).
+        """
+        digest = payload_hash(payload)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT hash, changed_at FROM pages WHERE url = ?", (url,)).fetchone()
+            changed = row is None or row[0] != digest
+            self._db.execute(
+                "INSERT INTO pages (url, hash, fetched_at, changed_at, payload, run_id) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET hash = excluded.hash, fetched_at = excluded.fetched_at, "
+                "changed_at = excluded.changed_at, payload = excluded.payload, run_id = excluded.run_id",
+                (url, digest, now, now if changed else row[1], json.dumps(payload, ensure_ascii=False), run_id),
+            )
+            self._db.execute("DELETE FROM failures WHERE url = ?", (url,))
+            self._db.commit()
+        return changed
+
+    def record_failure(self, url: str, error: str, run_id: str | None = None):
+        """Ghi lại URL crawl lỗi (không đụng tới pages, nên lần chạy sau vẫn fetch lại)."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO failures (url, error, failed_at, attempts, run_id) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(url) DO UPDATE SET error = excluded.error, failed_at = excluded.failed_at, "
+                "attempts = failures.attempts + 1, run_id = excluded.run_id",
+                (url, error, time.time(), run_id),
+            )
+            self._db.commit()
+
+    def failures(self, run_id: str | None = None) -> List[Dict[str, Any]]:
+        """Các URL đang lỗi (của một run nếu truyền run_id), mới nhất trước."""
+        query = "SELECT url, error, failed_at, attempts, run_id FROM failures"
+        params: tuple = ()
+        if run_id is not None:
+            query, params = query + " WHERE run_id = ?", (run_id,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY failed_at DESC", params).fetchall()
+        return [
+            {"url": row[0], "error": row[1], "failed_at": row[2], "attempts": row[3], "run_id": row[4]}
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,17 +1,24 @@
 from __future__ import annotations
 
+import queue
 import re
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from typing import List, Dict, Any
+from urllib.parse import urlparse
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import WebDriverException, NoSuchElementException, JavascriptException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import WebDriverException, NoSuchElementException, JavascriptException, TimeoutException
 
 from docx import Document as DocxDocument
 
+from src.crawl_state import CrawlState, payload_hash
+
 try:
     # Optional dependency; keep alias stable with user's code
     from langchain.schema import Document as LCDocument  # type: ignore
@@ -22,14 +29,142 @@ except Exception:  # pragma: no cover - allow running without langchain installe
             self.metadata = metadata or {}
 
 
+class HostRateLimiter:
+    """Giãn cách tối thiểu `min_interval` giây giữa hai request tới cùng một host (an toàn đa luồng)."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_allowed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class DriverPool:
+    """Pool Chrome driver có giới hạn; driver được tạo khi cần và dùng lại giữa các URL."""
+
+    def __init__(self, size: int, factory):
+        self.size = size
+        self.factory = factory
+        self._idle: "queue.Queue" = queue.Queue()
+        self._all: List[Any] = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                driver = self.factory()
+                self._all.append(driver)
+                return driver
+        return self._idle.get()
+
+    def release(self, driver):
+        self._idle.put(driver)
+
+    def close(self):
+        for driver in self._all:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self._all.clear()
+
+
+HEADER_SELECTORS = ['div[class="header"] h2', "h1", "h2", ".header h2"]
+MAIN_SELECTORS = [".tip-detail"]  # ".main-content", ".content"
+HIDDEN_LINK_KEYWORDS = ["TẠI ĐÂY", "TẠI ĐÂY.", "TẠI ĐÂY,"]
+
+# Lấy toàn bộ trang trong một lần execute_script: header, text (bỏ bảng), các ô bảng kèm href,
+# và thay các link "TẠI ĐÂY" bằng [Link: href] giống _replace_hidden_links.
+# visibleText mô phỏng WebElement.text (trim từng dòng, nbsp -> space) để kết quả khớp với engine cũ.
+EXTRACT_PAGE_SCRIPT = """
+var headerSelectors = arguments[0], mainSelectors = arguments[1], keywords = arguments[2];
+function visibleText(el) {
+    var text = el.innerText || "";
+    return text.split("\\n").map(function (line) {
+        return line.replace(/^[ \\t\\r\\n\\f\\v]+|[ \\t\\r\\n\\f\\v]+$/g, "");
+    }).join("\\n").replace(/\\u00a0/g, " ").trim();
+}
+function toArray(list) { return Array.prototype.slice.call(list); }
+
+var header = "";
+for (var i = 0; i < headerSelectors.length; i++) {
+    var h = document.querySelector(headerSelectors[i]);
+    if (h && visibleText(h)) { header = visibleText(h); break; }
+}
+
+var result = {header: header, main_text: "", text: "", has_tables: false, tables: []};
+for (var s = 0; s < mainSelectors.length; s++) {
+    var root = document.querySelector(mainSelectors[s]);
+    if (!root) continue;
+    var mainText = visibleText(root);
+    if (!mainText) continue;
+    result.main_text = mainText;
+
+    toArray(root.getElementsByTagName("a")).forEach(function (a) {
+        var upper = visibleText(a).toUpperCase();
+        var href = a.href;
+        if (href && keywords.some(function (kw) { return upper.indexOf(kw) !== -1; })) {
+            a.textContent = "[Link: " + href + "]";
+        }
+    });
+
+    var tables = toArray(root.getElementsByTagName("table"));
+    result.has_tables = tables.length > 0;
+    result.tables = tables.map(function (table) {
+        return toArray(table.getElementsByTagName("tr")).map(function (tr) {
+            var cells = toArray(tr.getElementsByTagName("th")).concat(toArray(tr.getElementsByTagName("td")));
+            return cells.map(function (cell) {
+                return {
+                    text: visibleText(cell),
+                    hrefs: toArray(cell.getElementsByTagName("a")).map(function (a) { return a.getAttribute("href") === null ? "" : a.href; })
+                };
+            });
+        });
+    });
+
+    if (result.has_tables) {
+        var cloned = root.cloneNode(true);
+        var clonedTables = cloned.querySelectorAll("table");
+        for (var t = clonedTables.length - 1; t >= 0; t--) {
+            clonedTables[t].parentNode.removeChild(clonedTables[t]);
+        }
+        result.text = cloned.textContent || cloned.innerText || "";
+    } else {
+        result.text = visibleText(root);
+    }
+    if (result.text.trim() || result.has_tables) break;
+}
+return result;
+"""
+
+
 class WebCrawler:
-    def __init__(self, headless: bool = True, delay: int = 2):
+    def __init__(self, headless: bool = True, delay: int = 2, timeout: float = 15, extraction: str = "webdriver"):
         """
         Args:
             headless (bool): Chạy browser ẩn
-            delay (int): Thời gian nghỉ giữa các request (giây)
+            delay (int): Khoảng cách tối thiểu giữa hai request tới cùng một host (giây)
+            timeout (float): Thời gian chờ tối đa nội dung `.tip-detail` xuất hiện (giây)
+            extraction (str): "webdriver" (duyệt từng element qua WebDriver như cũ) hoặc
+                "script" (một lần execute_script cho cả trang). Giữ "webdriver" làm mặc định cho tới khi
+                tests/test_crawler_extraction.py chạy qua trên các trang HTML mẫu trong tests/fixtures/crawler/
         """
         self.delay = delay
+        self.timeout = timeout
+        self.extraction = extraction
+        self.rate_limiter = HostRateLimiter(delay)
         self.chrome_options = Options()
         if headless:
             # Headless mới ổn định hơn
@@ -39,15 +174,22 @@ class WebCrawler:
         self.chrome_options.add_argument("--disable-gpu")
         self.driver = None
         self.header = ""
+        # Nội dung trang trước của từng driver, để nhận biết SPA đã render trang mới
+        self._last_text: Dict[int, str] = {}
+        # URL -> lỗi của lần crawl gần nhất (run / iter_crawl)
+        self.failures: Dict[str, str] = {}
 
     # ----------------------------- Driver ----------------------------- #
-    def _setup_driver(self):
-        """Khởi tạo Chrome driver"""
+    def _new_driver(self):
         try:
-            self.driver = webdriver.Chrome(options=self.chrome_options)
+            return webdriver.Chrome(options=self.chrome_options)
         except WebDriverException as e:
             raise RuntimeError(f"Lỗi khởi tạo ChromeDriver: {e}")
 
+    def _setup_driver(self):
+        """Khởi tạo Chrome driver"""
+        self.driver = self._new_driver()
+
     def _close_driver(self):
         """Đóng driver"""
         if self.driver:
@@ -58,12 +200,13 @@ class WebCrawler:
             self.driver = None
 
     # ----------------------------- Tables ----------------------------- #
-    def _extract_table_data(self, table_element) -> List[List[str]]:
+    def _extract_table_data(self, table_element, driver=None) -> List[List[str]]:
         """
         Trích xuất dữ liệu từ bảng HTML
 
         Args:
             table_element: WebElement của bảng
+            driver: driver sở hữu element (mặc định self.driver)
 
         Returns:
             list: Danh sách các hàng, mỗi hàng là list các cell
@@ -76,23 +219,27 @@ class WebCrawler:
                 cells = tr.find_elements(By.TAG_NAME, "th") + tr.find_elements(By.TAG_NAME, "td")
                 for cell in cells:
                     # Xử lý link trong cell (hiện các link ẩn "TẠI ĐÂY" -> [Link: ...])
-                    self._replace_hidden_links(cell)
+                    self._replace_hidden_links(cell, driver)
 
-                    cell_text = cell.text.strip()
-                    # Thêm link [Link: href] nếu không nằm trong text
                     links = cell.find_elements(By.TAG_NAME, "a")
-                    if links and not any(keyword in cell_text.upper() for keyword in ["TẠI ĐÂY", "[LINK:"]):
-                        for link in links:
-                            href = link.get_attribute("href")
-                            if href and href not in cell_text:
-                                cell_text += f" [Link: {href}]"
-                    row_data.append(cell_text)
+                    hrefs = [link.get_attribute("href") for link in links]
+                    row_data.append(self._cell_text(cell.text, hrefs))
                 if row_data:
                     rows.append(row_data)
         except Exception as e:
             print(f"Lỗi khi trích xuất bảng: {e}")
         return rows
 
+    @staticmethod
+    def _cell_text(text: str, hrefs: List[str | None]) -> str:
+        """Text của một ô bảng; thêm [Link: href] nếu link chưa hiện trong text."""
+        cell_text = (text or "").strip()
+        if hrefs and not any(keyword in cell_text.upper() for keyword in ["TẠI ĐÂY", "[LINK:"]):
+            for href in hrefs:
+                if href and href not in cell_text:
+                    cell_text += f" [Link: {href}]"
+        return cell_text
+
     def _format_table_as_text(self, table_rows: List[List[str]]) -> str:
         """Chuyển bảng sang ASCII table (để hiển thị text song song)."""
         if not table_rows:
@@ -132,17 +279,18 @@ class WebCrawler:
             print(f"Lỗi khi thêm bảng vào docx: {e}")
 
     # ----------------------------- Text & Links ----------------------------- #
-    def _replace_hidden_links(self, element) -> bool:
+    def _replace_hidden_links(self, element, driver=None) -> bool:
         """Hiện link thật thay cho 'TẠI ĐÂY' bên trong element."""
+        driver = driver or self.driver
         try:
             links = element.find_elements(By.TAG_NAME, "a")
             for link in links:
                 text_upper = (link.text or "").strip().upper()
-                if any(kw in text_upper for kw in ["TẠI ĐÂY", "TẠI ĐÂY.", "TẠI ĐÂY,"]):
+                if any(kw in text_upper for kw in HIDDEN_LINK_KEYWORDS):
                     href = link.get_attribute("href")
                     if href:
                         try:
-                            self.driver.execute_script(
+                            driver.execute_script(
                                 "arguments[0].textContent = arguments[1];",
                                 link,
                                 f"[Link: {href}]",
@@ -155,15 +303,16 @@ class WebCrawler:
             print(f"Lỗi khi xử lý link ẩn: {e}")
             return False
 
-    def _get_content_with_tables(self, element) -> Dict[str, Any]:
+    def _get_content_with_tables(self, element, driver=None) -> Dict[str, Any]:
         """
         Lấy nội dung từ element, xử lý riêng text và bảng.
         Returns: {"text": str, "tables": List[List[List[str]]]}  (list bảng, mỗi bảng là list các hàng)
         """
+        driver = driver or self.driver
         content: Dict[str, Any] = {"text": "", "tables": []}
         try:
             # Trước tiên, xử lý hidden links trong toàn bộ element
-            self._replace_hidden_links(element)
+            self._replace_hidden_links(element, driver)
             
             # Lấy tất cả các bảng
             tables = element.find_elements(By.TAG_NAME, "table")
@@ -171,7 +320,7 @@ class WebCrawler:
             if tables:
                 # Trích xuất dữ liệu từ các bảng
                 for table in tables:
-                    table_data = self._extract_table_data(table)
+                    table_data = self._extract_table_data(table, driver)
                     if table_data:
                         content["tables"].append(table_data)
 
@@ -185,18 +334,13 @@ class WebCrawler:
                     return cloned.textContent || cloned.innerText || "";
                 """
                 try:
-                    text_without_tables = self.driver.execute_script(script, element)
+                    text_without_tables = driver.execute_script(script, element)
                     content["text"] = (text_without_tables or "").strip()
                 except JavascriptException:
                     # Fallback: lấy text từ element gốc
                     content["text"] = (element.text or "").strip()
                 
-                # Thêm placeholder cho các bảng vào text để biết vị trí
-                table_text = ""
-                for i, table_data in enumerate(content["tables"]):
-                    table_text += f"\n\n[BẢNG {i+1}]\n{self._format_table_as_text(table_data)}\n"
-                
-                content["text"] += table_text
+                content["text"] += self._tables_placeholder(content["tables"])
                 
             else:
                 # Không có bảng, chỉ lấy text thông thường
@@ -209,6 +353,65 @@ class WebCrawler:
             
         return content
 
+    def _tables_placeholder(self, tables: List[List[List[str]]]) -> str:
+        """Placeholder cho các bảng (kèm ASCII table) nối vào cuối text để biết vị trí."""
+        table_text = ""
+        for i, table_data in enumerate(tables):
+            table_text += f"\n\n[BẢNG {i+1}]\n{self._format_table_as_text(table_data)}\n"
+        return table_text
+
+    # ----------------------------- Page extraction ----------------------------- #
+    def _extract_page_script(self, driver) -> tuple[str, Dict[str, Any]]:
+        """
+        Lấy header và nội dung `.tip-detail` bằng một lần execute_script (EXTRACT_PAGE_SCRIPT).
+        Phải cho kết quả giống `_extract_page_webdriver` (tests/test_crawler_extraction.py) nhưng chỉ tốn
+        một round-trip WebDriver.
+        """
+        page = driver.execute_script(EXTRACT_PAGE_SCRIPT, HEADER_SELECTORS, MAIN_SELECTORS, HIDDEN_LINK_KEYWORDS)
+        content: Dict[str, Any] = {"text": "", "tables": []}
+        if not page["main_text"]:
+            return page["header"], content
+        self._last_text[id(driver)] = page["main_text"]
+
+        for table in page["tables"]:
+            rows = [[self._cell_text(cell["text"], cell["hrefs"]) for cell in row] for row in table]
+            rows = [row for row in rows if row]
+            if rows:
+                content["tables"].append(rows)
+        content["text"] = (page["text"] or "").strip()
+        if page["has_tables"]:
+            content["text"] += self._tables_placeholder(content["tables"])
+        return page["header"], content
+
+    def _extract_page_webdriver(self, driver) -> tuple[str, Dict[str, Any]]:
+        """Lấy header và nội dung `.tip-detail` bằng cách duyệt từng element qua WebDriver."""
+        content: Dict[str, Any] = {"text": "", "tables": []}
+
+        # Lấy header
+        page_header = ""
+        for selector in HEADER_SELECTORS:
+            try:
+                header = driver.find_element(By.CSS_SELECTOR, selector)
+                if header.text.strip():
+                    page_header = header.text.strip()
+                    break
+            except NoSuchElementException:
+                continue
+
+        # Lấy nội dung chính
+        for selector in MAIN_SELECTORS:
+            try:
+                main_div = driver.find_element(By.CSS_SELECTOR, selector)
+                main_text = main_div.text.strip()
+                if main_text:
+                    self._last_text[id(driver)] = main_text
+                    content = self._get_content_with_tables(main_div, driver)
+                    if content["text"] or content["tables"]:
+                        break
+            except NoSuchElementException:
+                continue
+        return page_header, content
+
     # ----------------------------- Crawl ----------------------------- #
     def _collect_urls(self, base_url: str) -> List[str]:
         """
@@ -227,7 +430,13 @@ class WebCrawler:
         try:
             print(f"Đang thu thập URLs từ: {base_url}")
             self.driver.get(base_url)
-            time.sleep(3)  # Đợi trang load
+            # Đợi danh sách được render thay vì sleep cố định
+            try:
+                WebDriverWait(self.driver, self.timeout).until(
+                    lambda d: d.find_elements(By.CSS_SELECTOR, ".single_content_tip")
+                )
+            except TimeoutException:
+                print("Hết thời gian chờ danh sách single_content_tip")
             
             # Tìm tất cả elements có class single_content_tip
             tip_elements = self.driver.find_elements(By.CSS_SELECTOR, ".single_content_tip")
@@ -258,48 +467,59 @@ class WebCrawler:
                     
         except Exception as e:
             print(f"Lỗi khi thu thập URLs: {e}")
+        finally:
+            self._close_driver()
             
         print(f"Thu thập được {len(urls)} URLs")
         return urls
-    def _crawl_single_url(self, url: str) -> Dict[str, Any]:
-        """Crawl nội dung từ một URL"""
-        assert self.driver is not None, "Driver chưa được khởi tạo."
-        try:
-            self.driver.get(url)
-            time.sleep(2)  # đơn giản, có thể thay bằng WebDriverWait nếu cần
 
-            content_data: Dict[str, Any] = {"text": "", "tables": []}
+    def _wait_for_content(self, driver, previous_text: str = ""):
+        """
+        Chờ `.tip-detail` có nội dung và khác nội dung trang trước (trang là SPA, chuyển URL
+        theo hash nên element cũ có thể vẫn còn trong DOM).
+        """
+        def ready(d):
+            for element in d.find_elements(By.CSS_SELECTOR, ".tip-detail"):
+                text = (element.text or "").strip()
+                if text and text != previous_text:
+                    return True
+            return False
 
-            # Lấy header
-            self.header = ""
-            header_selectors = ['div[class="header"] h2', "h1", "h2", ".header h2"]
-            for selector in header_selectors:
-                try:
-                    header = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    if header.text.strip():
-                        self.header = header.text.strip()
-                        break
-                except NoSuchElementException:
-                    continue
+        try:
+            WebDriverWait(driver, self.timeout, poll_frequency=0.1).until(ready)
+        except TimeoutException:
+            pass
 
-            # Lấy nội dung chính
-            main_selectors = [".tip-detail"] # ".main-content", ".content"
-            for selector in main_selectors:
+    def _crawl_single_url(self, url: str, driver=None) -> Dict[str, Any]:
+        """
+        Crawl nội dung từ một URL.
+        Returns: {"text", "tables", "header"}; self.header cũng được cập nhật khi dùng self.driver.
+        """
+        use_own_driver = driver is None
+        driver = driver or self.driver
+        assert driver is not None, "Driver chưa được khởi tạo."
+        try:
+            driver.get(url)
+            self._wait_for_content(driver, self._last_text.get(id(driver), ""))
+
+            if self.extraction == "script":
                 try:
-                    main_div = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    if main_div.text.strip():
-                        content_data = self._get_content_with_tables(main_div)
-                        if content_data["text"] or content_data["tables"]:
-                            break
-                except NoSuchElementException:
-                    continue
+                    page_header, content_data = self._extract_page_script(driver)
+                except JavascriptException as e:
+                    print(f"Không chạy được script trích xuất, dùng WebDriver: {e}")
+                    page_header, content_data = self._extract_page_webdriver(driver)
+            else:
+                page_header, content_data = self._extract_page_webdriver(driver)
+            if use_own_driver:
+                self.header = page_header
 
             if not (content_data["text"] or content_data["tables"]):
-                return {"text": "Không thể lấy nội dung", "tables": []}
+                return {"text": "Không thể lấy nội dung", "tables": [], "header": page_header, "error": True}
+            content_data["header"] = page_header
             return content_data
         except Exception as e:
             print(f"Lỗi khi crawl {url}: {e}")
-            return {"text": f"Lỗi: {str(e)}", "tables": []}
+            return {"text": f"Lỗi: {str(e)}", "tables": [], "header": "", "error": True}
 
     # ----------------------------- Output helpers ----------------------------- #
     def _clean_text_from_ascii_table(self, text: str) -> str:
@@ -317,17 +537,19 @@ class WebCrawler:
             cleaned_lines.append(line)
         return "\n".join(cleaned_lines).strip()
 
-    def _create_filename(self) -> str:
+    def _create_filename(self, header: str | None = None) -> str:
         """Tạo tên file DOCX từ header nếu có."""
-        clean_header = re.sub(r'[<>:"/\\\\|?*]', "", self.header or "").strip()
+        header = self.header if header is None else header
+        clean_header = re.sub(r'[<>:"/\\\\|?*]', "", header or "").strip()
         return f"{clean_header}.docx" if clean_header else f"content_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
 
-    def _save_to_docx(self, content_data: Dict[str, Any], filename: str) -> bool:
+    def _save_to_docx(self, content_data: Dict[str, Any], filename: str, header: str | None = None) -> bool:
         """Lưu nội dung + bảng vào file DOCX"""
+        header = self.header if header is None else header
         try:
             doc = DocxDocument()
-            if self.header:
-                doc.add_heading(self.header, 0)
+            if header:
+                doc.add_heading(header, 0)
 
             text_content: str = content_data.get("text", "") or ""
             tables: List[List[List[str]]] = content_data.get("tables", []) or []
@@ -357,62 +579,183 @@ class WebCrawler:
             print(f"Lỗi khi lưu file {filename}: {e}")
             return False
 
+    def _build_document(self, url: str, content_data: Dict[str, Any], save: bool = True,
+                        changed: bool = True) -> LCDocument:
+        """Tạo LCDocument từ nội dung đã crawl; ghi file DOCX nếu `save`."""
+        header = content_data.get("header", "")
+        filename = self._create_filename(header)
+
+        page_content = content_data.get("text", "")
+        if content_data.get("tables"):
+            page_content += f"\n\n[Tìm thấy {len(content_data['tables'])} bảng trong nội dung]"
+
+        if save:
+            if self._save_to_docx(content_data, filename, header):
+                print(f"✓ Đã lưu: {filename}")
+                if content_data.get("tables"):
+                    print(f"  → Tìm thấy {len(content_data['tables'])} bảng")
+            else:
+                print(f"✗ Lỗi khi lưu: {filename}")
+
+        return LCDocument(
+            page_content=page_content,
+            metadata={
+                "source": url,
+                "header": header,
+                "tables_count": len(content_data.get("tables", [])),
+                "has_tables": bool(content_data.get("tables")),
+                "saved_as": filename,
+                "content_hash": payload_hash(content_data),
+                "changed": changed,
+                "crawl_error": bool(content_data.get("error")),
+            },
+        )
+
+    def _process_url(self, url: str, driver=None, state: CrawlState | None = None, run_id: str | None = None,
+                     max_age: float | None = None) -> LCDocument:
+        """
+        Crawl một URL, có dùng trạng thái crawl nếu được truyền vào:
+        trang còn mới (max_age) hoặc đã xong trong run đang tiếp tục thì lấy payload đã lưu, không fetch lại;
+        trang fetch lại mà hash nội dung không đổi thì không ghi lại DOCX.
+        """
+        entry = state.get(url) if state is not None else None
+        if state is not None and state.is_fresh(entry, run_id, max_age):
+            print(f"↷ Bỏ qua (đã có trong trạng thái crawl): {url}")
+            # changed: nội dung có đổi ở lần fetch gần nhất của trang không
+            return self._build_document(url, entry["payload"], save=False,
+                                        changed=entry["changed_at"] == entry["fetched_at"])
+
+        if driver is None and self.driver is None:
+            self._setup_driver()
+        self.rate_limiter.wait(url)
+        content_data = self._crawl_single_url(url, driver)
+        if content_data.get("error"):
+            # Trang lỗi không được ghi vào pages để lần chạy sau thử lại
+            self._record_failure(url, content_data["text"], state, run_id)
+            return self._build_document(url, content_data)
+        if state is None:
+            return self._build_document(url, content_data)
+
+        changed = state.record(url, content_data, run_id)
+        if not changed:
+            print(f"= Nội dung không đổi: {url}")
+        return self._build_document(url, content_data, save=changed, changed=changed)
+
+    def _record_failure(self, url: str, error: str, state: CrawlState | None, run_id: str | None):
+        self.failures[url] = error
+        if state is not None:
+            state.record_failure(url, error, run_id)
+
+    def _failed_document(self, url: str, error: Exception, state: CrawlState | None,
+                         run_id: str | None) -> LCDocument:
+        """
+        Document lỗi (crawl_error=True) cho URL mà _process_url ném exception, để kết quả vẫn đủ và
+        đúng thứ tự với urls, và pipeline không xoá tài liệu đã index của trang chỉ vì lần này crawl lỗi.
+        """
+        print(f"Lỗi khi crawl {url}: {error}")
+        self._record_failure(url, str(error), state, run_id)
+        return self._build_document(url, {"text": f"Lỗi: {error}", "tables": [], "header": "", "error": True},
+                                    save=False)
+
     # ----------------------------- Public API ----------------------------- #
-    def run(self, urls: List[str]) -> List[LCDocument]:
+    def run(self, urls: List[str], workers: int = 1, state: CrawlState | None = None,
+            max_age: float | None = None, resume: bool = True) -> List[LCDocument]:
         """
         Crawl danh sách URLs và lưu thành các file DOCX
 
         Args:
             urls (list): Danh sách các URL cần crawl
+            workers (int): Số Chrome driver chạy song song (1 = tuần tự)
+            state (CrawlState): Trạng thái crawl lưu giữa các lần chạy (None = không dùng)
+            max_age (float): Trang fetch trong vòng max_age giây được dùng lại, không fetch lại
+            resume (bool): Tiếp tục run bị gián đoạn trước đó thay vì bắt đầu run mới
 
         Returns:
-            list: Danh sách LangChain Document objects
+            list: Danh sách LangChain Document objects, cùng thứ tự với urls. URL lỗi vẫn có Document
+                (metadata["crawl_error"] = True) và được liệt kê trong self.failures
         """
+        run_id = state.begin_run(resume) if state is not None else None
+        if workers > 1:
+            results = self._run_parallel(urls, workers, state, run_id, max_age)
+        else:
+            results = self._run_sequential(urls, state, run_id, max_age)
+        if self.failures:
+            print(f"{len(self.failures)}/{len(urls)} URL lỗi (sẽ được thử lại ở lần chạy sau):")
+            for url, error in self.failures.items():
+                print(f"  ✗ {url}: {error}")
+        if state is not None:
+            # Mọi URL đều đã được thử; URL lỗi không có trong pages nên run sau vẫn fetch lại
+            state.finish_run(run_id)
+        return results
+
+    def _run_sequential(self, urls: List[str], state: CrawlState | None, run_id: str | None,
+                        max_age: float | None) -> List[LCDocument]:
         results: List[LCDocument] = []
-        self._setup_driver()
+        self.failures = {}
         print(f"Bắt đầu crawl {len(urls)} trang web...")
         
         try:
             for i, url in enumerate(urls, 1):
                 print(f"[{i}/{len(urls)}] Crawling: {url}")
                 self.header = ""  # Reset header cho mỗi URL
-
-                content_data = self._crawl_single_url(url)
-                filename = self._create_filename()
-                success = self._save_to_docx(content_data, filename)
-
-                page_content = content_data.get("text", "")
-                if content_data.get("tables"):
-                    page_content += f"\n\n[Tìm thấy {len(content_data['tables'])} bảng trong nội dung]"
-
-                result = LCDocument(
-                    page_content=page_content,
-                    metadata={
-                        "source": url,
-                        "header": self.header,
-                        "tables_count": len(content_data.get("tables", [])),
-                        "has_tables": bool(content_data.get("tables")),
-                        "saved_as": filename,
-                    },
-                )
-                results.append(result)
-
-                if success:
-                    print(f"✓ Đã lưu: {filename}")
-                    if content_data.get("tables"):
-                        print(f"  → Tìm thấy {len(content_data['tables'])} bảng")
-                else:
-                    print(f"✗ Lỗi khi lưu: {filename}")
-
-                if i < len(urls):
-                    time.sleep(self.delay)
-        except Exception as e:
-            print(f"Lỗi trong quá trình crawl: {e}")
+                try:
+                    results.append(self._process_url(url, state=state, run_id=run_id, max_age=max_age))
+                except Exception as e:
+                    results.append(self._failed_document(url, e, state, run_id))
         finally:
             self._close_driver()
             print("Đã hoàn thành crawl.")
         return results
 
+    def iter_crawl(self, urls: List[str], workers: int = 1, state: CrawlState | None = None,
+                   max_age: float | None = None, run_id: str | None = None):
+        """
+        Crawl song song bằng pool driver, trả dần (index, LCDocument) theo thứ tự hoàn thành.
+        Chỉ giữ tối đa 2 * workers URL đang xử lý, nên người tiêu thụ chậm sẽ làm crawler chậm lại theo.
+        Mọi URL đều được trả về; URL lỗi là Document có metadata["crawl_error"] (xem self.failures).
+        """
+        pool = DriverPool(workers, self._new_driver)
+        self.failures = {}
+
+        def crawl(index: int, url: str):
+            print(f"[{index + 1}/{len(urls)}] Crawling: {url}")
+            if state is not None and state.is_fresh(state.get(url), run_id, max_age):
+                return self._process_url(url, None, state, run_id, max_age)
+            driver = pool.acquire()
+            try:
+                return self._process_url(url, driver, state, run_id, max_age)
+            finally:
+                pool.release(driver)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = {}
+                next_index = 0
+                while next_index < len(urls) or pending:
+                    while next_index < len(urls) and len(pending) < 2 * workers:
+                        pending[executor.submit(crawl, next_index, urls[next_index])] = next_index
+                        next_index += 1
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        try:
+                            doc = future.result()
+                        except Exception as e:
+                            doc = self._failed_document(urls[index], e, state, run_id)
+                        yield index, doc
+        finally:
+            pool.close()
+
+    def _run_parallel(self, urls: List[str], workers: int, state: CrawlState | None = None,
+                      run_id: str | None = None, max_age: float | None = None) -> List[LCDocument]:
+        """Crawl song song bằng pool driver; giãn cách theo host thay cho sleep toàn cục."""
+        results: List[LCDocument | None] = [None] * len(urls)
+        print(f"Bắt đầu crawl {len(urls)} trang web với {workers} driver...")
+        for index, doc in self.iter_crawl(urls, workers, state, max_age, run_id):
+            results[index] = doc
+        print("Đã hoàn thành crawl.")
+        return results
+
 # Ví dụ sử dụng
 if __name__ == "__main__":
     # Danh sách URL cần crawl
@@ -428,6 +771,6 @@ if __name__ == "__main__":
     
     # In kết quả
     print("\n=== KẾT QUẢ ===")
-    for result in results:
-        status = "✓" if result["success"] else "✗"
-        print(f"{status} {result['url']} -> {result['filename']}")
\ No newline at end of file
+    for doc in results:
+        status = "✗" if doc.metadata["crawl_error"] else "✓"
+        print(f"{status} {doc.metadata['source']} -> {doc.metadata['saved_as']}")
\ No newline at end of file
@@ -0,0 +1,182 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+
+# "sqlite": một file SQLite (nội dung nén zlib, metadata JSON); "files": LocalFileStore cũ (mỗi tài liệu một file)
+DOCSTORE = os.getenv("DOCSTORE", "sqlite")
+DOCSTORE_PATH = "data/processed/docstore.db"
+# Docstore dạng thư mục của các phiên bản trước, được chép sang SQLite ở lần mở đầu tiên
+LEGACY_STORE_DIR = "data/processed/store/"
+# Dung lượng tối đa (MB, theo số byte văn bản) của LRU các Document đã giải mã
+DOCSTORE_CACHE_MB = float(os.getenv("DOCSTORE_CACHE_MB", "64"))
+# Giới hạn số tham số của một câu lệnh SQLite
+_MAX_PARAMS = 500
+
+
+def _encode(doc: Document) -> Tuple[bytes, str]:
+    return zlib.compress(doc.page_content.encode("utf-8")), json.dumps(doc.metadata, ensure_ascii=False)
+
+
+def _decode(content: bytes, metadata: str) -> Document:
+    return Document(page_content=zlib.decompress(content).decode("utf-8"), metadata=json.loads(metadata))
+
+
+class SQLiteDocStore(BaseStore[str, Document]):
+    """
+    Docstore tài liệu gốc trong một file SQLite, thay cho LocalFileStore (mỗi tài liệu một file pickle/JSON).
+
+    - `mget` đọc nhiều khoá trong một câu SELECT ... IN (...).
+    - Document đã giải mã được giữ trong LRU giới hạn `cache_mb`; LRU tự xoá khi process khác
+      ghi vào file (theo PRAGMA data_version), nên server luôn thấy dữ liệu mới sau khi index lại.
+    - Document trả về được dùng chung với LRU: chỉ đọc, không sửa tại chỗ.
+    """
+
+    def __init__(self, path: str = DOCSTORE_PATH, cache_mb: float = DOCSTORE_CACHE_MB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # WAL: process index ghi trong khi server vẫn đọc được
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, content BLOB NOT NULL, metadata TEXT NOT NULL) "
+            "WITHOUT ROWID"
+        )
+        self._db.commit()
+        self.max_bytes = int(cache_mb * 1024 * 1024)
+        self._cache: "OrderedDict[str, Tuple[Document, int]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    # ----------------------------- LRU ----------------------------- #
+    def _check_version(self):
+        """Xoá LRU nếu một kết nối khác đã ghi vào database kể từ lần kiểm tra trước."""
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def _remember(self, key: str, doc: Document):
+        size = len(doc.page_content) + 64
+        if size > self.max_bytes:
+            return
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cache_bytes -= old[1]
+        self._cache[key] = (doc, size)
+        self._cache_bytes += size
+        while self._cache_bytes > self.max_bytes:
+            _, (_, evicted) = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted
+
+    def _forget(self, keys: Sequence[str]):
+        for key in keys:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._cache_bytes -= old[1]
+
+    # ----------------------------- BaseStore ----------------------------- #
+    def mget(self, keys: Sequence[str]) -> List[Optional[Document]]:
+        found: dict[str, Document] = {}
+        with self._lock:
+            self._check_version()
+            missing = []
+            for key in keys:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = cached[0]
+                elif key not in missing:
+                    missing.append(key)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            for start in range(0, len(missing), _MAX_PARAMS):
+                batch = missing[start:start + _MAX_PARAMS]
+                rows = self._db.execute(
+                    f"SELECT key, content, metadata FROM docs WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, content, metadata in rows:
+                    doc = _decode(content, metadata)
+                    found[key] = doc
+                    self._remember(key, doc)
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, Document]]) -> None:
+        rows = [(key, *_encode(doc)) for key, doc in key_value_pairs]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO docs (key, content, metadata) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+            self._forget([key for key, _ in key_value_pairs])
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), _MAX_PARAMS):
+                batch = keys[start:start + _MAX_PARAMS]
+                self._db.execute(f"DELETE FROM docs WHERE key IN ({','.join('?' * len(batch))})", batch)
+            self._db.commit()
+            self._forget(keys)
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            if prefix:
+                rows = self._db.execute("SELECT key FROM docs WHERE key >= ? AND key < ? ORDER BY key",
+                                        (prefix, prefix + "\uffff")).fetchall()
+            else:
+                rows = self._db.execute("SELECT key FROM docs ORDER BY key").fetchall()
+        for (key,) in rows:
+            yield key
+
+    # ----------------------------- Tiện ích ----------------------------- #
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def import_from(self, store: BaseStore[str, Document], batch_size: int = 256) -> int:
+        """Chép toàn bộ tài liệu từ docstore khác (ví dụ LocalFileStore cũ)."""
+        keys = list(store.yield_keys())
+        copied = 0
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            pairs = [(key, doc) for key, doc in zip(batch, store.mget(batch)) if doc is not None]
+            self.mset(pairs)
+            copied += len(pairs)
+        return copied
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache),
+                "cached_mb": round(self._cache_bytes / 1024 / 1024, 2)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_docstore(path: str | None = None, backend: str = DOCSTORE,
+                  legacy_dir: str | None = LEGACY_STORE_DIR) -> BaseStore[str, Document]:
+    """
+    Mở docstore tài liệu gốc theo backend. Với "sqlite", nếu database còn trống mà thư mục docstore cũ
+    (`legacy_dir`) có dữ liệu thì chép sang một lần.
+    """
+    from langchain.storage import LocalFileStore
+    from langchain.storage._lc_store import create_kv_docstore
+
+    if backend == "files":
+        return create_kv_docstore(LocalFileStore(path or LEGACY_STORE_DIR))
+    if backend != "sqlite":
+        raise ValueError(f"DOCSTORE không hợp lệ: {backend}")
+    store = SQLiteDocStore(path or DOCSTORE_PATH)
+    if legacy_dir and os.path.isdir(legacy_dir) and os.listdir(legacy_dir) and not store.count():
+        copied = store.import_from(create_kv_docstore(LocalFileStore(legacy_dir)))
+        print(f"Đã chép {copied} tài liệu từ {legacy_dir} sang {store.path}")
+    return store
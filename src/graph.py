@@ -1,36 +1,100 @@
-from langgraph.graph import END, StateGraph, START
-from typing import TypedDict, Annotated, Sequence
-from langchain_chroma import Chroma
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from langchain_core.messages import RemoveMessage
-from src.chains.retrieval_chain import RetrievalChain
+from langgraph.graph import END, START
+from langgraph.graph import StateGraph as BaseStateGraph
+from typing import TypedDict
+from langchain_core.runnables import RunnableLambda
+from src.chains.retrieval_chain import RetrievalChain, OutputSchema
 from src.chains.search_chain import search_chain
-from src.utils.llm_model import get_llm
-from src.utils.embedding_model import get_embedding
+from src.chains.planner_chain import planner_chain
+from src.registry import registry
+from src import metrics
+from src.utils.executor import run_blocking
+from src.semantic_cache import SemanticCache, index_version_file
+from src.router import FollowUpClassifier, LocalRouter, parse_yes_no
+from src.bm25 import BM25Index, index_path
+from src.reranker import RERANKER, CrossEncoderReranker
+from src.vectorstore import CHUNK_COLLECTION, collection_directory, open_collection
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.exceptions import OutputParserException
+import os
+import time
 
 
 class State(TypedDict):
     question: str
     answer: str
-    summary: str 
+    summary: str
     source: str | None
+    queries: list[str] | None  # query truy hồi do planner sinh ra (chế độ fast)
 
-class StateGraph(StateGraph[State]):
-    def __init__(self, state_type: type[State]):
+class StateGraph(BaseStateGraph[State]):
+    def __init__(self, state_type: type[State], llm=None, vectorstore=None, byte_store=None, cache=None,
+                 chunk_store=None, lexical_index=None, reranker=None, docstore=None, gateway=None):
+        """
+        Args:
+            llm: LLM dùng cho toàn bộ graph (mặc định Gemini, dùng chung qua src.registry)
+            vectorstore: collection summaries (mặc định registry.get("vectorstore"): data/processed/chroma_db/,
+                backend theo VECTOR_BACKEND)
+            chunk_store: collection chunks; mặc định mở khi RETRIEVAL_MODE=chunk (cần index với INDEX_MODE=chunk/both)
+            lexical_index: index BM25 cho truy hồi lai; mặc định đọc từ data/processed/bm25/ (HYBRID_RETRIEVAL=0 để tắt)
+            reranker: bước chọn tài liệu sau RRF; mặc định LLM chọn doc_id (RERANKER=cross-encoder để chấm điểm
+                bằng cross-encoder trên CPU)
+            docstore: docstore chứa tài liệu gốc (mặc định SQLite trong data/processed/docstore.db)
+            byte_store: ByteStore chứa tài liệu gốc dạng cũ, dùng khi không truyền docstore
+            cache: SemanticCache cho câu trả lời; mặc định bật theo biến môi trường SEMANTIC_CACHE
+            gateway: LLMGateway cho mọi lời gọi LLM của graph (mặc định registry.get("llm_gateway"))
+        """
         super().__init__(state_type)
-        self.llm = get_llm()
-        self.embeddings = get_embedding()
-        self.vectorstore = Chroma(
-            collection_name="summaries",
-            embedding_function=self.embeddings,
-            persist_directory="data/processed/chroma_db/"
-        )
-        self.qa_chain = RetrievalChain(self.vectorstore)
-        self.search_chain = search_chain()
+        # llm=None: các call site của gateway dùng client Gemini dùng chung trong src.registry
+        self.llm = llm
+        self.gateway = gateway or registry.get("llm_gateway")
+        shared = vectorstore is None
+        if shared:
+            self.embeddings = registry.get("embedding")
+            vectorstore = registry.get("vectorstore")
+        else:
+            self.embeddings = vectorstore.embeddings
+        self.vectorstore = vectorstore
+        if chunk_store is None and os.getenv("RETRIEVAL_MODE", "summary") == "chunk":
+            # Collection chunks phải dùng cùng embedding với vectorstore
+            chunk_store = registry.get("chunk_store") if shared else open_collection(CHUNK_COLLECTION, self.embeddings)
+        if lexical_index is None and os.getenv("HYBRID_RETRIEVAL", "1") == "1":
+            lexical_index = BM25Index.load(index_path("chunks" if chunk_store is not None else "documents"))
+        if reranker is None and RERANKER == "cross-encoder":
+            reranker = CrossEncoderReranker()
+        if cache is None and os.getenv("SEMANTIC_CACHE", "1") == "1":
+            cache = SemanticCache(
+                self.embeddings,
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+                ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+                # Theo dõi phiên bản của chính index đang truy hồi (VectorStore.save ghi vào cùng thư mục)
+                version_file=index_version_file(collection_directory(self.vectorstore)),
+            )
+        self.qa_chain = RetrievalChain(self.vectorstore, llm=llm, llm_answer=llm, byte_store=byte_store, cache=cache,
+                                       chunk_store=chunk_store, lexical_index=lexical_index, reranker=reranker,
+                                       docstore=docstore, gateway=self.gateway)
+        # Các chain chỉ được dựng một lần, mỗi chain một call site trong thống kê của gateway
+        self.search_chain = search_chain(self.gateway.site("search", llm))
+        self.planner_chain = planner_chain(self.gateway.site("planner", llm))
+        self.router_question_chain = self._router_question_chain()
+        self.rewrite_question_chain = self._rewrite_question_chain()
+        self.router_chain = self._router_chain()
+        self.summary_chain = self._summary_chain()
+        # Định tuyến cục bộ trước khi gọi LLM (LOCAL_ROUTER=0 để luôn hỏi LLM); bộ phân loại câu hỏi tiếp nối
+        # chỉ dùng khi có trọng số đã huấn luyện (LOCAL_ROUTER_MODEL, xem FollowUpClassifier)
+        self.local_router = None
+        if os.getenv("LOCAL_ROUTER", "1") == "1":
+            model_path = os.getenv("LOCAL_ROUTER_MODEL")
+            self.local_router = LocalRouter(
+                self.embeddings,
+                classifier=FollowUpClassifier.load(model_path) if model_path else None,
+                confidence=float(os.getenv("LOCAL_ROUTER_CONFIDENCE", "0.85")),
+            )
+        self.mode = "default"
 
-    def router_question(self, state: State) -> str:
+    # ----------------------------- Prompts ----------------------------- #
+    def _router_question_chain(self):
         template = """
             Hãy phân tích câu hỏi sau và trả lời xem câu hỏi này có phải tiếp nối của câu hỏi trước đó không.
             Câu hỏi: {question}
@@ -43,13 +107,9 @@ class StateGraph(StateGraph[State]):
             template=template,
             input_variables=["question", "summary"]
         )
-        
-        chain = prompt | self.llm | StrOutputParser()
-        result = chain.invoke({"question": state["question"], "summary": state["summary"]})
+        return prompt | self.gateway.site("router_question", self.llm) | StrOutputParser()
 
-        return result 
-    
-    def rewrite_question(self, state: State):
+    def _rewrite_question_chain(self):
         template = """
             Bạn là một chuyên gia viết lại câu hỏi dựa trên ngữ cảnh hội thoại trước đó.
             Hãy dựa vào ngữ cảnh cuộc hội thoại trước đó và câu hỏi hiện tại để viết lại câu hỏi với đầy đủ ngữ cảnh.
@@ -61,27 +121,9 @@ class StateGraph(StateGraph[State]):
             template=template,
             input_variables=["question", "summary"]
         )
-        chain = prompt | self.llm | StrOutputParser()
-        question = chain.invoke({"question": state["question"], "summary": state["summary"]})
-        state["question"] = question
+        return prompt | self.gateway.site("rewrite_question", self.llm) | StrOutputParser()
 
-        return state
-    
-    def get_answer(self, state: State):
-        question = state["question"]
-        result = self.qa_chain.run(question)
-        state["answer"] = result.answer
-        state["source"] = result.sources if result.sources else None
-        return state 
-    
-    def get_search(self, state: State):
-        question = state["question"]
-        result = self.search_chain.invoke({"question": question})
-        state["answer"] = result
-        return state 
-    def router(self, state: State):
-        answer = state["answer"]
-        question = state["question"]
+    def _router_chain(self):
         template = """
             Bạn là một chuyên gia trả lời câu hỏi từ dữ liệu nội bộ.
             Với câu hỏi và câu trả lời như dưới đây thì có nên tìm kiếm câu trả lời trên internet không.
@@ -93,11 +135,9 @@ class StateGraph(StateGraph[State]):
             template=template,
             input_variables=["question", "answer"]
         )
+        return prompt | self.gateway.site("router", self.llm) | StrOutputParser()
 
-        chain = prompt | self.llm | StrOutputParser()
-        return chain.invoke({"question": question, "answer": answer})
-    
-    def get_summary(self, state: State):
+    def _summary_chain(self):
         template = """
             Bạn là một chuyên gia tóm tắt cuộc hội thoại giữa người và AI.
             Hãy tóm tắt câu hỏi và câu trả lời sau, cố gắng giữ lại những ngữ cảnh quan trọng.
@@ -110,24 +150,228 @@ class StateGraph(StateGraph[State]):
             template=template,
             input_variables=["question", "answer", "summary"]
         )
+        return prompt | self.gateway.site("summary", self.llm) | StrOutputParser()
+
+    # ----------------------------- Nodes ----------------------------- #
+    def _local_route_question(self, state: State) -> str | None:
+        if self.local_router is None:
+            return None
+        return self.local_router.route_question(state["question"], state["summary"])
+
+    def _local_route_answer(self, state: State) -> str | None:
+        if self.local_router is None:
+            return None
+        return self.local_router.route_answer(state["answer"], state.get("source"))
+
+    @metrics.timed("node", "router_question")
+    def router_question(self, state: State) -> str:
+        route = self._local_route_question(state)
+        if route is not None:
+            return route
+        chain = self.router_question_chain
+        return parse_yes_no(chain.invoke({"question": state["question"], "summary": state["summary"]}))
+
+    @metrics.timed("node", "router_question")
+    async def arouter_question(self, state: State) -> str:
+        route = await run_blocking(self._local_route_question, state)
+        if route is not None:
+            return route
+        chain = self.router_question_chain
+        return parse_yes_no(await chain.ainvoke({"question": state["question"], "summary": state["summary"]}))
+
+    @metrics.timed("node", "rewrite_question")
+    def rewrite_question(self, state: State):
+        chain = self.rewrite_question_chain
+        state["question"] = chain.invoke({"question": state["question"], "summary": state["summary"]})
+        return state
+
+    @metrics.timed("node", "rewrite_question")
+    async def arewrite_question(self, state: State):
+        chain = self.rewrite_question_chain
+        state["question"] = await chain.ainvoke({"question": state["question"], "summary": state["summary"]})
+        return state
+
+    def _apply_plan(self, state: State, plan):
+        if plan is None:
+            # Planner trả về sai định dạng: giữ câu hỏi gốc, RetrievalChain tự sinh query
+            state["queries"] = None
+            return state
+        if plan.follow_up and plan.question.strip():
+            state["question"] = plan.question.strip()
+        state["queries"] = [q for q in plan.queries if q.strip()] or None
+        return state
+
+    @metrics.timed("node", "plan")
+    def plan(self, state: State):
+        try:
+            plan = self.planner_chain.invoke({"question": state["question"], "summary": state["summary"]})
+        except OutputParserException:
+            plan = None
+        return self._apply_plan(state, plan)
+
+    @metrics.timed("node", "plan")
+    async def aplan(self, state: State):
+        try:
+            plan = await self.planner_chain.ainvoke({"question": state["question"], "summary": state["summary"]})
+        except OutputParserException:
+            plan = None
+        return self._apply_plan(state, plan)
+
+    @metrics.timed("node", "answer")
+    def get_answer(self, state: State):
+        question = state["question"]
+        result = self.qa_chain.run(question, state.get("queries"))
+        state["answer"] = result.answer
+        state["source"] = result.sources if result.sources else None
+        return state
+
+    @metrics.timed("node", "answer")
+    async def aget_answer(self, state: State):
+        result = await self.qa_chain.arun(state["question"], state.get("queries"))
+        state["answer"] = result.answer
+        state["source"] = result.sources if result.sources else None
+        return state
 
-        chain = prompt | self.llm | StrOutputParser()
-        summary = chain.invoke({"question": state["question"], "answer": state["answer"], "summary": state["summary"]})
-        state["summary"] = summary
+    @metrics.timed("node", "search")
+    def get_search(self, state: State):
+        question = state["question"]
+        result = self.search_chain.invoke({"question": question})
+        state["answer"] = result
+        return state
 
+    @metrics.timed("node", "search")
+    async def aget_search(self, state: State):
+        state["answer"] = await self.search_chain.ainvoke({"question": state["question"]})
+        return state
+
+    @metrics.timed("node", "router")
+    def router(self, state: State):
+        route = self._local_route_answer(state)
+        if route is not None:
+            return route
+        chain = self.router_chain
+        return parse_yes_no(chain.invoke({"question": state["question"], "answer": state["answer"]}))
+
+    @metrics.timed("node", "router")
+    async def arouter(self, state: State):
+        route = self._local_route_answer(state)
+        if route is not None:
+            return route
+        chain = self.router_chain
+        return parse_yes_no(await chain.ainvoke({"question": state["question"], "answer": state["answer"]}))
+
+    @metrics.timed("node", "summary")
+    def get_summary(self, state: State):
+        chain = self.summary_chain
+        state["summary"] = chain.invoke({"question": state["question"], "answer": state["answer"], "summary": state["summary"]})
         return state
-    
-    def create_graph(self):
-        graph = StateGraph(State)
 
-        graph.add_node("node_rewrite_question", self.rewrite_question)
-        graph.add_node("node_answer", self.get_answer)
-        graph.add_node("node_search", self.get_search)
-        graph.add_node("node_summary", self.get_summary)
+    @metrics.timed("node", "summary")
+    async def aget_summary(self, state: State):
+        chain = self.summary_chain
+        state["summary"] = await chain.ainvoke({"question": state["question"], "answer": state["answer"], "summary": state["summary"]})
+        return state
+
+    async def astream_answer(self, state: State):
+        """
+        Luồng streaming cho một lượt hỏi: router_question/rewrite (hoặc planner ở chế độ fast)
+        → truy hồi → stream câu trả lời.
+        Không có tài liệu phù hợp thì stream câu trả lời của search_chain thay vì hỏi router sau khi trả lời.
+        Tóm tắt hội thoại không chạy ở đây, người gọi tự gọi aget_summary sau khi đã gửi xong câu trả lời.
+
+        Yield ("token", text) cho từng đoạn, cuối cùng là ("sources", list). `state` được cập nhật
+        question/answer/source.
+        """
+        if self.mode == "fast":
+            await self.aplan(state)
+        elif await self.arouter_question(state) == "yes":
+            await self.arewrite_question(state)
+        question = state["question"]
+
+        cached, vector = await run_blocking(self.qa_chain.cache_lookup, question)
+        if cached is not None:
+            state["answer"] = cached.answer
+            state["source"] = cached.sources if cached.sources else None
+            yield "token", cached.answer
+            yield "sources", cached.sources
+            return
+
+        docs, sources = await self.qa_chain.aprepare(question, state.get("queries"))
+        if docs:
+            stream = self.qa_chain.astream_answer(question, docs)
+        else:
+            stream = self.search_chain.astream({"question": question})
+
+        parts = []
+        async for chunk in stream:
+            parts.append(chunk)
+            yield "token", chunk
+
+        state["answer"] = "".join(parts)
+        state["source"] = sources if sources else None
+        if docs:
+            self.qa_chain.cache_store(question, OutputSchema(answer=state["answer"], sources=sources), vector)
+        yield "sources", sources
+
+    # ----------------------------- Warm-up ----------------------------- #
+    def warm_up(self, text: str = "học bổng khuyến khích học tập") -> dict:
+        """
+        Tải trước những gì request đầu tiên sẽ phải chờ: client LLM dùng chung, một forward pass của model
+        embedding (bỏ qua cache), một truy vấn vào từng collection, docstore, index BM25 và cross-encoder.
+        Trả về thời gian (giây) của từng bước.
+        """
+        timings = {}
+
+        def step(name, func):
+            start = time.perf_counter()
+            result = func()
+            timings[name] = round(time.perf_counter() - start, 3)
+            return result
+
+        if self.llm is None:
+            step("llm", lambda: (registry.get("llm"), registry.get("llm_answer")))
+        # CachedEmbeddings bọc model thật: gọi thẳng model để chắc chắn có forward pass
+        model = getattr(self.embeddings, "model", self.embeddings)
+        vector = step("embedding", lambda: model.embed_query(text))
+        step("vectorstore", lambda: self.vectorstore._collection.query(query_embeddings=[vector], n_results=1))
+        if self.qa_chain.chunk_store is not None:
+            step("chunk_store", lambda: self.qa_chain.chunk_store._collection.query(
+                query_embeddings=[vector], n_results=1))
+        step("docstore", lambda: self.qa_chain.docstore.mget([""]))
+        if self.qa_chain.lexical_index is not None:
+            index = self.qa_chain.lexical_index
+            step("lexical_index", lambda: (index.refresh(), index.search(text, 1)))
+        if isinstance(self.qa_chain.reranker, CrossEncoderReranker):
+            step("reranker", lambda: self.qa_chain.reranker.score(text, [text]))
+        return timings
+
+    def create_graph(self, mode: str = "default"):
+        """
+        Mỗi node/router được bọc bằng RunnableLambda gồm cả bản sync và async,
+        nên graph sau khi compile chạy được với cả invoke và ainvoke.
+        Thời gian của từng node được ghi vào src.metrics (decorator metrics.timed trên các method node).
+
+        Args:
+            mode: "default" - graph đầy đủ như trước;
+                  "fast" - một lời gọi planner thay cho router_question/rewrite/sinh query,
+                  không có node_summary (người gọi tự chạy aget_summary ở nền sau khi trả lời).
+        """
+        self.mode = mode
+        if mode == "fast":
+            return self.create_fast_graph()
+        if mode != "default":
+            raise ValueError(f"Chế độ graph không hợp lệ: {mode}")
+
+        graph = BaseStateGraph(State)
+
+        graph.add_node("node_rewrite_question", RunnableLambda(self.rewrite_question, afunc=self.arewrite_question))
+        graph.add_node("node_answer", RunnableLambda(self.get_answer, afunc=self.aget_answer))
+        graph.add_node("node_search", RunnableLambda(self.get_search, afunc=self.aget_search))
+        graph.add_node("node_summary", RunnableLambda(self.get_summary, afunc=self.aget_summary))
 
         graph.add_conditional_edges(
             START,
-            self.router_question,
+            RunnableLambda(self.router_question, afunc=self.arouter_question),
             {
                 "yes": "node_rewrite_question",
                 "no": "node_answer"
@@ -136,7 +380,7 @@ class StateGraph(StateGraph[State]):
         graph.add_edge("node_rewrite_question", "node_answer")
         graph.add_conditional_edges(
             "node_answer",
-            self.router,
+            RunnableLambda(self.router, afunc=self.arouter),
             {
                 "yes": "node_search",
                 "no": "node_summary"
@@ -144,4 +388,24 @@ class StateGraph(StateGraph[State]):
         )
         graph.add_edge("node_search", "node_summary")
         graph.add_edge("node_summary", END)
-        return graph
\ No newline at end of file
+        return graph
+
+    def create_fast_graph(self):
+        graph = BaseStateGraph(State)
+
+        graph.add_node("node_plan", RunnableLambda(self.plan, afunc=self.aplan))
+        graph.add_node("node_answer", RunnableLambda(self.get_answer, afunc=self.aget_answer))
+        graph.add_node("node_search", RunnableLambda(self.get_search, afunc=self.aget_search))
+
+        graph.add_edge(START, "node_plan")
+        graph.add_edge("node_plan", "node_answer")
+        graph.add_conditional_edges(
+            "node_answer",
+            RunnableLambda(self.router, afunc=self.arouter),
+            {
+                "yes": "node_search",
+                "no": END
+            }
+        )
+        graph.add_edge("node_search", END)
+        return graph
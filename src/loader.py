@@ -1,22 +1,121 @@
 from langchain.schema import Document
-from langchain_docling import DoclingLoader
-from langchain_docling.loader import ExportType
+from langchain.storage import LocalFileStore
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+import hashlib
+import json
+import os
+
+# Markdown đã convert, theo sha256 nội dung file: file không đổi thì không parse lại
+CONVERSION_CACHE_DIR = "data/processed/conversion_cache/"
+# Số process convert song song (1 = trong process hiện tại)
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+# Converter của process hiện tại, khởi tạo một lần và dùng lại cho mọi file
+_converter = None
+
+
+def _get_converter():
+    global _converter
+    if _converter is None:
+        from docling.document_converter import DocumentConverter
+        _converter = DocumentConverter()
+    return _converter
+
+
+def _convert(file_path: str) -> list[dict]:
+    """Convert một file sang Markdown bằng converter của process; trả về dict để pickle được."""
+    from langchain_docling import DoclingLoader
+    from langchain_docling.loader import ExportType
+
+    loader = DoclingLoader(
+        file_path=file_path,
+        converter=_get_converter(),
+        export_type=ExportType.MARKDOWN,
+        # chunker=HybridChunker(tokenizer="sentence-transformers/all-MiniLM-L6-v2")
+    )
+    return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in loader.lazy_load()]
+
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-import os 
 
 class Loader:
-    def __init__(self):
-        self.documents = []
+    def __init__(self, workers: int = LOADER_WORKERS, cache_dir: str | None = CONVERSION_CACHE_DIR):
+        """
+        Args:
+            workers: số process convert song song, mỗi process giữ một DocumentConverter
+            cache_dir: thư mục cache Markdown theo hash file (None để tắt)
+        """
+        self.workers = max(1, workers)
+        self.cache = LocalFileStore(cache_dir) if cache_dir else None
+        self.cache_hits = 0
+        self.converted = 0
+
+    def _to_documents(self, file_path: str, items: list[dict]) -> list[Document]:
+        # source theo đường dẫn hiện tại (file có thể đã được đổi tên/di chuyển từ lần cache trước)
+        return [Document(page_content=item["page_content"], metadata={**item["metadata"], "source": file_path})
+                for item in items]
+
+    def _store(self, key: str, items: list[dict]):
+        if self.cache is not None:
+            self.cache.mset([(key, json.dumps(items, ensure_ascii=False).encode("utf-8"))])
+
+    def lazy_load(self, directory) -> Iterator[Document]:
+        """
+        Trả dần Document của từng file: file có trong cache trước, sau đó các file vừa convert
+        theo thứ tự hoàn thành.
+        """
+        files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if os.path.isfile(os.path.join(directory, name))
+        )
+        pending: list[tuple[str, str]] = []
+        for file_path in files:
+            key = file_hash(file_path)
+            cached = self.cache.mget([key])[0] if self.cache is not None else None
+            if cached is not None:
+                self.cache_hits += 1
+                yield from self._to_documents(file_path, json.loads(cached))
+            else:
+                pending.append((file_path, key))
+
+        if not pending:
+            return
+        if self.workers == 1 or len(pending) == 1:
+            for file_path, key in pending:
+                try:
+                    items = _convert(file_path)
+                except Exception as e:
+                    print(f"Lỗi khi convert {file_path}: {e}")
+                    continue
+                self._store(key, items)
+                self.converted += 1
+                yield from self._to_documents(file_path, items)
+            return
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+            futures = {executor.submit(_convert, file_path): (file_path, key) for file_path, key in pending}
+            for future in as_completed(futures):
+                file_path, key = futures[future]
+                try:
+                    items = future.result()
+                except Exception as e:
+                    print(f"Lỗi khi convert {file_path}: {e}")
+                    continue
+                self._store(key, items)
+                self.converted += 1
+                yield from self._to_documents(file_path, items)
 
     def load_documents(self, directory) -> list[Document]:
-        documents = self.documents
-        for file in os.listdir(directory):
-            loader = DoclingLoader(
-                file_path=os.path.join(directory, file),
-                export_type=ExportType.MARKDOWN,
-                # chunker=HybridChunker(tokenizer="sentence-transformers/all-MiniLM-L6-v2")
-            )
-            documents.extend(loader.load())
-        return documents
+        # Mỗi lần gọi trả về danh sách mới, không cộng dồn với các lần trước
+        return list(self.lazy_load(directory))
+
     def run(self, directory) -> list[Document]:
         return self.load_documents(directory)
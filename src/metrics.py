@@ -0,0 +1,241 @@
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Metric cho Prometheus (định dạng text 0.0.4, xem GET /metrics) và trace theo từng request (debug).
+# Tự cài đặt thay vì dùng prometheus_client: chỉ cần counter + histogram, không thêm dependency cho container.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_METRICS: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _METRICS.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: cần đúng các nhãn {self.labels}, nhận {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(list(zip(self.labels, key)))} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # nhãn -> [số mẫu theo từng bucket (không cộng dồn), tổng, số mẫu]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            pairs = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+
+def render() -> str:
+    """Toàn bộ metric theo định dạng text của Prometheus."""
+    return "\n".join(line for metric in _METRICS for line in metric.render()) + "\n"
+
+
+HTTP_REQUESTS = Counter("rag_http_requests_total", "Số request chat theo endpoint và kết quả", ("endpoint", "status"))
+HTTP_SECONDS = Histogram("rag_http_request_seconds", "Thời gian xử lý request chat (giây)", ("endpoint",))
+NODE_SECONDS = Histogram("rag_node_seconds", "Thời gian chạy từng node của graph (giây)", ("node",))
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Thời gian từng bước của RetrievalChain (giây)", ("stage",))
+LLM_SECONDS = Histogram("rag_llm_seconds", "Độ trễ lời gọi LLM theo call site, không tính thời gian chờ slot (giây)",
+                        ("site",))
+LLM_CALLS = Counter("rag_llm_calls_total", "Số lời gọi LLM theo call site và kết quả", ("site", "outcome"))
+LLM_RETRIES = Counter("rag_llm_retries_total", "Số lần thử lại lời gọi LLM theo call site", ("site",))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Số token LLM (ước lượng ~3 ký tự/token) theo call site và chiều",
+                     ("site", "direction"))
+RETRIEVED_DOCUMENTS = Histogram("rag_retrieved_documents", "Số tài liệu/chunk sau từng bước truy hồi", ("stage",),
+                                buckets=COUNT_BUCKETS)
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Số lần tra cache theo loại cache và kết quả", ("cache", "result"))
+
+_HISTOGRAMS = {"node": NODE_SECONDS, "stage": STAGE_SECONDS}
+
+
+# ----------------------------- Trace theo request ----------------------------- #
+class Trace:
+    """Các span (node, stage) và thống kê LLM của một request, trả về cho client khi bật debug."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[dict] = []
+        self.llm: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def add_llm(self, site: str, seconds: float, tokens_in: int, tokens_out: int):
+        with self._lock:
+            stats = self.llm.setdefault(site, {"calls": 0, "ms": 0.0, "tokens_in": 0, "tokens_out": 0})
+            stats["calls"] += 1
+            stats["ms"] = round(stats["ms"] + seconds * 1000, 1)
+            stats["tokens_in"] += tokens_in
+            stats["tokens_out"] += tokens_out
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"total_ms": round((time.perf_counter() - self.start) * 1000, 1),
+                    "spans": sorted(self.spans, key=lambda span: span["start_ms"]), "llm": dict(self.llm)}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("rag_trace", default=None)
+
+
+@contextmanager
+def tracing(enabled: bool = True):
+    """Ghi trace cho đoạn code bên trong (kể cả task con và hàm chạy qua run_blocking); yield Trace hoặc None."""
+    if not enabled:
+        yield None
+        return
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """
+    Đo thời gian một node ("node") hoặc một bước truy hồi ("stage"): ghi vào histogram tương ứng và
+    vào trace của request (nếu có). Yield dict `attrs` để thêm thông tin (ví dụ số tài liệu) vào span.
+    """
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        elapsed = time.perf_counter() - start
+        _HISTOGRAMS[kind].observe(elapsed, **{_HISTOGRAMS[kind].labels[0]: name})
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span({"kind": kind, "name": name, "start_ms": round((start - trace.start) * 1000, 1),
+                            "ms": round(elapsed * 1000, 1), **attrs})
+
+
+def timed(kind: str, name: str):
+    """Decorator dạng `span` cho hàm sync hoặc async."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_documents(stage: str, count: int, attrs: dict | None = None):
+    RETRIEVED_DOCUMENTS.observe(count, stage=stage)
+    if attrs is not None:
+        attrs["documents"] = count
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span({"kind": "cache", "name": cache, "start_ms": round((time.perf_counter() - trace.start) * 1000, 1),
+                        "ms": 0.0, "hit": hit})
+
+
+def record_llm(site: str, seconds: float, tokens_in: int, tokens_out: int, ok: bool = True):
+    LLM_CALLS.inc(site=site, outcome="ok" if ok else "error")
+    if not ok:
+        return
+    LLM_SECONDS.observe(seconds, site=site)
+    LLM_TOKENS.inc(tokens_in, site=site, direction="in")
+    LLM_TOKENS.inc(tokens_out, site=site, direction="out")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm(site, seconds, tokens_in, tokens_out)
@@ -0,0 +1,332 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore as BaseVectorStore
+
+# Số hàng ma trận được đổi sang float32 mỗi lần khi tính tích vô hướng (giới hạn bộ nhớ tạm)
+SEARCH_BLOCK_ROWS = 8192
+# Giữ bản float32 của ma trận trong RAM sau truy vấn đầu tiên: nhanh hơn nhiều khi truy vấn
+# (đổi float16 -> float32 tốn hơn cả phép nhân), đổi lại RSS tăng 4 byte x số chiều mỗi vector
+NUMPY_FLOAT32_CACHE = os.getenv("NUMPY_FLOAT32_CACHE", "1") == "1"
+
+
+def _normalize(vectors) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyVectorStore(BaseVectorStore):
+    """
+    Vectorstore trong process: embedding đã chuẩn hoá lưu thành ma trận float16 (file .npy đọc bằng memmap),
+    id/văn bản/metadata lưu theo cột trong file JSON đi kèm.
+
+    Cùng giao diện với Chroma ở những chỗ RetrievalChain và VectorStore dùng: `embeddings`,
+    `_collection.query/upsert/delete`, `get`, `add_documents`, `delete`, `as_retriever`.
+    Mỗi lần ghi tạo file ma trận mới rồi mới thay file JSON (điểm commit), nên process đọc
+    không bao giờ thấy trạng thái dở dang và tự đọc lại khi file JSON đổi.
+    """
+
+    def __init__(self, collection_name: str, embedding_function: Embeddings, persist_directory: str,
+                 float32_cache: bool = NUMPY_FLOAT32_CACHE):
+        """
+        Args:
+            collection_name: tên collection (tiền tố các file trong persist_directory)
+            embedding_function: model embedding cho add_texts/similarity_search
+            float32_cache: giữ bản float32 trong RAM (False = đổi từng khối mỗi lần truy vấn, RSS thấp nhất)
+        """
+        self.collection_name = collection_name
+        self._embedding = embedding_function
+        self.persist_directory = persist_directory
+        self.meta_path = os.path.join(persist_directory, f"{collection_name}.meta.json")
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, 0), dtype=np.float16)
+        self.float32_cache = float32_cache
+        self._matrix32: np.ndarray | None = None
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._columns: Dict[str, List[Any]] = {}
+        self._position: Dict[str, int] = {}
+        self._matrix_file: str | None = None
+        self._mtime: tuple | None = None
+        self.refresh()
+
+    # ----------------------------- Đọc ----------------------------- #
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def _collection(self) -> "NumpyVectorStore":
+        # Code viết cho Chroma gọi vectorstore._collection.query/upsert/delete
+        return self
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def count(self) -> int:
+        self.refresh()
+        return len(self._ids)
+
+    def refresh(self) -> bool:
+        """Đọc lại index nếu file JSON đã bị process khác ghi lại (một lần stat)."""
+        try:
+            stat = os.stat(self.meta_path)
+            mtime = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        with open(self.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix_path = os.path.join(self.persist_directory, meta["matrix"])
+        if meta["ids"]:
+            matrix = np.load(matrix_path, mmap_mode="r")
+        else:
+            matrix = np.zeros((0, meta["dim"]), dtype=np.float16)
+        with self._lock:
+            self._matrix = matrix
+            self._matrix32 = None
+            self._ids = meta["ids"]
+            self._documents = meta["documents"]
+            self._columns = meta["metadata"]
+            self._position = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            self._matrix_file = meta["matrix"]
+            self._mtime = mtime
+        return True
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        return {key: column[row] for key, column in self._columns.items() if column[row] is not None}
+
+    def _rows_where(self, where: Dict[str, Any] | None) -> np.ndarray:
+        """Các hàng thoả bộ lọc kiểu Chroma: {"k": v}, {"k": {"$eq"|"$ne"|"$in"|"$nin": ...}}, {"$and"|"$or": [...]}."""
+        n = len(self._ids)
+        if not where:
+            return np.arange(n)
+        mask = np.ones(n, dtype=bool)
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                parts = [np.isin(np.arange(n), self._rows_where(part)) for part in condition]
+                mask &= np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts)
+                continue
+            column = self._columns.get(key, [None] * n)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                if op == "$eq":
+                    mask &= np.fromiter((v == value for v in column), dtype=bool, count=n)
+                elif op == "$ne":
+                    mask &= np.fromiter((v != value for v in column), dtype=bool, count=n)
+                elif op in ("$in", "$nin"):
+                    values = set(value)
+                    hits = np.fromiter((v in values for v in column), dtype=bool, count=n)
+                    mask &= hits if op == "$in" else ~hits
+                else:
+                    raise ValueError(f"Toán tử where không hỗ trợ: {op}")
+        return np.flatnonzero(mask)
+
+    def _scores(self, queries: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Cosine giữa các query (đã chuẩn hoá) và các hàng, đổi ma trận sang float32 theo từng khối."""
+        if self.float32_cache:
+            if self._matrix32 is None:
+                self._matrix32 = np.asarray(self._matrix, dtype=np.float32)
+            matrix = self._matrix32 if rows is None else self._matrix32[rows]
+            return (matrix @ queries.T).T
+        matrix = self._matrix if rows is None else self._matrix[rows]
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = (block @ queries.T).T
+        return scores
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 4,
+              where: Dict[str, Any] | None = None,
+              include: Sequence[str] = ("metadatas", "documents", "distances"), **kwargs) -> Dict[str, Any]:
+        """
+        Tìm kiếm nhiều query một lần: một phép nhân ma trận và argpartition theo từng hàng.
+        Trả về dict cùng dạng Chroma Collection.query (distances = 1 - cosine).
+        """
+        self.refresh()
+        queries = _normalize(query_embeddings)
+        with self._lock:
+            rows = self._rows_where(where) if where else None
+            candidates = len(self._ids) if rows is None else len(rows)
+            k = min(n_results, candidates)
+            result: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            if k == 0:
+                for key in result:
+                    result[key] = [[] for _ in queries]
+                return result
+            scores = self._scores(queries, rows)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < candidates else \
+                np.tile(np.arange(candidates), (len(queries), 1))
+            for q, positions in enumerate(top):
+                positions = positions[np.argsort(-scores[q, positions], kind="stable")]
+                found = positions if rows is None else rows[positions]
+                result["ids"].append([self._ids[i] for i in found])
+                result["documents"].append([self._documents[i] for i in found])
+                result["metadatas"].append([self._metadata(i) for i in found])
+                result["distances"].append([float(1.0 - s) for s in scores[q, positions]])
+        return {key: value for key, value in result.items() if key == "ids" or key in include}
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Dict[str, Any] | None = None,
+            include: Sequence[str] = ("metadatas", "documents"), **kwargs) -> Dict[str, Any]:
+        self.refresh()
+        with self._lock:
+            if ids is not None:
+                rows = [self._position[i] for i in ids if i in self._position]
+                if where:
+                    allowed = set(self._rows_where(where).tolist())
+                    rows = [row for row in rows if row in allowed]
+            else:
+                rows = self._rows_where(where).tolist()
+            result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self._documents[row] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadata(row) for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.asarray(self._matrix[rows], dtype=np.float32)
+        return result
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Dict[str, Any] | None = None,
+                                     **kwargs) -> List[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Dict[str, Any] | None = None) -> List[tuple[Document, float]]:
+        result = self.query([embedding], n_results=k, where=filter)
+        return [
+            (Document(page_content=text, metadata=metadata, id=doc_id), 1.0 - distance)
+            for doc_id, text, metadata, distance in zip(result["ids"][0], result["documents"][0],
+                                                        result["metadatas"][0], result["distances"][0])
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Dict[str, Any] | None = None,
+                          **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Dict[str, Any] | None = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        result = self.get(ids=ids)
+        return [Document(page_content=text, metadata=metadata, id=doc_id)
+                for doc_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])]
+
+    # ----------------------------- Ghi ----------------------------- #
+    def _commit(self, matrix: np.ndarray, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        matrix_file = f"{self.collection_name}.{uuid.uuid4().hex[:12]}.f16.npy"
+        np.save(os.path.join(self.persist_directory, matrix_file), matrix.astype(np.float16))
+        keys = sorted({key for metadata in metadatas for key in metadata})
+        meta = {
+            "dim": int(matrix.shape[1]),
+            "matrix": matrix_file,
+            "ids": ids,
+            "documents": documents,
+            "metadata": {key: [metadata.get(key) for metadata in metadatas] for key in keys},
+        }
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+        self._mtime = None
+        self.refresh()
+        prefix = f"{self.collection_name}."
+        for name in os.listdir(self.persist_directory):
+            if name.startswith(prefix) and name.endswith(".f16.npy") and name != matrix_file:
+                try:
+                    os.remove(os.path.join(self.persist_directory, name))
+                except OSError:
+                    # Windows: file còn đang được memmap bởi process khác, xoá ở lần ghi sau
+                    pass
+
+    def upsert(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+               documents: Sequence[str] | None = None, metadatas: Sequence[Dict[str, Any]] | None = None, **kwargs):
+        """Thêm hoặc thay thế theo id (cùng chữ ký với Chroma Collection.upsert)."""
+        if not ids:
+            return
+        vectors = _normalize(embeddings)
+        documents = list(documents) if documents is not None else [""] * len(ids)
+        metadatas = [dict(m or {}) for m in metadatas] if metadatas is not None else [{} for _ in ids]
+        with self._lock:
+            self.refresh()
+            matrix = np.asarray(self._matrix, dtype=np.float16)
+            if not len(self._ids):
+                matrix = np.zeros((0, vectors.shape[1]), dtype=np.float16)
+            elif matrix.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Số chiều embedding {vectors.shape[1]} khác index ({matrix.shape[1]})")
+            all_ids = list(self._ids)
+            all_documents = list(self._documents)
+            all_metadatas = [self._metadata(row) for row in range(len(all_ids))]
+            position = dict(self._position)
+            new_rows = []
+            for i, doc_id in enumerate(ids):
+                if doc_id in position:
+                    row = position[doc_id]
+                    if not matrix.flags.writeable:
+                        matrix = matrix.copy()
+                    matrix[row] = vectors[i]
+                    all_documents[row] = documents[i]
+                    all_metadatas[row] = metadatas[i]
+                else:
+                    position[doc_id] = len(all_ids)
+                    all_ids.append(doc_id)
+                    all_documents.append(documents[i])
+                    all_metadatas.append(metadatas[i])
+                    new_rows.append(vectors[i])
+            if new_rows:
+                matrix = np.vstack([matrix, np.asarray(new_rows, dtype=np.float16)])
+            self._commit(matrix, all_ids, all_documents, all_metadatas)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self.upsert(ids, self._embedding.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Dict[str, Any] | None = None, **kwargs):
+        """Xoá theo id và/hoặc bộ lọc metadata (Chroma Collection.delete(where=...))."""
+        with self._lock:
+            self.refresh()
+            remove = set()
+            if ids:
+                remove |= {self._position[i] for i in ids if i in self._position}
+            if where:
+                remove |= set(self._rows_where(where).tolist())
+            if not remove:
+                return
+            keep = [row for row in range(len(self._ids)) if row not in remove]
+            self._commit(np.asarray(self._matrix[keep], dtype=np.float16),
+                         [self._ids[row] for row in keep], [self._documents[row] for row in keep],
+                         [self._metadata(row) for row in keep])
+
+    def copy_from(self, source, batch_size: int = 1024) -> int:
+        """Chép toàn bộ vector/văn bản/metadata từ collection khác (ví dụ Chroma) mà không embed lại."""
+        data = source.get(include=["embeddings", "documents", "metadatas"])
+        for start in range(0, len(data["ids"]), batch_size):
+            end = start + batch_size
+            self.upsert(data["ids"][start:end], data["embeddings"][start:end],
+                        data["documents"][start:end], data["metadatas"][start:end])
+        return len(data["ids"])
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, collection_name: str = "langchain",
+                   persist_directory: str = "data/processed/chroma_db/", **kwargs) -> "NumpyVectorStore":
+        store = cls(collection_name, embedding, persist_directory)
+        store.add_texts(texts, metadatas, ids)
+        return store
@@ -0,0 +1,317 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Iterable, List
+
+from src.semantic_cache import bump_index_version
+from src.utils.executor import run_blocking
+from src.utils.rate_limit import BatchRunner
+from src.vectorstore import VectorStore, content_hash, doc_id_for, summary_cost
+
+# Số tài liệu mỗi lần embed + upsert; crash chỉ mất tối đa một batch
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "16"))
+# Sức chứa hàng đợi giữa hai stage (giới hạn bộ nhớ và tạo backpressure)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+# Thời gian chờ thêm tài liệu cho đủ batch trước khi embed (giây)
+PIPELINE_LINGER = float(os.getenv("PIPELINE_LINGER", "0.5"))
+# Ghi index BM25 và bump phiên bản index sau mỗi bấy nhiêu batch (0: chỉ khi kết thúc); manifest ghi mỗi batch
+PIPELINE_CHECKPOINT_BATCHES = int(os.getenv("PIPELINE_CHECKPOINT_BATCHES", "8"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "4"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+# Đánh dấu stage trước đã hết dữ liệu
+_DONE = object()
+
+
+class IngestPipeline:
+    """
+    Pipeline index dạng stream: crawl → clean → summarise → embed → upsert.
+
+    Các stage nối với nhau bằng asyncio.Queue có giới hạn nên chạy chồng lên nhau;
+    thời gian tổng xấp xỉ thời gian của stage chậm nhất thay vì tổng các stage.
+    Manifest (file JSON nhỏ) được ghi sau mỗi batch upsert, nên chạy lại sau khi crash chỉ làm lại batch
+    dở dang (các tài liệu đã index có hash trùng manifest sẽ bị bỏ qua ở stage clean). Index BM25 (ghi tốn
+    hơn) và phiên bản index cho semantic cache chỉ được ghi mỗi `checkpoint_every` batch và khi kết thúc;
+    tài liệu có trong manifest nhưng thiếu trong BM25 (crash trước checkpoint) được bổ sung ở lần chạy sau.
+    """
+
+    def __init__(self, vectorstore: VectorStore, crawler=None, crawl_workers: int = CRAWL_WORKERS,
+                 summary_concurrency: int | None = None, embed_workers: int = EMBED_WORKERS,
+                 batch_size: int = PIPELINE_BATCH_SIZE, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 linger: float = PIPELINE_LINGER, checkpoint_every: int = PIPELINE_CHECKPOINT_BATCHES,
+                 state=None, max_age: float | None = None, resume: bool = True):
+        """
+        Args:
+            vectorstore: VectorStore đích (LLM tóm tắt, embedding, Chroma, docstore, manifest)
+            crawler: WebCrawler, cần khi chạy từ danh sách URL
+            crawl_workers, summary_concurrency, embed_workers: độ song song của từng stage
+                (summary_concurrency mặc định theo vectorstore.concurrency)
+            batch_size: số tài liệu mỗi lần embed + upsert
+            queue_size: sức chứa hàng đợi giữa các stage
+            linger: thời gian tối đa chờ thêm tài liệu cho đủ batch_size (giây)
+            checkpoint_every: ghi BM25 + bump phiên bản index sau mỗi bấy nhiêu batch (0: chỉ khi kết thúc)
+            state, max_age, resume: trạng thái crawl (CrawlState) truyền cho crawler
+        """
+        self.vectorstore = vectorstore
+        self.crawler = crawler
+        self.crawl_workers = crawl_workers
+        self.summary_concurrency = summary_concurrency or vectorstore.concurrency
+        self.embed_workers = embed_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.linger = linger
+        self.checkpoint_every = checkpoint_every
+        self.state = state
+        self.max_age = max_age
+        self.resume = resume
+        self.counts: Counter = Counter()
+        self.busy: Counter = Counter()
+
+    # ----------------------------- Helpers ----------------------------- #
+    async def _stage(self, name: str, func, inbox: asyncio.Queue, outbox: asyncio.Queue | None, workers: int):
+        """Chạy `workers` worker lấy từ inbox, xử lý bằng func, đẩy kết quả khác None sang outbox."""
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    # Trả lại để các worker khác cùng stage cũng dừng
+                    inbox.put_nowait(item)
+                    return
+                start = time.perf_counter()
+                result = await func(item)
+                self.busy[name] += time.perf_counter() - start
+                if result is not None and outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+        if outbox is not None:
+            await outbox.put(_DONE)
+
+    async def _batches(self, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        """Gom inbox thành batch tối đa `batch_size`, chờ thêm tối đa `linger` giây kể từ phần tử đầu."""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await outbox.put(_DONE)
+                return
+            batch = [item]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(inbox.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if item is _DONE:
+                    inbox.put_nowait(item)
+                    break
+                batch.append(item)
+            await outbox.put(batch)
+
+    def _produce(self, loop, outbox: asyncio.Queue, urls, docs, stop: threading.Event):
+        """Chạy trong thread riêng: crawl (hoặc đọc docs) và đẩy từng tài liệu vào pipeline."""
+        if urls is not None:
+            run_id = self.state.begin_run(self.resume) if self.state is not None else None
+            source = (doc for _, doc in self.crawler.iter_crawl(urls, self.crawl_workers, self.state,
+                                                                 self.max_age, run_id))
+        else:
+            run_id, source = None, iter(docs)
+
+        start = time.perf_counter()
+        for doc in source:
+            self.busy["crawl"] += time.perf_counter() - start
+            future = asyncio.run_coroutine_threadsafe(outbox.put(doc), loop)
+            # Chờ có chỗ trong hàng đợi (backpressure), nhưng dừng nếu pipeline đã lỗi
+            while True:
+                try:
+                    future.result(timeout=0.1)
+                    break
+                except concurrent.futures.TimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        return
+            self.counts["received"] += 1
+            start = time.perf_counter()
+        if self.state is not None and run_id is not None:
+            self.state.finish_run(run_id)
+
+    # ----------------------------- Stages ----------------------------- #
+    def _make_clean(self, manifest: dict, seen: set, lexical, lexical_missing: list):
+        async def clean(doc):
+            doc_id = doc_id_for(doc)
+            if doc_id in seen:
+                self.counts["duplicate"] += 1
+                return None
+            seen.add(doc_id)
+            if doc.metadata.get("crawl_error") or not doc.page_content.strip():
+                # Không index trang lỗi; doc_id vẫn được coi là còn để không bị xoá
+                self.counts["failed"] += 1
+                return None
+            digest = content_hash(doc)
+            if manifest.get(doc_id, {}).get("hash") == digest:
+                self.counts["unchanged"] += 1
+                if lexical is not None and doc_id not in lexical:
+                    # Đã upsert và ghi manifest nhưng crash trước khi BM25 được ghi
+                    lexical_missing.append(doc)
+                return None
+            return doc_id, doc, digest
+        return clean
+
+    def _make_summarise(self):
+        chain = self.vectorstore._summary_chain()
+        runner = BatchRunner(concurrency=self.summary_concurrency, rpm=self.vectorstore.rpm,
+                             tpm=self.vectorstore.tpm)
+
+        async def summarise(item):
+            doc_id, doc, digest = item
+            if not self.vectorstore.summarize:
+                # index_mode="chunk": không cần tóm tắt bằng LLM
+                return doc_id, doc, digest, None
+            try:
+                summary = await runner.acall(chain.ainvoke, doc, cost=summary_cost)
+            except Exception as e:
+                # Chưa ghi vào manifest nên lần chạy sau sẽ thử lại
+                print(f"Lỗi khi tóm tắt {doc.metadata.get('source', doc_id)}: {e}")
+                self.counts["failed"] += 1
+                return None
+            self.counts["summarised"] += 1
+            return doc_id, doc, digest, summary
+        return summarise
+
+    async def _embed(self, batch):
+        if not self.vectorstore.summarize:
+            # Chunk được embed khi upsert (số chunk chỉ biết sau khi chia)
+            return batch, None
+        summaries = [summary for _, _, _, summary in batch]
+        vectors = await run_blocking(self.vectorstore.embedding.embed_documents, summaries)
+        return batch, vectors
+
+    def _checkpoint(self, manifest: dict):
+        """Ghi manifest và index BM25 của các batch đã upsert, rồi vô hiệu hoá semantic cache."""
+        self.vectorstore.save_manifest(manifest)
+        self.vectorstore.save_lexical()
+        bump_index_version(self.vectorstore.version_file)
+        self._dirty = False
+
+    def _make_upsert(self, manifest: dict):
+        def commit(batch, vectors):
+            self.vectorstore.create_vectorstore(
+                [doc for _, doc, _, _ in batch],
+                [summary for _, _, _, summary in batch] if vectors is not None else None,
+                [doc_id for doc_id, _, _, _ in batch],
+                embeddings=vectors,
+                persist_lexical=False,
+            )
+            for doc_id, doc, digest, _ in batch:
+                manifest[doc_id] = {"source": doc.metadata.get("source", "unknown"), "hash": digest}
+            # Manifest nhỏ nên ghi ngay: crash (kể cả SIGKILL) chỉ mất batch đang upsert
+            self.vectorstore.save_manifest(manifest)
+            self._dirty = True
+
+        async def upsert(item):
+            batch, vectors = item
+            await run_blocking(commit, batch, vectors)
+            self.counts["indexed"] += len(batch)
+            self.counts["batches"] += 1
+            print(f"Đã index {self.counts['indexed']} tài liệu ({self.counts['batches']} batch)")
+            if self.checkpoint_every and self.counts["batches"] % self.checkpoint_every == 0:
+                await run_blocking(self._checkpoint, manifest)
+        return upsert
+
+    def _delete_stale(self, manifest: dict, seen: set, legacy: bool) -> int:
+        known = set(manifest)
+        if legacy:
+            # Index cũ (trước khi có manifest): mọi id trong collection đều là đã biết
+            known |= set(self.vectorstore._open().vectorstore.get(include=[])["ids"])
+        stale = sorted(known - seen)
+        if stale:
+            self.vectorstore.delete(stale)
+            for doc_id in stale:
+                manifest.pop(doc_id, None)
+            self._dirty = True
+        return len(stale)
+
+    # ----------------------------- Public API ----------------------------- #
+    async def arun(self, urls: List[str] | None = None, docs: Iterable[Any] | None = None,
+                   delete_stale: bool = True) -> dict:
+        """
+        Index từ danh sách URL (crawl bằng self.crawler) hoặc từ iterable tài liệu có sẵn.
+
+        Args:
+            delete_stale: xoá tài liệu đã index nhưng không còn trong nguồn (chỉ khi nguồn chạy hết)
+
+        Returns:
+            dict số lượng theo từng loại, thời gian bận của từng stage và tổng thời gian
+        """
+        if (urls is None) == (docs is None):
+            raise ValueError("Cần truyền đúng một trong urls hoặc docs")
+        if urls is not None and self.crawler is None:
+            raise ValueError("Cần crawler để chạy từ danh sách URL")
+
+        self.counts.clear()
+        self.busy.clear()
+        self._dirty = False
+        manifest = self.vectorstore.load_manifest()
+        legacy = not manifest
+        if manifest:
+            await run_blocking(self.vectorstore.migrate_vectors)
+        lexical = None
+        if self.vectorstore.bm25_dir is not None:
+            lexical = await run_blocking(self.vectorstore.lexical_index, "documents")
+        seen: set = set()
+        lexical_missing: list = []
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        crawled, cleaned, summarised, embedded = (asyncio.Queue(self.queue_size) for _ in range(4))
+        # Hàng đợi batch chỉ chứa 1: khi stage embed đang bận, các summary mới dồn lại thành batch lớn hơn
+        batched = asyncio.Queue(1)
+
+        source_error: list = []
+
+        async def produce():
+            try:
+                await asyncio.to_thread(self._produce, loop, crawled, urls, docs, stop)
+            except Exception as e:
+                # Nguồn lỗi giữa chừng: vẫn cho các stage sau xử lý và commit phần đã nhận
+                source_error.append(e)
+            finally:
+                await crawled.put(_DONE)
+
+        start = time.perf_counter()
+        deleted = 0
+        try:
+            await asyncio.gather(
+                produce(),
+                self._stage("clean", self._make_clean(manifest, seen, lexical, lexical_missing), crawled, cleaned, 1),
+                self._stage("summarise", self._make_summarise(), cleaned, summarised, self.summary_concurrency),
+                self._batches(summarised, batched),
+                self._stage("embed", self._embed, batched, embedded, self.embed_workers),
+                self._stage("upsert", self._make_upsert(manifest), embedded, None, 1),
+            )
+            if lexical_missing:
+                await run_blocking(self.vectorstore._backfill_lexical, lexical_missing, False)
+                self.counts["lexical_backfilled"] += len(lexical_missing)
+                self._dirty = True
+            if delete_stale and not source_error:
+                deleted = await run_blocking(self._delete_stale, manifest, seen, legacy)
+        finally:
+            stop.set()
+            # Checkpoint cuối (một lần cho phần còn lại), kể cả khi pipeline lỗi giữa chừng
+            if self._dirty:
+                await run_blocking(self._checkpoint, manifest)
+        if source_error:
+            raise source_error[0]
+
+        return {
+            **self.counts,
+            "deleted": deleted,
+            "stage_seconds": {name: round(seconds, 2) for name, seconds in self.busy.items()},
+            "elapsed": round(time.perf_counter() - start, 2),
+        }
+
+    def run(self, urls: List[str] | None = None, docs: Iterable[Any] | None = None,
+            delete_stale: bool = True) -> dict:
+        return asyncio.run(self.arun(urls, docs, delete_stale))
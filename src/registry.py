@@ -0,0 +1,103 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class Registry:
+    """
+    Các tài nguyên dùng chung của process (LLM client, LLM gateway, embedding, vectorstore, docstore, ...),
+    mỗi tên một instance, chỉ được tạo ở lần `get` đầu tiên.
+
+    Factory import module nặng bên trong hàm nên import module này (và các module dùng nó) rất rẻ.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # tên -> số giây tạo instance (xem /ready)
+        self.timings: Dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def set(self, name: str, instance: Any):
+        """Dùng instance có sẵn (ví dụ model giả lập trong benchmark) thay cho factory."""
+        with self._lock:
+            self._instances[name] = instance
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        if name in self._instances:
+            return self._instances[name]
+        if name not in self._factories:
+            raise KeyError(f"Chưa đăng ký tài nguyên: {name}")
+        # Khoá riêng từng tên: tạo embedding không chặn luồng đang lấy LLM
+        with self._locks[name]:
+            if name not in self._instances:
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.timings[name] = time.perf_counter() - start
+        return self._instances[name]
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def reset(self, name: str | None = None):
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+                self.timings.clear()
+            else:
+                self._instances.pop(name, None)
+                self.timings.pop(name, None)
+
+
+registry = Registry()
+
+
+def _llm():
+    from src.utils.llm_model import get_llm
+    return get_llm()
+
+
+def _llm_answer():
+    from src.utils.llm_model import get_llm_answer
+    return get_llm_answer()
+
+
+def _llm_gateway():
+    from src.utils.llm_gateway import LLMGateway
+    return LLMGateway()
+
+
+def _embedding():
+    from src.utils.embedding_model import get_embedding
+    return get_embedding()
+
+
+def _vectorstore():
+    from src.vectorstore import open_collection
+    return open_collection("summaries", registry.get("embedding"))
+
+
+def _chunk_store():
+    from src.vectorstore import CHUNK_COLLECTION, open_collection
+    return open_collection(CHUNK_COLLECTION, registry.get("embedding"))
+
+
+def _docstore():
+    from src.docstore import open_docstore
+    return open_docstore()
+
+
+registry.register("llm", _llm)
+registry.register("llm_answer", _llm_answer)
+registry.register("llm_gateway", _llm_gateway)
+registry.register("embedding", _embedding)
+registry.register("vectorstore", _vectorstore)
+registry.register("chunk_store", _chunk_store)
+registry.register("docstore", _docstore)
@@ -0,0 +1,118 @@
+import os
+import threading
+from typing import Any, List, Tuple
+
+from src.utils.executor import run_blocking
+
+# "llm": để LLM chọn doc_id (mặc định); "cross-encoder": chấm điểm (câu hỏi, tóm tắt) bằng cross-encoder chạy CPU.
+# Cross-encoder là tuỳ chọn (opt-in) cho tới khi được so sánh với LLM trên câu hỏi thật:
+#   python -m benchmarks.bench_rerank --golden <file JSONL> --llm
+RERANKER = os.getenv("RERANKER", "llm")
+# Cross-encoder đa ngôn ngữ (có tiếng Việt), ~118M tham số, chạy được trên CPU
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+# Số tài liệu giữ lại sau bước chọn (cross-encoder hoặc LLM) và ngưỡng điểm tối thiểu của cross-encoder (-inf = không lọc)
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "1"))
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "-inf"))
+# Số ứng viên (theo thứ hạng RRF) đưa vào bước chọn
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "7"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+
+Ranked = List[Tuple[Any, float]]
+
+
+class CrossEncoderReranker:
+    """
+    Chấm điểm các cặp (câu hỏi, nội dung ứng viên) bằng cross-encoder trong một lần suy luận theo batch,
+    giữ tối đa `top_k` ứng viên có điểm >= `min_score`. Model chỉ được tải ở lần gọi đầu tiên.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, top_k: int = RERANK_TOP_K,
+                 min_score: float = RERANK_MIN_SCORE, batch_size: int = RERANK_BATCH_SIZE, model=None):
+        """
+        Args:
+            model_name: tên model trên HuggingFace (sentence_transformers.CrossEncoder)
+            top_k, min_score: số ứng viên tối đa được chọn và ngưỡng điểm
+            batch_size: số cặp mỗi batch suy luận
+            model: model có sẵn với `predict(pairs, batch_size=..., show_progress_bar=...)` (bỏ qua model_name)
+        """
+        self.model_name = model_name
+        self.top_k = top_k
+        self.min_score = min_score
+        self.batch_size = batch_size
+        self._model = model
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def score(self, question: str, texts: List[str]) -> List[float]:
+        if not texts:
+            return []
+        scores = self.model.predict([(question, text) for text in texts], batch_size=self.batch_size,
+                                    show_progress_bar=False)
+        return [float(score) for score in scores]
+
+    def rerank(self, question: str, candidates: Ranked) -> Ranked:
+        """
+        Args:
+            candidates: list (Document, điểm RRF) theo thứ hạng truy hồi
+
+        Returns:
+            list (Document, điểm cross-encoder) đã lọc và sắp xếp giảm dần
+        """
+        scores = self.score(question, [doc.page_content for doc, _ in candidates])
+        ranked = sorted(zip((doc for doc, _ in candidates), scores), key=lambda item: item[1], reverse=True)
+        return [(doc, score) for doc, score in ranked if score >= self.min_score][:self.top_k]
+
+    async def arerank(self, question: str, candidates: Ranked) -> Ranked:
+        return await run_blocking(self.rerank, question, candidates)
+
+
+class LLMSelector:
+    """
+    Cách chọn cũ: gửi danh sách ứng viên cho LLM và nhận lại một doc_id.
+    Kết quả không khớp ứng viên nào thì lấy ứng viên đầu tiên theo RRF.
+    Với top_k > 1, các ứng viên còn lại được thêm vào sau tài liệu LLM chọn theo thứ hạng RRF.
+    """
+
+    def __init__(self, chain, top_k: int = RERANK_TOP_K):
+        """
+        Args:
+            chain: chain nhận {"context", "question"} và trả về chuỗi chứa doc_id (select_docid_chain)
+            top_k: số tài liệu trả về
+        """
+        self.chain = chain
+        self.top_k = top_k
+
+    @staticmethod
+    def _match(output: str, candidates: Ranked) -> Ranked:
+        output = (output or "").strip()
+        for doc, score in candidates:
+            if doc.metadata.get("doc_id") == output:
+                return [(doc, score)]
+        for doc, score in candidates:
+            if doc.metadata.get("doc_id") and doc.metadata["doc_id"] in output:
+                return [(doc, score)]
+        return candidates[:1]
+
+    def _select(self, output: str, candidates: Ranked) -> Ranked:
+        selected = self._match(output, candidates)
+        if self.top_k > 1:
+            chosen = selected[0][0]
+            selected += [(doc, score) for doc, score in candidates if doc is not chosen][:self.top_k - 1]
+        return selected
+
+    def rerank(self, question: str, candidates: Ranked) -> Ranked:
+        if not candidates:
+            return []
+        return self._select(self.chain.invoke({"context": candidates, "question": question}), candidates)
+
+    async def arerank(self, question: str, candidates: Ranked) -> Ranked:
+        if not candidates:
+            return []
+        return self._select(await self.chain.ainvoke({"context": candidates, "question": question}), candidates)
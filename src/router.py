@@ -0,0 +1,133 @@
+import json
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Sequence
+
+import numpy as np
+
+# Dấu hiệu câu trả lời không tìm được thông tin trong dữ liệu nội bộ
+NO_INFO_MARKERS = ("không có thông tin", "không tìm thấy thông tin", "chưa có thông tin", "không đủ thông tin")
+# Cụm từ chỉ tới lượt trước ("... thì sao", "như vậy", "ở trên", ...); không gồm các từ rất phổ biến
+# ("đó", "này", "thế", "trên", "còn") vì chúng xuất hiện cả trong câu hỏi mới
+FOLLOW_UP_CUES = ("nó", "vậy", "kia", "thì sao", "như vậy", "ở trên")
+
+
+def parse_yes_no(text: str) -> str:
+    """Chuẩn hoá câu trả lời yes/no của LLM ("**Yes**", "yes.", "Có", ...) về "yes" hoặc "no"."""
+    cleaned = re.sub(r"[^\w\s]", " ", (text or "").lower()).strip()
+    first = cleaned.split()[0] if cleaned else ""
+    return "yes" if first in ("yes", "có", "co") else "no"
+
+
+def _normalize(text: str) -> str:
+    """Chữ thường, chuẩn Unicode NFC (giữ dấu)."""
+    return unicodedata.normalize("NFC", (text or "").lower())
+
+
+class FollowUpClassifier:
+    """
+    Logistic regression nhỏ chạy trên CPU, dự đoán câu hỏi có phải tiếp nối hội thoại trước không.
+    Đặc trưng: cosine(embedding câu hỏi, embedding tóm tắt), có từ nối/đại từ, câu hỏi ngắn.
+    Không có trọng số mặc định dùng được: chưa huấn luyện thì luôn trả về 0.5 (LocalRouter hỏi LLM).
+    Huấn luyện bằng `fit` trên các lượt hội thoại gán nhãn (X từ `features`), lưu bằng `save`
+    và bật trong graph qua LOCAL_ROUTER_MODEL=<đường dẫn file JSON>.
+    """
+
+    def __init__(self, weights: Sequence[float] = (0.0, 0.0, 0.0), bias: float = 0.0):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+
+    @staticmethod
+    def features(question: str, question_vec, summary_vec) -> np.ndarray:
+        q = np.asarray(question_vec, dtype=np.float32)
+        s = np.asarray(summary_vec, dtype=np.float32)
+        denom = float(np.linalg.norm(q) * np.linalg.norm(s)) or 1.0
+        cosine = float(q @ s) / denom
+        words = re.findall(r"\w+", _normalize(question))
+        text = f" {' '.join(words)} "
+        has_cue = float(any(f" {cue} " in text for cue in FOLLOW_UP_CUES))
+        short = float(len(words) <= 5)
+        return np.array([cosine, has_cue, short], dtype=np.float32)
+
+    def predict_proba(self, features: np.ndarray) -> float:
+        z = float(features @ self.weights) + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def fit(self, X: np.ndarray, y: np.ndarray, epochs: int = 500, lr: float = 0.5):
+        """Huấn luyện bằng gradient descent (dữ liệu nhỏ, vài trăm mẫu)."""
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float32)
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(X @ self.weights + self.bias)))
+            grad = p - y
+            self.weights -= lr * (X.T @ grad) / len(y)
+            self.bias -= lr * float(grad.mean())
+        return self
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"weights": self.weights.tolist(), "bias": self.bias}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "FollowUpClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["weights"], data["bias"])
+
+
+class LocalRouter:
+    """
+    Định tuyến cục bộ trước khi hỏi LLM. Mỗi hàm trả về "yes"/"no" nếu chắc chắn,
+    hoặc None để người gọi dùng LLM. Số lần đi qua từng nhánh được đếm trong `stats`.
+    Không có `classifier` (mặc định) thì câu hỏi có tóm tắt hội thoại luôn được chuyển cho LLM.
+    """
+
+    def __init__(self, embedding, classifier: FollowUpClassifier | None = None, confidence: float = 0.85):
+        self.embedding = embedding
+        self.classifier = classifier
+        self.confidence = confidence
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, path: str):
+        with self._lock:
+            self._counts[path] += 1
+
+    def route_question(self, question: str, summary: str) -> str | None:
+        """Câu hỏi có phải tiếp nối hội thoại trước không."""
+        if not (summary or "").strip():
+            # Lượt đầu tiên: chưa có gì để tiếp nối
+            self._count("question_rule")
+            return "no"
+        if self.classifier is None:
+            self._count("question_llm")
+            return None
+        question_vec, summary_vec = self.embedding.embed_documents([question, summary])
+        p = self.classifier.predict_proba(self.classifier.features(question, question_vec, summary_vec))
+        if p >= self.confidence:
+            self._count("question_classifier")
+            return "yes"
+        if p <= 1 - self.confidence:
+            self._count("question_classifier")
+            return "no"
+        self._count("question_llm")
+        return None
+
+    def route_answer(self, answer: str, sources: List[str] | None) -> str | None:
+        """Có cần tìm kiếm thêm (node_search) cho câu trả lời này không."""
+        text = _normalize(answer)
+        no_info = any(marker in text for marker in NO_INFO_MARKERS)
+        if sources and not no_info:
+            self._count("answer_rule")
+            return "no"
+        if not sources and (no_info or not text.strip()):
+            self._count("answer_rule")
+            return "yes"
+        self._count("answer_llm")
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
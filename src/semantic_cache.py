@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+
+def index_version_file(persist_directory: str) -> str:
+    """File đánh dấu phiên bản của index lưu trong `persist_directory` (mỗi index một file riêng)."""
+    return os.path.join(persist_directory, "index_version")
+
+
+# File phiên bản của index mặc định (CHROMA_DIR), được VectorStore.save và IngestPipeline ghi lại
+# mỗi khi collection summaries thay đổi
+INDEX_VERSION_FILE = index_version_file("data/processed/chroma_db/")
+
+
+def bump_index_version(path: str = INDEX_VERSION_FILE) -> str:
+    """Ghi phiên bản index mới; mọi SemanticCache đang đọc file này sẽ tự xoá dữ liệu cũ."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    version = uuid.uuid4().hex
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(version)
+    return version
+
+
+def read_index_version(path: str = INDEX_VERSION_FILE) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class SemanticCache:
+    """
+    Cache câu trả lời theo độ tương đồng cosine giữa embedding của các câu hỏi.
+
+    - Trả về câu trả lời đã lưu nếu có câu hỏi cũ với cosine >= `threshold`.
+    - Tối đa `max_entries` mục (bỏ mục ít dùng nhất), mỗi mục sống `ttl` giây.
+    - Tự xoá toàn bộ khi file phiên bản index (`version_file`) thay đổi.
+    """
+
+    def __init__(self, embedding, threshold: float = 0.95, max_entries: int = 512, ttl: float = 86400,
+                 version_file: str = INDEX_VERSION_FILE):
+        self.embedding = embedding
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_file = version_file
+        # key -> (vector, question, value, created_at)
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, Any, float]]" = OrderedDict()
+        self._next_key = 0
+        self._matrix: np.ndarray | None = None
+        self._matrix_keys: List[int] = []
+        self._lock = threading.Lock()
+        self._version = read_index_version(version_file)
+        self._version_mtime = self._mtime()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ----------------------------- Internals ----------------------------- #
+    def _mtime(self) -> float | None:
+        try:
+            return os.stat(self.version_file).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _check_version(self):
+        mtime = self._mtime()
+        if mtime == self._version_mtime:
+            return
+        self._version_mtime = mtime
+        version = read_index_version(self.version_file)
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+
+    def _evict(self, now: float):
+        evicted = 0
+        for key in [k for k, entry in self._entries.items() if now - entry[3] > self.ttl]:
+            del self._entries[key]
+            evicted += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            self._matrix = None
+
+    def _normalize(self, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # ----------------------------- Public API ----------------------------- #
+    def embed(self, question: str) -> np.ndarray:
+        return self._normalize(self.embedding.embed_query(question))
+
+    def lookup(self, question: str, vector: np.ndarray | None = None) -> Tuple[Any, np.ndarray]:
+        """
+        Returns:
+            (giá trị đã lưu hoặc None, embedding của câu hỏi) — embedding dùng lại được cho `store`.
+        """
+        if vector is None:
+            vector = self.embed(question)
+        with self._lock:
+            self._check_version()
+            self._evict(time.time())
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[k][0] for k in self._matrix_keys])
+                scores = self._matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = self._matrix_keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][2], vector
+            self.misses += 1
+            return None, vector
+
+    def store(self, question: str, value: Any, vector: np.ndarray | None = None):
+        if vector is None:
+            vector = self.embed(question)
+        with self._lock:
+            self._check_version()
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (vector, question, value, time.time())
+            self._matrix = None
+            self._evict(time.time())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
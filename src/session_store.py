@@ -0,0 +1,155 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable
+
+
+def new_state() -> Dict[str, Any]:
+    """State rỗng cho một cuộc hội thoại mới."""
+    return {
+        "question": "",
+        "answer": "",
+        "summary": "",
+        "source": None
+    }
+
+
+class SessionStore:
+    """
+    Lưu state của từng cuộc hội thoại theo conversation_id.
+
+    - Trong bộ nhớ: LRU giới hạn `max_sessions`, phiên không hoạt động quá `ttl` giây bị xoá.
+    - Mỗi phiên có một asyncio.Lock riêng để các request cùng phiên chạy tuần tự; lock chỉ tồn tại khi còn
+      request giữ hoặc đang chờ nó (đếm tham chiếu), không phụ thuộc vào việc phiên còn trong bộ nhớ.
+    - Nếu có `db_path`: ghi xuống SQLite để phiên còn sau khi khởi động lại server.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600, db_path: str | None = None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.db_path = db_path
+        self._sessions: "OrderedDict[str, tuple[Dict[str, Any], float]]" = OrderedDict()
+        # key -> [asyncio.Lock, số request đang giữ hoặc chờ lock]
+        self._locks: Dict[str, list] = {}
+        self._mutex = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)")
+            self._db.commit()
+
+    @staticmethod
+    def _key(session_id: Hashable) -> str:
+        return str(session_id)
+
+    def __len__(self) -> int:
+        with self._mutex:
+            return len(self._sessions)
+
+    # ----------------------------- Eviction ----------------------------- #
+    def _drop(self, key: str):
+        """Bỏ phiên khỏi bộ nhớ (không xoá trong SQLite). Lock của phiên tự được bỏ khi không còn ai dùng."""
+        self._sessions.pop(key, None)
+
+    def _evict(self, now: float):
+        # OrderedDict luôn theo thứ tự truy cập, phiên cũ nhất nằm đầu
+        while self._sessions:
+            key, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl:
+                break
+            self._drop(key)
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)))
+
+    # ----------------------------- SQLite ----------------------------- #
+    def _db_load(self, key: str, now: float) -> Dict[str, Any] | None:
+        row = self._db.execute("SELECT state, updated_at FROM sessions WHERE id = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (key,))
+            self._db.commit()
+            return None
+        return json.loads(row[0])
+
+    def _db_save(self, key: str, state: Dict[str, Any], now: float):
+        self._db.execute(
+            "INSERT INTO sessions (id, state, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (key, json.dumps(state, ensure_ascii=False), now),
+        )
+        self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+        self._db.commit()
+
+    # ----------------------------- Public API ----------------------------- #
+    def get(self, session_id: Hashable) -> Dict[str, Any]:
+        """Trả về bản sao state của phiên (state mới nếu chưa có hoặc đã hết hạn)."""
+        key = self._key(session_id)
+        now = time.time()
+        with self._mutex:
+            self._evict(now)
+            entry = self._sessions.get(key)
+            if entry is not None:
+                state = entry[0]
+                self._sessions[key] = (state, now)
+                self._sessions.move_to_end(key)
+                return dict(state)
+            state = self._db_load(key, now) if self._db is not None else None
+            if state is None:
+                return new_state()
+            self._sessions[key] = (state, now)
+            self._evict(now)
+            return dict(state)
+
+    def save(self, session_id: Hashable, state: Dict[str, Any]):
+        key = self._key(session_id)
+        now = time.time()
+        state = dict(state)
+        with self._mutex:
+            self._sessions[key] = (state, now)
+            self._sessions.move_to_end(key)
+            self._evict(now)
+            if self._db is not None:
+                self._db_save(key, state, now)
+
+    def delete(self, session_id: Hashable):
+        key = self._key(session_id)
+        with self._mutex:
+            self._drop(key)
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE id = ?", (key,))
+                self._db.commit()
+
+    @asynccontextmanager
+    async def lock(self, session_id: Hashable) -> AsyncIterator[None]:
+        """
+        Lock riêng của phiên; dùng `async with store.lock(id):` quanh get → xử lý → save.
+        Lock bị bỏ khỏi `_locks` khi request cuối cùng giữ/chờ nó thoát ra (kể cả khi lỗi), nên không có
+        hai lock cho cùng một phiên và không tích luỹ lock của các phiên đã xong.
+        """
+        key = self._key(session_id)
+        with self._mutex:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            with self._mutex:
+                entry[1] -= 1
+                if entry[1] == 0 and self._locks.get(key) is entry:
+                    del self._locks[key]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
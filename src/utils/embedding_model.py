@@ -1,7 +1,106 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List
 
-def get_embedding():
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-    )
+import numpy as np
+from langchain.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = "data/processed/embedding_cache/"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Bọc HuggingFaceEmbeddings với cache hai tầng theo (tên model, hash văn bản):
+    LRU trong bộ nhớ ở trước, LocalFileStore trên đĩa ở sau.
+    Model chỉ được tải khi thật sự có văn bản chưa có trong cache.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, cache_dir: str | None = EMBEDDING_CACHE_DIR,
+                 memory_size: int = 4096, model=None):
+        self.model_name = model_name
+        self.memory_size = memory_size
+        self.store = LocalFileStore(cache_dir) if cache_dir else None
+        self._model = model
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.forward_passes = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                # Kiểm tra lại trong lock để hai thread không cùng tải model
+                if self._model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._model
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        vectors: dict[str, List[float]] = {}
 
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+            self.memory_hits += sum(1 for key in keys if key in vectors)
+
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing and self.store is not None:
+            disk_hits = 0
+            for key, value in zip(missing, self.store.mget(missing)):
+                if value is not None:
+                    vectors[key] = np.frombuffer(value, dtype=np.float32).tolist()
+                    disk_hits += 1
+            missing = [key for key in missing if key not in vectors]
+            with self._lock:
+                self.disk_hits += disk_hits
+
+        if missing:
+            # Một lần forward pass cho tất cả văn bản chưa có trong cache
+            texts_by_key = dict(zip(keys, texts))
+            computed = self.model.embed_documents([texts_by_key[key] for key in missing])
+            with self._lock:
+                self.forward_passes += 1
+                self.misses += len(missing)
+            for key, vector in zip(missing, computed):
+                vectors[key] = np.asarray(vector, dtype=np.float32).tolist()
+            if self.store is not None:
+                self.store.mset([(key, np.asarray(vectors[key], dtype=np.float32).tobytes()) for key in missing])
+
+        with self._lock:
+            for key in keys:
+                self._remember(key, vectors[key])
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "forward_passes": self.forward_passes,
+            }
+
+
+def get_embedding():
+    return CachedEmbeddings(MODEL_NAME)
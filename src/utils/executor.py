@@ -0,0 +1,25 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Số luồng tối đa cho các tác vụ chặn (embedding local, Chroma, docstore)
+MAX_BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "4"))
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Executor dùng chung, giới hạn số luồng để mô hình embedding không chiếm hết CPU."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_BLOCKING_WORKERS, thread_name_prefix="blocking")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Chạy một hàm đồng bộ trong executor để không chặn event loop (giữ contextvars, ví dụ trace của request)."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
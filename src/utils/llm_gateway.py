@@ -0,0 +1,345 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from src import metrics
+from src.chunker import estimate_tokens
+from src.utils.rate_limit import is_rate_limit_error
+
+# Số lời gọi LLM đồng thời tối đa trong cả process (bảo vệ quota của API)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+# Hạn chót (giây) cho một lời gọi, tính cả các lần thử lại; với stream là thời gian tới đoạn đầu tiên
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+# Số lần thử lại khi gặp lỗi tạm thời (rate limit, timeout, 5xx, mất kết nối)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+# Các chuỗi thường gặp trong lỗi tạm thời của Gemini/HTTP (ngoài lỗi rate limit)
+TRANSIENT_MARKERS = ("500", "502", "503", "504", "unavailable", "deadline exceeded", "deadlineexceeded",
+                     "internal error", "connection reset", "connection aborted", "timed out")
+# Số độ trễ gần nhất giữ lại cho p50/p95 của mỗi call site
+_LATENCY_WINDOW = 1024
+
+
+def is_transient_error(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if is_rate_limit_error(error):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in TRANSIENT_MARKERS)
+
+
+def _prompt_text(value: Any) -> str:
+    if hasattr(value, "content"):  # message của chat model
+        return _prompt_text(value.content)
+    if hasattr(value, "to_string"):
+        return value.to_string()
+    return value if isinstance(value, str) else str(value)
+
+
+class _Slots:
+    """
+    Semaphore dùng chung cho cả lời gọi đồng bộ (luồng) và bất đồng bộ (nhiều event loop),
+    phục vụ theo thứ tự đến.
+    """
+
+    def __init__(self, size: int):
+        self.free = max(1, size)
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+
+    def acquire(self):
+        with self._lock:
+            if self.free and not self._waiters:
+                self.free -= 1
+                return
+            event = threading.Event()
+            self._waiters.append(event.set)
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.free and not self._waiters:
+                self.free -= 1
+                return
+            future = loop.create_future()
+
+            def grant():
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+            self._waiters.append(grant)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = grant not in self._waiters
+                if not granted:
+                    self._waiters.remove(grant)
+            if granted:
+                # Slot đã được trao nhưng người chờ bị huỷ: trả lại cho người kế tiếp
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                # Trao thẳng slot cho người chờ lâu nhất
+                grant = self._waiters.popleft()
+                try:
+                    grant()
+                    return
+                except RuntimeError:
+                    # Event loop của người chờ đã đóng (call_soon_threadsafe lỗi): bỏ qua, trao cho người kế tiếp
+                    continue
+            self.free += 1
+
+
+class _SiteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.wait_seconds = 0.0
+        self.latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+
+    def snapshot(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+        return {
+            "calls": self.calls, "errors": self.errors, "retries": self.retries, "timeouts": self.timeouts,
+            "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            "wait_ms": round(self.wait_seconds * 1000, 1),
+            "latency_ms_p50": percentile(0.5), "latency_ms_p95": percentile(0.95),
+        }
+
+
+class GatewayLLM(Runnable):
+    """
+    Một call site của LLMGateway, dùng như LLM trong chain: `prompt | gateway.site("router") | parser`.
+    Hỗ trợ invoke/ainvoke/stream/astream; mọi lời gọi đi qua semaphore, hạn chót, thử lại và thống kê
+    của gateway.
+    """
+
+    def __init__(self, gateway: "LLMGateway", name: str, provider=None, resource: str = "llm",
+                 timeout: float | None = None, max_retries: int | None = None):
+        self.gateway = gateway
+        self.name = name
+        self._provider = provider
+        self.resource = resource
+        self.timeout = timeout if timeout is not None else gateway.timeout
+        self.max_retries = max_retries if max_retries is not None else gateway.max_retries
+
+    @property
+    def provider(self):
+        """LLM thật; mặc định lấy client dùng chung `resource` từ src.registry ở lời gọi đầu tiên."""
+        if self._provider is None:
+            from src.registry import registry
+            self._provider = registry.get(self.resource)
+        return self._provider
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.gateway.call(self, input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.gateway.acall(self, input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self.gateway.stream(self, input, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async for chunk in self.gateway.astream(self, input, config, **kwargs):
+            yield chunk
+
+
+class LLMGateway:
+    """
+    Lớp trung gian cho mọi lời gọi LLM của ứng dụng:
+
+    - một client dùng chung cho mỗi vai trò (mặc định lấy từ src.registry, hoặc `provider` truyền vào
+      từng call site, ví dụ LLM giả lập khi chạy offline);
+    - semaphore toàn process `concurrency` (cả lời gọi đồng bộ lẫn bất đồng bộ);
+    - hạn chót `timeout` cho mỗi lời gọi (tính cả thử lại): bản async huỷ hẳn lời gọi khi quá hạn,
+      bản sync không bắt đầu lần thử mới sau hạn chót (client Gemini tự giới hạn thời gian mỗi request);
+    - thử lại lỗi tạm thời với exponential backoff có jitter; stream chỉ thử lại khi chưa nhận đoạn nào;
+    - thống kê theo call site: số lời gọi, lỗi, thử lại, timeout, token ước lượng, thời gian chờ slot,
+      độ trễ p50/p95 (xem `stats`).
+    """
+
+    def __init__(self, concurrency: int = LLM_CONCURRENCY, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, base_delay: float = LLM_RETRY_BASE_DELAY,
+                 max_delay: float = LLM_RETRY_MAX_DELAY):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = _Slots(concurrency)
+        self._stats: Dict[str, _SiteStats] = {}
+        self._lock = threading.Lock()
+
+    def site(self, name: str, provider=None, resource: str = "llm", timeout: float | None = None,
+             max_retries: int | None = None) -> GatewayLLM:
+        """
+        Args:
+            name: tên call site trong thống kê (ví dụ "router_question", "answer")
+            provider: LLM dùng cho call site này; None thì lấy `resource` từ src.registry khi cần
+            timeout, max_retries: ghi đè giá trị mặc định của gateway
+        """
+        return GatewayLLM(self, name, provider, resource, timeout, max_retries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sites = {name: stats.snapshot() for name, stats in sorted(self._stats.items())}
+        return {"concurrency": self.concurrency, "in_use": self.concurrency - self._slots.free, "sites": sites}
+
+    # ----------------------------- Nội bộ ----------------------------- #
+    def _site_stats(self, name: str) -> _SiteStats:
+        with self._lock:
+            return self._stats.setdefault(name, _SiteStats())
+
+    def _record(self, site: GatewayLLM, prompt: Any, output: Any, latency: float, wait: float):
+        stats = self._site_stats(site.name)
+        tokens_in = estimate_tokens(_prompt_text(prompt))
+        tokens_out = estimate_tokens(_prompt_text(output))
+        with self._lock:
+            stats.calls += 1
+            stats.prompt_tokens += tokens_in
+            stats.completion_tokens += tokens_out
+            stats.wait_seconds += wait
+            stats.latencies.append(latency)
+        metrics.record_llm(site.name, latency, tokens_in, tokens_out)
+
+    def _count(self, site: GatewayLLM, field: str):
+        stats = self._site_stats(site.name)
+        with self._lock:
+            setattr(stats, field, getattr(stats, field) + 1)
+
+    def _backoff(self, attempt: int, remaining: float) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        return min(delay, max(0.0, remaining))
+
+    def _should_retry(self, site: GatewayLLM, error: BaseException, attempt: int, deadline: float) -> bool:
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+            self._count(site, "timeouts")
+        if attempt >= site.max_retries or not is_transient_error(error) or time.monotonic() >= deadline:
+            self._count(site, "errors")
+            metrics.record_llm(site.name, 0.0, 0, 0, ok=False)
+            return False
+        self._count(site, "retries")
+        metrics.LLM_RETRIES.inc(site=site.name)
+        return True
+
+    def call(self, site: GatewayLLM, input: Any, config=None, **kwargs) -> Any:
+        deadline = time.monotonic() + site.timeout
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            self._slots.acquire()
+            acquired = time.monotonic()
+            try:
+                output = site.provider.invoke(input, config, **kwargs)
+            except Exception as e:
+                if not self._should_retry(site, e, attempt, deadline):
+                    raise
+            else:
+                self._record(site, input, output, time.monotonic() - acquired, acquired - start)
+                return output
+            finally:
+                self._slots.release()
+            time.sleep(self._backoff(attempt, deadline - time.monotonic()))
+            attempt += 1
+
+    async def acall(self, site: GatewayLLM, input: Any, config=None, **kwargs) -> Any:
+        deadline = time.monotonic() + site.timeout
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            await self._slots.aacquire()
+            acquired = time.monotonic()
+            try:
+                output = await asyncio.wait_for(site.provider.ainvoke(input, config, **kwargs),
+                                                max(0.0, deadline - acquired))
+            except Exception as e:
+                if not self._should_retry(site, e, attempt, deadline):
+                    raise
+            else:
+                self._record(site, input, output, time.monotonic() - acquired, acquired - start)
+                return output
+            finally:
+                self._slots.release()
+            await asyncio.sleep(self._backoff(attempt, deadline - time.monotonic()))
+            attempt += 1
+
+    def stream(self, site: GatewayLLM, input: Any, config=None, **kwargs) -> Iterator[Any]:
+        deadline = time.monotonic() + site.timeout
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            self._slots.acquire()
+            acquired = time.monotonic()
+            parts = []
+            try:
+                for chunk in site.provider.stream(input, config, **kwargs):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if parts or not self._should_retry(site, e, attempt, deadline):
+                    if parts:
+                        self._count(site, "errors")
+                        metrics.record_llm(site.name, 0.0, 0, 0, ok=False)
+                    raise
+            else:
+                self._record(site, input, "".join(map(_prompt_text, parts)), time.monotonic() - acquired,
+                             acquired - start)
+                return
+            finally:
+                self._slots.release()
+            time.sleep(self._backoff(attempt, deadline - time.monotonic()))
+            attempt += 1
+
+    async def astream(self, site: GatewayLLM, input: Any, config=None, **kwargs) -> AsyncIterator[Any]:
+        deadline = time.monotonic() + site.timeout
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            await self._slots.aacquire()
+            acquired = time.monotonic()
+            parts = []
+            try:
+                stream = site.provider.astream(input, config, **kwargs).__aiter__()
+                # Hạn chót áp dụng cho đoạn đầu tiên; sau đó stream chạy tới hết
+                first = await asyncio.wait_for(stream.__anext__(), max(0.0, deadline - acquired))
+                parts.append(first)
+                yield first
+                async for chunk in stream:
+                    parts.append(chunk)
+                    yield chunk
+            except StopAsyncIteration:
+                self._record(site, input, "", time.monotonic() - acquired, acquired - start)
+                return
+            except Exception as e:
+                if parts or not self._should_retry(site, e, attempt, deadline):
+                    if parts:
+                        self._count(site, "errors")
+                        metrics.record_llm(site.name, 0.0, 0, 0, ok=False)
+                    raise
+            else:
+                self._record(site, input, "".join(map(_prompt_text, parts)), time.monotonic() - acquired,
+                             acquired - start)
+                return
+            finally:
+                self._slots.release()
+            await asyncio.sleep(self._backoff(attempt, deadline - time.monotonic()))
+            attempt += 1
@@ -1,21 +1,29 @@
-from langchain_google_genai import GoogleGenerativeAI
 import os
 from dotenv import load_dotenv
+from src.utils.llm_gateway import LLM_TIMEOUT
 
 load_dotenv(".env")
 
+# langchain_google_genai chỉ được import khi tạo client (tốn ~0.5 s lúc import),
+# dùng src.registry để mọi nơi dùng chung một client; mọi lời gọi đi qua src.utils.llm_gateway
+
 def get_llm():
+    from langchain_google_genai import GoogleGenerativeAI
     return GoogleGenerativeAI(
         model="gemini-2.0-flash-lite",
         # model="meta-llama/llama-4-scout-17b-16e-instruct",
         google_api_key=os.getenv("GOOGLE_API_KEY"),
         temperature=0,
+        # giới hạn thời gian mỗi request HTTP (gateway áp hạn chót cho cả lời gọi)
+        timeout=LLM_TIMEOUT,
     )
 
 def get_llm_answer():
+    from langchain_google_genai import GoogleGenerativeAI
     return GoogleGenerativeAI(
         model="gemini-2.0-flash-lite",
         # model="meta-llama/llama-4-scout-17b-16e-instruct",
         google_api_key=os.getenv("GOOGLE_API_KEY"),
         temperature=0,
+        timeout=LLM_TIMEOUT,
     )
\ No newline at end of file
@@ -0,0 +1,134 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, List, Sequence
+
+# Các chuỗi thường gặp trong lỗi giới hạn tần suất của Gemini/OpenAI/Groq
+RATE_LIMIT_MARKERS = ("429", "rate limit", "ratelimit", "resource has been exhausted", "resourceexhausted", "quota")
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+class TokenBucket:
+    """
+    Token bucket bất đồng bộ: `rate_per_minute` đơn vị mỗi phút, cho phép dồn tối đa `capacity`.
+    Dùng cho cả giới hạn request/phút (mỗi lời gọi tốn 1) và token/phút (mỗi lời gọi tốn số token ước lượng).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        # Yêu cầu lớn hơn dung lượng bucket vẫn được phục vụ khi bucket đầy
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class BatchRunner:
+    """
+    Chạy một hàm async trên danh sách phần tử với:
+    - tối đa `concurrency` lời gọi đồng thời,
+    - giới hạn request/phút (`rpm`) và token/phút (`tpm`) bằng token bucket,
+    - thử lại với exponential backoff (có jitter) khi gặp lỗi rate limit,
+    - kết quả giữ đúng thứ tự đầu vào, báo tiến độ qua `progress(done, total)`.
+    """
+
+    def __init__(self, concurrency: int = 4, rpm: float | None = None, tpm: float | None = None,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 progress: Callable[[int, int], None] | None = None):
+        self.concurrency = max(1, concurrency)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.progress = progress
+        self.retries = 0
+        self._semaphore: asyncio.Semaphore | None = None
+        self._request_bucket: TokenBucket | None = None
+        self._token_bucket: TokenBucket | None = None
+
+    def reset(self):
+        """Tạo lại semaphore và token bucket (gắn với event loop đang chạy)."""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._request_bucket = TokenBucket(self.rpm) if self.rpm else None
+        self._token_bucket = TokenBucket(self.tpm, capacity=self.tpm / 60.0 * 5) if self.tpm else None
+
+    async def _acquire(self, item, cost):
+        if self._request_bucket is not None:
+            await self._request_bucket.acquire(1)
+        if self._token_bucket is not None:
+            await self._token_bucket.acquire(cost(item))
+
+    async def _call_with_retry(self, func, item, cost):
+        attempt = 0
+        while True:
+            # Mỗi lần thử (kể cả thử lại) đều phải qua bộ giới hạn tần suất
+            await self._acquire(item, cost)
+            try:
+                return await func(item)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                attempt += 1
+                self.retries += 1
+
+    async def acall(self, func: Callable[[Any], Awaitable[Any]], item: Any,
+                    cost: Callable[[Any], float] = lambda item: 1.0) -> Any:
+        """
+        Gọi `func(item)` dưới cùng giới hạn đồng thời/tần suất của runner.
+        Dùng khi phần tử đến dần (pipeline) thay vì có sẵn cả danh sách như `arun`.
+        """
+        if self._semaphore is None:
+            self.reset()
+        async with self._semaphore:
+            return await self._call_with_retry(func, item, cost)
+
+    async def arun(self, func: Callable[[Any], Awaitable[Any]], items: Sequence[Any],
+                   cost: Callable[[Any], float] = lambda item: 1.0) -> List[Any]:
+        """
+        Args:
+            func: hàm async xử lý một phần tử
+            items: danh sách phần tử
+            cost: ước lượng số token của một phần tử (dùng cho `tpm`)
+        """
+        self.reset()
+        results: List[Any] = [None] * len(items)
+        done = 0
+
+        async def worker(index: int, item):
+            nonlocal done
+            results[index] = await self.acall(func, item, cost)
+            done += 1
+            if self.progress is not None:
+                self.progress(done, len(items))
+
+        await asyncio.gather(*(worker(i, item) for i, item in enumerate(items)))
+        return results
+
+    def run(self, func, items, cost=lambda item: 1.0) -> List[Any]:
+        return asyncio.run(self.arun(func, items, cost))
+
+
+def print_progress(done: int, total: int):
+    print(f"[{done}/{total}] hoàn thành")
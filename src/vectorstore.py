@@ -1,21 +1,123 @@
-from src.loader import Loader
-from src.utils.llm_model import get_llm
-from src.utils.embedding_model import get_embedding
+from src.registry import registry
+from src.semantic_cache import bump_index_version, index_version_file
+from src.utils.rate_limit import BatchRunner, print_progress
+from src.chunker import CHUNK_TOKENS, split_document
+from src.bm25 import BM25_DIR, BM25Index, index_path
+from src.numpy_store import NumpyVectorStore
+from src.docstore import DOCSTORE, open_docstore
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain.storage import LocalFileStore
 from langchain.retrievers.multi_vector import MultiVectorRetriever
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
 import uuid
-import time
+
+# Giới hạn khi tóm tắt hàng loạt (mặc định theo free tier của gemini-2.0-flash-lite)
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_RPM = float(os.getenv("SUMMARY_RPM", "30"))
+SUMMARY_TPM = float(os.getenv("SUMMARY_TPM", "1000000"))
+# Số token ước lượng của phần prompt cố định (ngoài nội dung tài liệu)
+SUMMARY_PROMPT_TOKENS = 400
+
+CHROMA_DIR = "data/processed/chroma_db/"
+# doc_id -> {"source", "hash"} của các tài liệu đã được index
+MANIFEST_PATH = "data/processed/manifest.json"
+# "summary": mỗi tài liệu một vector tóm tắt (cần LLM); "chunk": các chunk theo cấu trúc trong
+# collection "chunks" (không cần LLM); "both": cả hai
+INDEX_MODE = os.getenv("INDEX_MODE", "summary")
+CHUNK_COLLECTION = "chunks"
+# "chroma" hoặc "numpy" (ma trận float16 memmap trong process, xem src/numpy_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+def open_collection(name: str, embedding, persist_directory: str = CHROMA_DIR, backend: str = VECTOR_BACKEND):
+    """Mở collection vector theo backend; cả hai có cùng giao diện mà RetrievalChain và VectorStore dùng."""
+    if backend == "numpy":
+        return NumpyVectorStore(name, embedding, persist_directory)
+    if backend != "chroma":
+        raise ValueError(f"VECTOR_BACKEND không hợp lệ: {backend}")
+    # chromadb tốn ~0.6 s lúc import, chỉ import khi thật sự mở collection Chroma
+    from langchain_chroma import Chroma
+    return Chroma(collection_name=name, embedding_function=embedding, persist_directory=persist_directory)
+
+def collection_directory(collection, default: str = CHROMA_DIR) -> str:
+    """Thư mục lưu của collection mở bằng open_collection (numpy: persist_directory, Chroma: settings của client)."""
+    if getattr(collection, "persist_directory", None):
+        return collection.persist_directory
+    client = getattr(collection, "_client", None)
+    if client is not None:
+        return client.get_settings().persist_directory or default
+    return default
+
+def doc_id_for(doc) -> str:
+    """ID ổn định theo metadata["source"] (trang không có nguồn thì theo nội dung)."""
+    source = doc.metadata.get("source")
+    if source and source != "unknown":
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, source))
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, content_hash(doc)))
+
+def content_hash(doc) -> str:
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+def summary_cost(doc) -> float:
+    """Số token ước lượng của một lời gọi tóm tắt (dùng cho giới hạn tpm)."""
+    return SUMMARY_PROMPT_TOKENS + len(doc.page_content) // 3
 
 class VectorStore:
-    def __init__(self):
-        self.llm = get_llm()
-        self.embedding = get_embedding()
+    def __init__(self, llm=None, embedding=None, concurrency: int = SUMMARY_CONCURRENCY,
+                 rpm: float | None = SUMMARY_RPM, tpm: float | None = SUMMARY_TPM,
+                 persist_directory: str = CHROMA_DIR, store_path: str | None = None,
+                 manifest_path: str = MANIFEST_PATH, index_mode: str = INDEX_MODE,
+                 chunk_tokens: int = CHUNK_TOKENS, bm25_dir: str | None = BM25_DIR,
+                 backend: str = VECTOR_BACKEND):
+        """
+        Args:
+            llm, embedding: cho phép truyền LLM/embedding khác (mặc định Gemini + MiniLM có cache)
+            concurrency: số lời gọi tóm tắt chạy đồng thời
+            rpm, tpm: giới hạn request/phút và token/phút khi tóm tắt (None để bỏ giới hạn)
+            persist_directory, manifest_path: nơi lưu vector và manifest
+            store_path: docstore tài liệu gốc (mặc định theo DOCSTORE: data/processed/docstore.db
+                hoặc thư mục data/processed/store/)
+            index_mode: "summary", "chunk" hoặc "both" (xem INDEX_MODE)
+            chunk_tokens: kích thước tối đa của một chunk (token ước lượng)
+            bm25_dir: thư mục index BM25 (tài liệu và chunk) dùng cho truy hồi lai; None để tắt
+            backend: "chroma" hoặc "numpy" (xem VECTOR_BACKEND)
+        """
+        if index_mode not in ("summary", "chunk", "both"):
+            raise ValueError(f"index_mode không hợp lệ: {index_mode}")
+        # BatchRunner đã thử lại lỗi rate limit theo rpm/tpm riêng nên gateway không thử lại nữa
+        self.llm = registry.get("llm_gateway").site("summarise", llm, max_retries=0)
+        self.embedding = embedding or registry.get("embedding")
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.persist_directory = persist_directory
+        self.store_path = store_path
+        self.manifest_path = manifest_path
+        self.index_mode = index_mode
+        self.chunk_tokens = chunk_tokens
+        self.bm25_dir = bm25_dir
+        self.backend = backend
+        self._docstore = None
+        self._bm25: dict[str, BM25Index] = {}
+
+    @property
+    def summarize(self) -> bool:
+        return self.index_mode in ("summary", "both")
+
+    @property
+    def chunked(self) -> bool:
+        return self.index_mode in ("chunk", "both")
+
+    @property
+    def version_file(self) -> str:
+        """File phiên bản index mà SemanticCache của index này theo dõi (trong persist_directory)."""
+        return index_version_file(self.persist_directory)
 
-    def summaries_docs(self, docs):
+    def _summary_chain(self):
         template = """
             Bạn là bộ tóm tắt tối ưu cho truy hồi theo độ tương đồng (embedding).
             Chỉ dùng thông tin có trong văn bản, không suy diễn. Trả về MỘT đoạn văn duy nhất.
@@ -44,36 +146,244 @@ class VectorStore:
             | self.llm
             | StrOutputParser()
         )
+        return chain
 
-        summaries = []
-        for doc in docs:
-            summary = chain.invoke(doc)
-            summaries.append(summary)
-            time.sleep(5)
+    async def asummaries_docs(self, docs, progress=print_progress):
+        """Tóm tắt đồng thời có giới hạn tần suất; kết quả cùng thứ tự với docs."""
+        chain = self._summary_chain()
+        runner = BatchRunner(concurrency=self.concurrency, rpm=self.rpm, tpm=self.tpm, progress=progress)
+        summaries = await runner.arun(
+            chain.ainvoke,
+            docs,
+            cost=summary_cost,
+        )
+        if runner.retries:
+            print(f"Đã thử lại {runner.retries} lần do giới hạn tần suất")
         return summaries
+
+    def summaries_docs(self, docs, progress=print_progress):
+        """
+        Bản đồng bộ của asummaries_docs. Nếu đang ở trong event loop (asyncio.run không dùng được) thì chạy
+        trên loop riêng ở một thread khác và chặn tới khi xong; code async nên `await asummaries_docs(...)`.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.asummaries_docs(docs, progress))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.asummaries_docs(docs, progress)).result()
     
-    def create_vectorstore(self, docs, summaries):
-        vectorstore = Chroma(collection_name="summaries",
-                             embedding_function=self.embedding,
-                             persist_directory="data/processed/chroma_db/")
-        store = LocalFileStore("data/processed/store/")
-        doc_ids = [str(uuid.uuid4()) for _ in docs]
-        summaries_docs = [
-            Document(page_content=s, metadata={"doc_id": doc_ids[i], "source": docs[i].metadata.get("source", "unknown")})
-            for i, s in enumerate(summaries)
-        ]
-
-        retrievers = MultiVectorRetriever(
+    @property
+    def docstore(self):
+        """Docstore tài liệu gốc (mở một lần, dùng chung cho mọi lần _open)."""
+        if self._docstore is None:
+            self._docstore = open_docstore(self.store_path, DOCSTORE)
+        return self._docstore
+
+    def _open(self):
+        vectorstore = open_collection("summaries", self.embedding, self.persist_directory, self.backend)
+        return MultiVectorRetriever(
             vectorstore=vectorstore,
-            byte_store=store,
+            docstore=self.docstore,
             id_key="doc_id"
         )
 
-        retrievers.vectorstore.add_documents(summaries_docs)
+    def _open_chunks(self):
+        return open_collection(CHUNK_COLLECTION, self.embedding, self.persist_directory, self.backend)
+
+    def migrate_vectors(self) -> int:
+        """
+        Lần đầu chạy với backend numpy trên index Chroma có sẵn: chép vector, văn bản và metadata
+        sang (không tóm tắt hay embed lại). Trả về số vector đã chép.
+        """
+        if self.backend != "numpy" or not os.path.exists(os.path.join(self.persist_directory, "chroma.sqlite3")):
+            return 0
+        copied = 0
+        for name in ("summaries", CHUNK_COLLECTION):
+            target = open_collection(name, self.embedding, self.persist_directory, "numpy")
+            if not target.count():
+                copied += target.copy_from(open_collection(name, self.embedding, self.persist_directory, "chroma"))
+        if copied:
+            print(f"Đã chép {copied} vector từ Chroma sang backend numpy")
+        return copied
+
+    def index_chunks(self, docs, doc_ids):
+        """Thay toàn bộ chunk của các tài liệu (số chunk có thể thay đổi khi tài liệu đổi)."""
+        chunks_store = self._open_chunks()
+        chunks_store._collection.delete(where={"doc_id": {"$in": list(doc_ids)}})
+        chunks = [chunk for doc, doc_id in zip(docs, doc_ids)
+                  for chunk in split_document(doc, doc_id, self.chunk_tokens)]
+        if chunks:
+            chunks_store.add_documents(chunks, ids=[chunk.metadata["chunk_id"] for chunk in chunks])
+        return chunks
+
+    # ----------------------------- BM25 ----------------------------- #
+    def lexical_index(self, kind: str) -> BM25Index:
+        """Index BM25 "documents" hoặc "chunks" (đọc từ đĩa một lần rồi giữ trong bộ nhớ)."""
+        if kind not in self._bm25:
+            self._bm25[kind] = BM25Index.load(index_path(kind, self.bm25_dir))
+        return self._bm25[kind]
+
+    def index_lexical(self, docs, doc_ids, summaries=None, chunks=None, persist: bool = True):
+        """
+        Cập nhật index BM25: mỗi tài liệu một mục (văn bản = tóm tắt + nội dung gốc, hiển thị tóm tắt),
+        và mỗi chunk một mục nếu có chunk. persist=False chỉ sửa trong bộ nhớ (ghi sau bằng save_lexical).
+        """
+        if self.bm25_dir is None:
+            return
+        documents = self.lexical_index("documents")
+        for i, (doc, doc_id) in enumerate(zip(docs, doc_ids)):
+            summary = summaries[i] if summaries is not None else ""
+            documents.add(
+                doc_id,
+                f"{summary}\n{doc.page_content}",
+                summary or doc.page_content[:600],
+                {"doc_id": doc_id, "source": doc.metadata.get("source", "unknown")},
+            )
+        if chunks is not None:
+            chunk_index = self.lexical_index("chunks")
+            chunk_index.remove_where("doc_id", doc_ids)
+            for chunk in chunks:
+                chunk_index.add(chunk.metadata["chunk_id"], chunk.page_content, chunk.page_content, chunk.metadata)
+        if persist:
+            self.save_lexical()
+
+    def save_lexical(self):
+        """Ghi các index BM25 đang mở xuống đĩa."""
+        if self.bm25_dir is None:
+            return
+        for kind, index in self._bm25.items():
+            index.save(index_path(kind, self.bm25_dir))
+
+    def _backfill_lexical(self, docs, persist: bool = True):
+        """Dựng index BM25 cho index đã có từ trước (chưa có file BM25) mà không gọi lại LLM."""
+        current = {}
+        for doc in docs:
+            current[doc_id_for(doc)] = doc
+        doc_ids = list(current)
+        stored = self._open().vectorstore.get(ids=doc_ids, include=["documents"])
+        summary_by_id = dict(zip(stored["ids"], stored["documents"]))
+        chunks = None
+        if self.chunked:
+            chunks = [chunk for doc_id in doc_ids for chunk in split_document(current[doc_id], doc_id, self.chunk_tokens)]
+        self.index_lexical([current[i] for i in doc_ids], doc_ids,
+                           [summary_by_id.get(i) or "" for i in doc_ids], chunks, persist=persist)
+
+    def delete_lexical(self, doc_ids):
+        if self.bm25_dir is None:
+            return
+        for kind in ("documents", "chunks"):
+            index = self.lexical_index(kind)
+            index.remove_where("doc_id", doc_ids)
+            index.save(index_path(kind, self.bm25_dir))
+
+    def create_vectorstore(self, docs, summaries, doc_ids=None, embeddings=None, persist_lexical: bool = True):
+        """
+        Upsert summaries vào Chroma và tài liệu gốc vào docstore theo doc_id ổn định.
+        `embeddings` (nếu có) là vector đã tính sẵn của summaries, khi đó Chroma không embed lại.
+        summaries = None khi không index tóm tắt (index_mode="chunk").
+        persist_lexical=False để gom nhiều lần upsert rồi mới ghi BM25 (xem save_lexical).
+        """
+        if doc_ids is None:
+            doc_ids = [doc_id_for(doc) for doc in docs]
+
+        retrievers = self._open()
+        if summaries is not None:
+            summaries_docs = [
+                Document(page_content=s, metadata={"doc_id": doc_ids[i], "source": docs[i].metadata.get("source", "unknown")})
+                for i, s in enumerate(summaries)
+            ]
+            # Chroma dùng upsert khi có ids nên chạy lại không tạo bản trùng
+            if embeddings is None:
+                retrievers.vectorstore.add_documents(summaries_docs, ids=doc_ids)
+            else:
+                retrievers.vectorstore._collection.upsert(
+                    ids=list(doc_ids),
+                    embeddings=[list(map(float, vector)) for vector in embeddings],
+                    documents=[doc.page_content for doc in summaries_docs],
+                    metadatas=[doc.metadata for doc in summaries_docs],
+                )
         retrievers.docstore.mset(list(zip(doc_ids, docs)))
+        chunks = self.index_chunks(docs, doc_ids) if self.chunked else None
+        self.index_lexical(docs, doc_ids, summaries, chunks, persist=persist_lexical)
+
+    def delete(self, doc_ids):
+        """Xoá tài liệu khỏi Chroma (summaries và chunks) và docstore."""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return
+        retrievers = self._open()
+        retrievers.vectorstore.delete(ids=doc_ids)
+        retrievers.docstore.mdelete(doc_ids)
+        self._open_chunks()._collection.delete(where={"doc_id": {"$in": doc_ids}})
+        self.delete_lexical(doc_ids)
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_manifest(self, manifest: dict):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def plan_update(self, docs, manifest: dict | None = None):
+        """
+        So sánh docs với manifest (đọc từ manifest_path nếu không truyền vào).
+
+        Returns:
+            (changed, unchanged, stale, manifest) — changed là list (doc_id, doc, hash) cần tóm tắt và upsert,
+            unchanged là các doc_id có hash trùng manifest, stale là các doc_id đã index nhưng không còn trong docs.
+        """
+        if manifest is None:
+            manifest = self.load_manifest()
+        current = {}
+        for doc in docs:
+            current[doc_id_for(doc)] = doc  # trùng nguồn thì giữ bản sau cùng
+        changed, unchanged = [], []
+        for doc_id, doc in current.items():
+            digest = content_hash(doc)
+            if manifest.get(doc_id, {}).get("hash") == digest:
+                unchanged.append(doc_id)
+            else:
+                changed.append((doc_id, doc, digest))
+        known = set(manifest)
+        if not manifest:
+            # Index cũ (trước khi có manifest) dùng uuid4: coi mọi id trong collection là đã biết
+            known = set(self._open().vectorstore.get(include=[])["ids"])
+        stale = sorted(known - set(current))
+        return changed, unchanged, stale, manifest
 
     def save(self, docs):
-        summaries = self.summaries_docs(docs)
-        self.create_vectorstore(docs, summaries)
+        """Index tăng dần: chỉ tóm tắt/upsert tài liệu mới hoặc đã đổi, xoá tài liệu không còn."""
+        manifest = self.load_manifest()
+        if manifest:
+            self.migrate_vectors()
+        changed, unchanged, stale, manifest = self.plan_update(docs, manifest)
+        if self.bm25_dir is not None and manifest and not len(self.lexical_index("documents")):
+            print("Dựng index BM25 cho các tài liệu đã index trước đó")
+            self._backfill_lexical(docs)
+        print(f"Index: {len(changed)} mới/thay đổi, {len(stale)} cần xoá, "
+              f"{len(unchanged)} không đổi")
 
-    
+        if changed:
+            changed_docs = [doc for _, doc, _ in changed]
+            summaries = self.summaries_docs(changed_docs) if self.summarize else None
+            self.create_vectorstore(changed_docs, summaries, [doc_id for doc_id, _, _ in changed])
+            for doc_id, doc, digest in changed:
+                manifest[doc_id] = {"source": doc.metadata.get("source", "unknown"), "hash": digest}
+        if stale:
+            self.delete(stale)
+            for doc_id in stale:
+                manifest.pop(doc_id, None)
+
+        if changed or stale:
+            self.save_manifest(manifest)
+            # Collection summaries đã thay đổi -> vô hiệu hoá semantic cache của server
+            bump_index_version(self.version_file)
+        return {"changed": len(changed), "deleted": len(stale), "unchanged": len(unchanged)}
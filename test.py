@@ -1,13 +1,8 @@
 from src.chains.retrieval_chain import RetrievalChain
-from langchain_chroma import Chroma
-from src.utils.embedding_model import get_embedding
+from src.registry import registry
 
-embeddings = get_embedding()
-vectorstore = Chroma(
-            collection_name="summaries",
-            embedding_function=embeddings,
-            persist_directory="data/processed/chroma_db/"
-        )
+# Dùng chung client/collection với graph (backend theo VECTOR_BACKEND)
+vectorstore = registry.get("vectorstore")
 
 
 if __name__ == "__main__":
@@ -20,8 +15,9 @@ if __name__ == "__main__":
             break
 
         
-        result, docs = retrieval_chain.run(question)
-        # print(f"Router Question Result: {result}")
-        for doc in docs:
-            print(doc)
+        # run trả về OutputSchema (câu trả lời + các nguồn đã dùng)
+        result = retrieval_chain.run(question)
+        print(result.answer)
+        for source in result.sources:
+            print(source)
             print("______________________________________")
\ No newline at end of file
@@ -0,0 +1,41 @@
+from src.bm25 import BM25Index, fold, tokenize
+
+
+def test_fold_strips_vietnamese_diacritics():
+    assert fold("Học bổng Đại học") == "hoc bong dai hoc"
+    assert fold("ĐIỂM RÈN LUYỆN") == "diem ren luyen"
+    assert fold(None) == ""
+
+
+def test_tokenize_adds_syllable_pairs_and_codes():
+    tokens = tokenize("Quyết định QĐ-12-4 về học bổng")
+    assert "hoc" in tokens and "bong" in tokens
+    assert "hoc_bong" in tokens
+    assert "qd-12-4" in tokens
+
+
+def make_index():
+    index = BM25Index()
+    index.add("hb", "Học bổng khuyến khích học tập", "học bổng", {"doc_id": "hb"})
+    index.add("ktx", "Đăng ký ký túc xá", "ký túc xá", {"doc_id": "ktx"})
+    index.add("hp", "Học phí theo tín chỉ", "học phí", {"doc_id": "hp"})
+    return index
+
+
+def test_search_matches_without_diacritics():
+    results = make_index().search("hoc bong", k=2)
+    assert results[0][0].metadata["doc_id"] == "hb"
+    assert results[0][1] > 0
+
+
+def test_save_load_and_remove(tmp_path):
+    path = str(tmp_path / "documents.json")
+    index = make_index()
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 3
+    assert loaded.search("ký túc xá", k=1)[0][0].id == "ktx"
+
+    loaded.remove_where("doc_id", ["ktx"])
+    assert len(loaded) == 2
+    assert loaded.search("ky tuc xa") == []
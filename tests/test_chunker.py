@@ -0,0 +1,38 @@
+from langchain_core.documents import Document
+
+from src.chunker import estimate_tokens, split_document
+
+MAX_TOKENS = 60
+
+
+def make_doc():
+    paragraphs = [" ".join(f"Câu số {i}.{j} nói về quy định học vụ." for j in range(6)) for i in range(8)]
+    table = "[BẢNG 1]\n" + "\n".join(f"| Hàng {r} | Giá trị {r} | Ghi chú dài cho hàng {r} |" for r in range(20))
+    text = "# Quy định\n\n" + "\n\n".join(paragraphs[:4]) + "\n\n" + table + "\n\n## Phụ lục\n\n" + "\n\n".join(paragraphs[4:])
+    return Document(page_content=text, metadata={"source": "https://example.edu.vn/quy-dinh", "header": "Sổ tay"})
+
+
+def test_text_chunks_respect_token_budget():
+    chunks = split_document(make_doc(), "doc", MAX_TOKENS)
+    for chunk in chunks:
+        if "[BẢNG" in chunk.page_content:
+            continue
+        # Chỉ được vượt do tiêu đề section chèn vào đầu chunk
+        budget = MAX_TOKENS + estimate_tokens(chunk.metadata["section"]) + 1
+        assert estimate_tokens(chunk.page_content) <= budget
+
+
+def test_tables_are_never_split():
+    chunks = split_document(make_doc(), "doc", MAX_TOKENS)
+    with_table = [chunk for chunk in chunks if "| Hàng" in chunk.page_content]
+    assert len(with_table) == 1
+    assert all(f"| Hàng {r} |" in with_table[0].page_content for r in range(20))
+    assert estimate_tokens(with_table[0].page_content) > MAX_TOKENS
+
+
+def test_chunk_metadata():
+    chunks = split_document(make_doc(), "doc", MAX_TOKENS)
+    assert [chunk.metadata["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk.metadata["chunk_id"] == f"doc:{chunk.metadata['chunk_index']}" for chunk in chunks)
+    assert all(chunk.metadata["source"] == "https://example.edu.vn/quy-dinh" for chunk in chunks)
+    assert chunks[-1].metadata["section"] == "Phụ lục"
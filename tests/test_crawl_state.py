@@ -0,0 +1,80 @@
+import pytest
+
+from src.crawl_state import CrawlState
+from src.crawler import WebCrawler
+
+URLS = [f"https://example.edu.vn/so-tay-sv/{i}" for i in range(4)]
+
+
+class Interrupted(BaseException):
+    """Giống Ctrl+C: không bị các khối `except Exception` của crawler nuốt mất."""
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = CrawlState(str(tmp_path / "crawl_state.db"))
+    yield state
+    state.close()
+
+
+def make_crawler(fetched, fail_at=None, interrupt_at=None):
+    crawler = WebCrawler(delay=0)
+    crawler._setup_driver = lambda: setattr(crawler, "driver", object())
+    crawler._close_driver = lambda: setattr(crawler, "driver", None)
+    crawler._save_to_docx = lambda *args: True
+
+    def crawl(url, driver=None):
+        if url == interrupt_at:
+            raise Interrupted()
+        fetched.append(url)
+        if url == fail_at:
+            return {"text": "Không thể lấy nội dung", "tables": [], "header": "", "error": True}
+        return {"text": f"nội dung {url}", "tables": [], "header": url.rsplit("/", 1)[-1]}
+    crawler._crawl_single_url = crawl
+    return crawler
+
+
+def test_record_reports_changes(state):
+    payload = {"text": "a", "tables": [], "header": "h"}
+    assert state.record(URLS[0], payload) is True
+    assert state.record(URLS[0], payload) is False
+    assert state.record(URLS[0], {**payload, "text": "b"}) is True
+
+
+def test_begin_run_resumes_until_finished(state):
+    run_id = state.begin_run()
+    assert state.begin_run() == run_id
+    assert state.begin_run(resume=False) != run_id
+    state.finish_run(run_id)
+
+
+def test_interrupted_run_resumes_without_refetching(state):
+    fetched = []
+    with pytest.raises(Interrupted):
+        make_crawler(fetched, interrupt_at=URLS[2]).run(URLS, state=state)
+    assert fetched == URLS[:2]
+
+    fetched.clear()
+    docs = make_crawler(fetched).run(URLS, state=state)
+    assert fetched == URLS[2:]
+    assert [doc.metadata["source"] for doc in docs] == URLS
+
+    # Run trước đã xong: run mới fetch lại mọi trang
+    fetched.clear()
+    make_crawler(fetched).run(URLS, state=state)
+    assert fetched == URLS
+
+
+def test_failed_urls_are_recorded_and_retried(state):
+    fetched = []
+    crawler = make_crawler(fetched, fail_at=URLS[1])
+    docs = crawler.run(URLS, state=state)
+    assert [doc.metadata["crawl_error"] for doc in docs] == [False, True, False, False]
+    assert list(crawler.failures) == [URLS[1]]
+    assert [failure["url"] for failure in state.failures()] == [URLS[1]]
+    assert state.get(URLS[1]) is None
+
+    fetched.clear()
+    make_crawler(fetched).run(URLS, state=state, max_age=3600)
+    assert fetched == [URLS[1]]
+    assert state.failures() == []
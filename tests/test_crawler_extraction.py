@@ -0,0 +1,43 @@
+"""
+Kiểm tra `_extract_page_script` cho kết quả giống hệt `_extract_page_webdriver` trên các trang HTML mẫu
+(tests/fixtures/crawler/). Cần Chrome + chromedriver; bỏ qua nếu không khởi tạo được driver.
+"""
+import pathlib
+
+import pytest
+
+from src.crawler import WebCrawler
+
+FIXTURES = sorted((pathlib.Path(__file__).parent / "fixtures" / "crawler").glob("*.html"))
+
+
+@pytest.fixture(scope="module")
+def crawler():
+    crawler = WebCrawler(headless=True, delay=0, timeout=5)
+    try:
+        crawler._setup_driver()
+    except RuntimeError as e:
+        pytest.skip(f"Không có Chrome/chromedriver: {e}")
+    yield crawler
+    crawler._close_driver()
+
+
+def extract(crawler: WebCrawler, url: str, extraction: str):
+    # Engine webdriver sửa DOM (link "TẠI ĐÂY"), nên mỗi engine chạy trên một lần tải trang riêng
+    crawler.driver.get(url)
+    crawler._wait_for_content(crawler.driver)
+    if extraction == "script":
+        return crawler._extract_page_script(crawler.driver)
+    return crawler._extract_page_webdriver(crawler.driver)
+
+
+def test_fixtures_present():
+    assert FIXTURES
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_script_matches_webdriver(crawler, path):
+    url = path.as_uri()
+    header, content = extract(crawler, url, "webdriver")
+    assert header and content["text"]
+    assert extract(crawler, url, "script") == (header, content)
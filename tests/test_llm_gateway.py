@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utils.llm_gateway import LLMGateway, _Slots
+
+
+class ScriptedProvider:
+    """Provider trả lần lượt theo `script`: exception thì ném ra, còn lại là kết quả."""
+
+    def __init__(self, script, latency=0.0):
+        self.script = list(script)
+        self.latency = latency
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        item = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def invoke(self, input, config=None, **kwargs):
+        time.sleep(self.latency)
+        return self._next()
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._next()
+
+
+def gateway(**kwargs):
+    return LLMGateway(concurrency=2, timeout=kwargs.pop("timeout", 5), base_delay=0, **kwargs)
+
+
+def test_retries_transient_errors():
+    provider = ScriptedProvider([ConnectionError("reset"), RuntimeError("503 UNAVAILABLE"), "ok"])
+    gw = gateway(max_retries=2)
+    assert gw.site("answer", provider).invoke("q") == "ok"
+    assert provider.calls == 3
+    stats = gw.stats()
+    assert stats["sites"]["answer"]["retries"] == 2
+    assert stats["in_use"] == 0
+
+
+def test_does_not_retry_permanent_errors():
+    provider = ScriptedProvider([ValueError("bad request"), "ok"])
+    gw = gateway(max_retries=3)
+    with pytest.raises(ValueError):
+        gw.site("answer", provider).invoke("q")
+    assert provider.calls == 1
+    assert gw.stats()["sites"]["answer"]["errors"] == 1
+
+
+def test_gives_up_after_max_retries():
+    provider = ScriptedProvider([ConnectionError("reset")])
+    gw = gateway(max_retries=2)
+    with pytest.raises(ConnectionError):
+        asyncio.run(gw.site("answer", provider).ainvoke("q"))
+    assert provider.calls == 3
+    assert gw.stats()["in_use"] == 0
+
+
+def test_async_deadline_cancels_slow_call():
+    provider = ScriptedProvider(["late"], latency=1.0)
+    gw = gateway(timeout=0.1, max_retries=5)
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(gw.site("answer", provider).ainvoke("q"))
+    assert time.monotonic() - start < 0.5
+    site = gw.stats()["sites"]["answer"]
+    assert site["timeouts"] >= 1 and site["errors"] == 1
+    assert gw.stats()["in_use"] == 0
+
+
+def test_sync_no_new_attempt_after_deadline():
+    provider = ScriptedProvider([ConnectionError("reset")], latency=0.15)
+    gw = gateway(timeout=0.2, max_retries=10)
+    with pytest.raises(ConnectionError):
+        gw.site("answer", provider).invoke("q")
+    assert provider.calls <= 2
+
+
+def test_release_skips_waiter_on_closed_loop():
+    slots = _Slots(1)
+    slots.acquire()
+
+    # Người chờ async có event loop đã đóng trước khi được trao slot
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(slots.aacquire())
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+    waiter = threading.Thread(target=slots.acquire, daemon=True)
+    waiter.start()
+    while len(slots._waiters) < 2:
+        time.sleep(0.001)
+
+    slots.release()
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
+    assert not slots._waiters
+    slots.release()
+    assert slots.free == 1
+    task._log_destroy_pending = False  # loop đã đóng nên task không bao giờ chạy tiếp
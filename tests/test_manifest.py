@@ -0,0 +1,48 @@
+import pytest
+from langchain_core.documents import Document
+
+from src.vectorstore import VectorStore, content_hash, doc_id_for
+
+
+def doc(text, source=None):
+    return Document(page_content=text, metadata={"source": source} if source else {})
+
+
+def test_doc_id_is_stable_per_source():
+    assert doc_id_for(doc("a", "https://x/1")) == doc_id_for(doc("b", "https://x/1"))
+    assert doc_id_for(doc("a", "https://x/1")) != doc_id_for(doc("a", "https://x/2"))
+
+
+def test_doc_id_without_source_follows_content():
+    assert doc_id_for(doc("a")) == doc_id_for(doc("a", "unknown"))
+    assert doc_id_for(doc("a")) != doc_id_for(doc("b"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VectorStore(llm=object(), embedding=object(), persist_directory=str(tmp_path / "chroma"),
+                       store_path=str(tmp_path / "store"), manifest_path=str(tmp_path / "manifest.json"),
+                       bm25_dir=None)
+
+
+def entry(d):
+    return {"source": d.metadata.get("source", "unknown"), "hash": content_hash(d)}
+
+
+def test_plan_update_diffs_against_manifest(store):
+    same, edited, removed = doc("giữ", "https://x/1"), doc("cũ", "https://x/2"), doc("xoá", "https://x/3")
+    store.save_manifest({doc_id_for(d): entry(d) for d in (same, edited, removed)})
+    new, edited_now = doc("mới", "https://x/4"), doc("đã sửa", "https://x/2")
+
+    changed, unchanged, stale, manifest = store.plan_update([same, edited_now, new])
+    assert {doc_id for doc_id, _, _ in changed} == {doc_id_for(edited_now), doc_id_for(new)}
+    assert unchanged == [doc_id_for(same)]
+    assert stale == [doc_id_for(removed)]
+    assert len(manifest) == 3
+
+
+def test_plan_update_collapses_duplicate_sources(store):
+    first = doc("a", "https://x/1")
+    store.save_manifest({doc_id_for(first): entry(first)})
+    changed, unchanged, stale, _ = store.plan_update([first, first, doc("a", "https://x/1")])
+    assert (changed, unchanged, stale) == ([], [doc_id_for(first)], [])
@@ -0,0 +1,69 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+from benchmarks.fixtures import make_documents
+from src.bm25 import BM25Index, index_path
+from src.pipeline import IngestPipeline
+from src.vectorstore import VectorStore, doc_id_for
+
+BATCH_SIZE = 2
+KILL_AFTER_BATCHES = 3
+
+
+def make_store(root: str) -> VectorStore:
+    return VectorStore(llm=ScriptedLLM(), embedding=HashEmbeddings(dim=8), rpm=None, tpm=None, backend="numpy",
+                       persist_directory=os.path.join(root, "vectors"), store_path=os.path.join(root, "store"),
+                       manifest_path=os.path.join(root, "manifest.json"), bm25_dir=os.path.join(root, "bm25"))
+
+
+def make_pipeline(root: str) -> IngestPipeline:
+    # checkpoint_every lớn: BM25 và phiên bản index chỉ được ghi khi kết thúc
+    return IngestPipeline(make_store(root), batch_size=BATCH_SIZE, linger=0.01, checkpoint_every=100)
+
+
+def killed_run(root: str, docs):
+    """Chạy pipeline rồi thoát ngay (như SIGKILL, không có finally) sau KILL_AFTER_BATCHES batch."""
+    pipeline = make_pipeline(root)
+
+    def source():
+        for i, doc in enumerate(docs):
+            if i == KILL_AFTER_BATCHES * BATCH_SIZE:
+                deadline = time.monotonic() + 10
+                while pipeline.counts["batches"] < KILL_AFTER_BATCHES and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                os._exit(1)
+            yield doc
+
+    pipeline.run(docs=source())
+
+
+@pytest.fixture
+def docs():
+    return make_documents(12)
+
+
+def test_hard_kill_loses_at_most_the_current_batch(tmp_path, docs):
+    root = str(tmp_path)
+    process = multiprocessing.get_context("fork").Process(target=killed_run, args=(root, docs))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 1
+
+    with open(os.path.join(root, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    committed = KILL_AFTER_BATCHES * BATCH_SIZE
+    assert set(manifest) == {doc_id_for(doc) for doc in docs[:committed]}
+    # BM25 chưa tới checkpoint nên chưa được ghi
+    assert not os.path.exists(index_path("documents", os.path.join(root, "bm25")))
+
+    stats = make_pipeline(root).run(docs=docs)
+    assert stats["unchanged"] == committed
+    assert stats["summarised"] == len(docs) - committed
+    assert stats["lexical_backfilled"] == committed
+    lexical = BM25Index.load(index_path("documents", os.path.join(root, "bm25")))
+    assert all(doc_id_for(doc) in lexical for doc in docs)
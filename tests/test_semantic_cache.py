@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from src import semantic_cache
+from src.semantic_cache import SemanticCache, bump_index_version
+
+
+class TableEmbeddings:
+    """Vector cố định theo câu hỏi."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+@pytest.fixture
+def version_file(tmp_path):
+    return str(tmp_path / "index_version")
+
+
+@pytest.fixture
+def embedding():
+    return TableEmbeddings({
+        "học phí bao nhiêu": [1.0, 0.0, 0.0],
+        "học phí là bao nhiêu": [0.99, 0.1, 0.0],
+        "ký túc xá ở đâu": [0.0, 1.0, 0.0],
+    })
+
+
+def test_hit_on_similar_question(embedding, version_file):
+    cache = SemanticCache(embedding, threshold=0.95, version_file=version_file)
+    cache.store("học phí bao nhiêu", "580.000 đ")
+    value, vector = cache.lookup("học phí là bao nhiêu")
+    assert value == "580.000 đ"
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert cache.stats()["hits"] == 1
+
+
+def test_miss_on_different_question(embedding, version_file):
+    cache = SemanticCache(embedding, threshold=0.95, version_file=version_file)
+    cache.store("học phí bao nhiêu", "580.000 đ")
+    assert cache.lookup("ký túc xá ở đâu")[0] is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_index_version_bump_invalidates(embedding, version_file):
+    bump_index_version(version_file)
+    cache = SemanticCache(embedding, version_file=version_file)
+    cache.store("học phí bao nhiêu", "cũ")
+    assert cache.lookup("học phí bao nhiêu")[0] == "cũ"
+
+    bump_index_version(version_file)
+    assert cache.lookup("học phí bao nhiêu")[0] is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_ttl_and_max_entries(embedding, version_file, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = SemanticCache(embedding, max_entries=1, ttl=10, version_file=version_file)
+    cache.store("học phí bao nhiêu", "a")
+    cache.store("ký túc xá ở đâu", "b")
+    assert cache.lookup("học phí bao nhiêu")[0] is None
+    assert cache.lookup("ký túc xá ở đâu")[0] == "b"
+    now[0] += 11
+    assert cache.lookup("ký túc xá ở đâu")[0] is None
+    assert cache.stats()["evictions"] == 2
+
+
+def test_vectorstore_save_invalidates_only_its_own_index(tmp_path):
+    from benchmarks.fakes import HashEmbeddings, ScriptedLLM
+    from benchmarks.fixtures import make_documents
+    from src.vectorstore import VectorStore, collection_directory
+
+    def make_store(name):
+        root = tmp_path / name
+        return VectorStore(llm=ScriptedLLM(), embedding=HashEmbeddings(dim=8), rpm=None, tpm=None, backend="numpy",
+                           persist_directory=str(root / "vectors"), store_path=str(root / "store"),
+                           manifest_path=str(root / "manifest.json"), bm25_dir=str(root / "bm25"))
+
+    first, second = make_store("a"), make_store("b")
+    assert collection_directory(first._open().vectorstore) == first.persist_directory
+    embedding = TableEmbeddings({"học phí bao nhiêu": [1.0, 0.0, 0.0]})
+    cache_a = SemanticCache(embedding, version_file=first.version_file)
+    cache_b = SemanticCache(embedding, version_file=second.version_file)
+    cache_a.store("học phí bao nhiêu", "a")
+    cache_b.store("học phí bao nhiêu", "b")
+
+    first.save(make_documents(3))
+    assert cache_a.lookup("học phí bao nhiêu")[0] is None
+    assert cache_b.lookup("học phí bao nhiêu")[0] == "b"
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from src import session_store
+from src.session_store import SessionStore, new_state
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, "time", lambda: now[0])
+    return now
+
+
+def test_get_unknown_session_returns_new_state():
+    assert SessionStore().get("missing") == new_state()
+
+
+def test_get_returns_copy():
+    store = SessionStore()
+    store.save("a", {"summary": "x"})
+    state = store.get("a")
+    state["summary"] = "changed"
+    assert store.get("a")["summary"] == "x"
+
+
+def test_ttl_expires_idle_sessions(clock):
+    store = SessionStore(ttl=60)
+    store.save("a", {"summary": "x"})
+    clock[0] += 59
+    assert store.get("a")["summary"] == "x"
+    # get làm mới thời điểm truy cập
+    clock[0] += 59
+    assert store.get("a")["summary"] == "x"
+    clock[0] += 61
+    assert store.get("a") == new_state()
+    assert len(store) == 0
+
+
+def test_lru_evicts_least_recently_used(clock):
+    store = SessionStore(max_sessions=2)
+    store.save("a", {"summary": "a"})
+    store.save("b", {"summary": "b"})
+    store.get("a")
+    store.save("c", {"summary": "c"})
+    assert len(store) == 2
+    assert store.get("b") == new_state()
+    assert store.get("a")["summary"] == "a"
+
+
+def test_sqlite_survives_restart_and_expires(tmp_path, clock):
+    db_path = str(tmp_path / "sessions.db")
+    store = SessionStore(ttl=60, db_path=db_path)
+    store.save("a", {"summary": "x"})
+    store.close()
+
+    store = SessionStore(ttl=60, db_path=db_path)
+    assert store.get("a")["summary"] == "x"
+    store.close()
+
+    clock[0] += 61
+    store = SessionStore(ttl=60, db_path=db_path)
+    assert store.get("a") == new_state()
+    store.close()
+
+
+def test_lock_serialises_requests_and_is_released():
+    store = SessionStore()
+    events = []
+
+    async def request(name):
+        async with store.lock("a"):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    async def main():
+        await asyncio.gather(request("r1"), request("r2"))
+
+    asyncio.run(main())
+    assert events == ["r1 start", "r1 end", "r2 start", "r2 end"]
+    assert store._locks == {}